@@ -2,7 +2,20 @@ import os
 from datetime import datetime
 from pathlib import Path
 
-from sqlalchemy import Column, DateTime, String, Text, create_engine
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+    create_engine,
+    event,
+    inspect,
+    text,
+)
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 
@@ -15,6 +28,45 @@ class AppState(Base):
     key = Column(String, primary_key=True, index=True)
     value = Column(Text, nullable=False)
     updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Versiunea snapshot-ului din `value`. Versiunea curenta (head) poate fi mai
+    # mare daca exista delte in `app_state_delta` ne-compactate inca.
+    version = Column(Integer, nullable=False, default=1)
+
+
+class AppStateDelta(Base):
+    __tablename__ = "app_state_delta"
+    __table_args__ = (UniqueConstraint("key", "version", name="uq_app_state_delta_key_version"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    key = Column(String, nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    patch_type = Column(String, nullable=False)
+    patch = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+
+class AppStateHistory(Base):
+    __tablename__ = "app_state_history"
+    __table_args__ = (Index("ix_app_state_history_key_created_at", "key", "created_at"),)
+
+    # Doar metadate; continutul este in `app_state_blob`, adresat dupa hash.
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    key = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=False, index=True)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class AppStateBlob(Base):
+    __tablename__ = "app_state_blob"
+
+    content_hash = Column(String(64), primary_key=True)
+    codec = Column(String, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    compressed_bytes = Column(Integer, nullable=False)
 
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/app.db")
@@ -25,3 +77,37 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/app.db")
 Path("./data").mkdir(parents=True, exist_ok=True)
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Motivatie:
+# - WAL permite citiri concurente cu scrierea (GET-urile nu mai asteapta PUT-urile),
+# - `synchronous=NORMAL` in WAL nu mai face fsync la fiecare commit, doar la checkpoint,
+# - `busy_timeout` evita erorile "database is locked" la varfuri scurte.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+)
+
+
+if engine.dialect.name == "sqlite":
+
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def ensure_schema() -> None:
+    Base.metadata.create_all(bind=engine)
+    # Motivatie:
+    # Nu folosim inca un tool de migrari; coloanele adaugate ulterior pe
+    # tabele existente (bazele SQLite deja create) le adaugam explicit aici.
+    existing_columns = {column["name"] for column in inspect(engine).get_columns("app_state")}
+    if "version" not in existing_columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE app_state ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
@@ -1,17 +1,64 @@
 from __future__ import annotations
 
+import atexit
 import json
 import logging
+import os
+import queue
+import random
 from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any
 
 
 SERVICE_NAME = "backend"
 LOGGER_NAME = "creatura.backend"
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# `text` pastreaza formatul unificat `a | b | c`; `json` scrie JSON lines.
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Exemplu: `LOG_SAMPLE_RATES=health.check=0.01,solve.request.received=0.5`
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
 
-def _timestamp_utc_microseconds() -> str:
-    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARN": logging.WARNING,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+}
+_LEVEL_NAMES = {
+    logging.DEBUG: "DEBUG",
+    logging.INFO: "INFO",
+    logging.WARNING: "WARN",
+    logging.ERROR: "ERROR",
+}
+
+
+def _parse_sample_rates(raw: str) -> dict[str, float]:
+    rates: dict[str, float] = {}
+    for item in raw.split(","):
+        event, sep, rate = item.strip().partition("=")
+        if not sep or not event:
+            continue
+        try:
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+_sample_rates = _parse_sample_rates(LOG_SAMPLE_RATES)
+
+
+def set_sample_rate(event: str, rate: float) -> None:
+    _sample_rates[event] = min(1.0, max(0.0, rate))
+
+
+def _timestamp_utc_microseconds(created: float | None = None) -> str:
+    moment = datetime.now(timezone.utc) if created is None else datetime.fromtimestamp(created, timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
 
 
 def _serialize_value(value: Any) -> str:
@@ -26,9 +73,9 @@ def _serialize_value(value: Any) -> str:
     return json.dumps(value, ensure_ascii=True, default=str)
 
 
-def format_log_line(level: str, event: str, **fields: Any) -> str:
+def format_log_line(level: str, event: str, created: float | None = None, **fields: Any) -> str:
     parts = [
-        _timestamp_utc_microseconds(),
+        _timestamp_utc_microseconds(created),
         f"service={SERVICE_NAME}",
         f"level={level.upper()}",
         f"event={event}",
@@ -38,27 +85,85 @@ def format_log_line(level: str, event: str, **fields: Any) -> str:
     return " | ".join(parts)
 
 
+def format_json_line(level: str, event: str, created: float | None = None, **fields: Any) -> str:
+    document = {
+        "timestamp": _timestamp_utc_microseconds(created),
+        "service": SERVICE_NAME,
+        "level": level.upper(),
+        "event": event,
+        **fields,
+    }
+    return json.dumps(document, ensure_ascii=True, default=str)
+
+
+class EventFormatter(logging.Formatter):
+    # Motivatie:
+    # Formatarea (strftime + json.dumps pe fiecare camp) ruleaza in thread-ul
+    # QueueListener-ului, nu in thread-ul care serveste request-ul.
+    def __init__(self, json_lines: bool = False) -> None:
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = getattr(record, "creatura_event", None)
+        if event is None:
+            return super().format(record)
+        level = _LEVEL_NAMES.get(record.levelno, record.levelname)
+        fields = getattr(record, "creatura_fields", {})
+        if self.json_lines:
+            return format_json_line(level, event, created=record.created, **fields)
+        return format_log_line(level, event, created=record.created, **fields)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler care nu formateaza si nu blocheaza cand coada e plina."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare() standard apeleaza self.format(); noi lasam
+        # formatarea pe seama listener-ului si trimitem record-ul neatins.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
 def get_logger() -> logging.Logger:
     logger = logging.getLogger(LOGGER_NAME)
     if getattr(logger, "_creatura_configured", False):
         return logger
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(logging.Formatter("%(message)s"))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(EventFormatter(json_lines=LOG_FORMAT == "json"))
+    log_queue: queue.Queue = queue.Queue(maxsize=max(0, LOG_QUEUE_SIZE))
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)
+
     logger.handlers.clear()
-    logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
+    logger.addHandler(NonBlockingQueueHandler(log_queue))
+    logger.setLevel(_LEVELS.get(LOG_LEVEL, logging.INFO))
     logger.propagate = False
     logger._creatura_configured = True  # type: ignore[attr-defined]
+    logger._creatura_listener = listener  # type: ignore[attr-defined]
     return logger
 
 
 def log_event(logger: logging.Logger, level: str, event: str, **fields: Any) -> None:
-    line = format_log_line(level=level, event=event, **fields)
-    normalized = level.upper()
-    if normalized in {"WARN", "WARNING"}:
-        logger.warning(line)
-    elif normalized == "ERROR":
-        logger.error(line)
-    else:
-        logger.info(line)
+    levelno = _LEVELS.get(level.upper(), logging.INFO)
+    if not logger.isEnabledFor(levelno):
+        return
+
+    sample_rate = _sample_rates.get(event)
+    if sample_rate is not None and sample_rate < 1.0:
+        if random.random() >= sample_rate:
+            return
+        fields["sample_rate"] = sample_rate
+
+    logger.log(levelno, event, extra={"creatura_event": event, "creatura_fields": fields})
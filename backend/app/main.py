@@ -1,22 +1,51 @@
+from contextlib import asynccontextmanager
+from datetime import datetime
 from typing import Any
+import re
 import time
 from uuid import uuid4
 
-from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi import Body, Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 
-from .db import Base, SessionLocal, engine
+from .db import SessionLocal, ensure_schema
 from .logging_utils import get_logger, log_event
+from .profiling_utils import ProfilingMiddleware, list_profiles, profile_path, profiling_enabled
+from .services.solver_proxy import parse_deadline
+from .services.solver_proxy import solve_scenarios as solve_scenarios_payload
 from .services.solver_proxy import solve_schedule as solve_schedule_payload
-from .services.state_store import get_json_state, put_json_state
+from .services.json_patch import JSON_PATCH_CONTENT_TYPE, MERGE_PATCH_CONTENT_TYPE
+from .services.state_history import get_history_state, list_history
+from .services.state_store import (
+    flush_state_writes,
+    format_etag,
+    get_state_writer_health,
+    get_json_state,
+    get_state_version,
+    parse_etag,
+    patch_json_state,
+    put_json_state,
+)
 
 
 SCHEDULE_STATE_KEY = "schedule_ui_state_v1"
+WORKSPACE_ID_PATTERN = re.compile(r"[A-Za-z0-9_.-]{1,64}")
 
-app = FastAPI(title="CreaTura Backend API")
 logger = get_logger()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Scrierile sunt coalescate in fundal; nu pierdem ultima fereastra la oprire.
+    flushed = flush_state_writes(timeout=10.0)
+    log_event(logger, "INFO" if flushed else "ERROR", "state.writer.shutdown_flush", flushed=flushed)
+
+
+app = FastAPI(title="CreaTura Backend API", lifespan=lifespan)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,8 +53,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
 
-Base.metadata.create_all(bind=engine)
+ensure_schema()
 
 
 def get_db():
@@ -39,7 +70,10 @@ def get_db():
 @app.get("/health")
 def health():
     log_event(logger, "INFO", "health.check")
-    return {"status": "ok"}
+    # Cheile parcate de writer exista doar in cache; un restart le-ar pierde.
+    state_writer_health = get_state_writer_health()
+    status = "degraded" if state_writer_health["unpersisted_keys"] else "ok"
+    return {"status": status, "state_writer": state_writer_health}
 
 
 @app.post("/solve/schedule")
@@ -47,7 +81,10 @@ async def solve_schedule(payload: dict[str, Any], request: Request):
     request_id = request.headers.get("X-Request-Id") or uuid4().hex[:8]
     started_at = time.perf_counter()
     employees_count = len(payload.get("employees", [])) if isinstance(payload.get("employees"), list) else 0
-    shifts_count = len(payload.get("shifts", [])) if isinstance(payload.get("shifts"), list) else 0
+    shifts = payload.get("shifts", [])
+    if isinstance(shifts, dict):
+        shifts = shifts.get("day_offsets", [])
+    shifts_count = len(shifts) if isinstance(shifts, list) else 0
     hard_count = 0
     soft_count = 0
     constraints = payload.get("constraints", {})
@@ -68,7 +105,13 @@ async def solve_schedule(payload: dict[str, Any], request: Request):
         soft=soft_count,
     )
     try:
-        result = await solve_schedule_payload(payload, request_id=request_id)
+        deadline = parse_deadline(request.headers, started_at, request_id)
+        result = await solve_schedule_payload(
+            payload,
+            request_id=request_id,
+            deadline=deadline,
+            is_disconnected=request.is_disconnected,
+        )
     except HTTPException as exc:
         elapsed_us = int((time.perf_counter() - started_at) * 1_000_000)
         level = "WARN" if 400 <= exc.status_code < 500 else "ERROR"
@@ -107,30 +150,333 @@ async def solve_schedule(payload: dict[str, Any], request: Request):
     return result
 
 
-@app.get("/state/schedule")
-def get_schedule_state(request: Request, db: Session = Depends(get_db)):
+@app.post("/solve/scenarios")
+async def solve_scenarios(payload: dict[str, Any], request: Request):
     request_id = request.headers.get("X-Request-Id") or uuid4().hex[:8]
-    result = get_json_state(db, SCHEDULE_STATE_KEY)
+    started_at = time.perf_counter()
+    scenarios = payload.get("scenarios")
     log_event(
         logger,
         "INFO",
-        "state.schedule.get",
+        "solve_scenarios.request.start",
+        request_id=request_id,
+        scenarios=len(scenarios) if isinstance(scenarios, list) else 0,
+    )
+    deadline = parse_deadline(request.headers, started_at, request_id)
+    result = await solve_scenarios_payload(
+        payload,
+        request_id=request_id,
+        deadline=deadline,
+        is_disconnected=request.is_disconnected,
+    )
+    comparison = result.get("comparison") or {}
+    log_event(
+        logger,
+        "INFO",
+        "solve_scenarios.request.done",
+        request_id=request_id,
+        elapsed_us=int((time.perf_counter() - started_at) * 1_000_000),
+        best_scenario_id=comparison.get("best_scenario_id"),
+    )
+    return result
+
+
+def _request_id(request: Request) -> str:
+    return request.headers.get("X-Request-Id") or uuid4().hex[:8]
+
+
+def workspace_state_key(workspace_id: str) -> str:
+    # Motivatie:
+    # Fiecare workspace (tenant) are cheia lui in `app_state`; validam id-ul ca sa
+    # nu poata "sari" in cheia altui workspace sau in cheia legacy.
+    if not WORKSPACE_ID_PATTERN.fullmatch(workspace_id):
+        raise HTTPException(status_code=422, detail="workspace_id must match [A-Za-z0-9_.-]{1,64}.")
+    return f"workspace:{workspace_id}"
+
+
+def _get_state(key: str, event: str, request: Request, response: Response, db: Session, **log_fields):
+    request_id = _request_id(request)
+    known_version = parse_etag(request.headers.get("If-None-Match"))
+    if known_version is not None and known_version == get_state_version(db, key):
+        log_event(
+            logger,
+            "INFO",
+            event,
+            request_id=request_id,
+            not_modified=True,
+            version=known_version,
+            **log_fields,
+        )
+        return Response(status_code=304, headers={"ETag": format_etag(known_version)})
+
+    result = get_json_state(db, key)
+    if result.get("version") is not None:
+        response.headers["ETag"] = format_etag(result["version"])
+    log_event(
+        logger,
+        "INFO",
+        event,
         request_id=request_id,
         exists=result.get("exists"),
+        version=result.get("version"),
+        **log_fields,
     )
     return result
 
 
-@app.put("/state/schedule")
-def put_schedule_state(payload: dict[str, Any], request: Request, db: Session = Depends(get_db)):
-    request_id = request.headers.get("X-Request-Id") or uuid4().hex[:8]
-    result = put_json_state(db, SCHEDULE_STATE_KEY, payload)
+def _put_state(
+    key: str,
+    event: str,
+    payload: dict[str, Any],
+    request: Request,
+    response: Response,
+    db: Session,
+    **log_fields,
+):
+    request_id = _request_id(request)
+    expected_version = parse_etag(request.headers.get("If-Match"))
+    result = put_json_state(db, key, payload, expected_version=expected_version)
+    response.headers["ETag"] = format_etag(result["version"])
     log_event(
         logger,
         "INFO",
-        "state.schedule.put",
+        event,
         request_id=request_id,
         updated_at=result.get("updated_at"),
+        version=result.get("version"),
         payload_keys=len(payload.keys()),
+        **log_fields,
+    )
+    return result
+
+
+def _patch_state(key: str, event: str, patch: Any, request: Request, response: Response, db: Session, **log_fields):
+    request_id = _request_id(request)
+    content_type = request.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if content_type not in (JSON_PATCH_CONTENT_TYPE, MERGE_PATCH_CONTENT_TYPE):
+        raise HTTPException(
+            status_code=415,
+            detail=f"Use Content-Type {JSON_PATCH_CONTENT_TYPE} or {MERGE_PATCH_CONTENT_TYPE}.",
+        )
+    expected_version = parse_etag(request.headers.get("If-Match"))
+    if expected_version is None:
+        raise HTTPException(status_code=428, detail="PATCH requires an If-Match header with the state version.")
+
+    result = patch_json_state(db, key, content_type, patch, expected_version=expected_version)
+    response.headers["ETag"] = format_etag(result["version"])
+    log_event(
+        logger,
+        "INFO",
+        event,
+        request_id=request_id,
+        patch_type=content_type,
+        version=result.get("version"),
+        compacted=result.get("compacted"),
+        **log_fields,
     )
     return result
+
+
+def _list_state_history(
+    key: str,
+    event: str,
+    request: Request,
+    before: datetime | None,
+    limit: int,
+    db: Session,
+    **log_fields,
+):
+    # `before` = lookup point-in-time: primul element este versiunea activa la acel moment.
+    items = list_history(db, key, before=before, limit=limit)
+    log_event(
+        logger,
+        "INFO",
+        event,
+        request_id=_request_id(request),
+        before=before.isoformat() if before else None,
+        items=len(items),
+        **log_fields,
+    )
+    return {"items": items}
+
+
+def _restore_state_history(
+    key: str,
+    event: str,
+    version: int,
+    request: Request,
+    response: Response,
+    db: Session,
+    **log_fields,
+):
+    request_id = _request_id(request)
+    historical = get_history_state(db, key, version)
+    expected_version = parse_etag(request.headers.get("If-Match"))
+    result = put_json_state(db, key, historical["state"], expected_version=expected_version)
+    response.headers["ETag"] = format_etag(result["version"])
+    log_event(
+        logger,
+        "INFO",
+        event,
+        request_id=request_id,
+        restored_version=version,
+        version=result.get("version"),
+        **log_fields,
+    )
+    return {**result, "restored_version": version}
+
+
+@app.get("/state/schedule")
+def get_schedule_state(request: Request, response: Response, db: Session = Depends(get_db)):
+    return _get_state(SCHEDULE_STATE_KEY, "state.schedule.get", request, response, db)
+
+
+@app.put("/state/schedule")
+def put_schedule_state(
+    payload: dict[str, Any],
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+):
+    return _put_state(SCHEDULE_STATE_KEY, "state.schedule.put", payload, request, response, db)
+
+
+@app.patch("/state/schedule")
+def patch_schedule_state(
+    request: Request,
+    response: Response,
+    patch: Any = Body(...),
+    db: Session = Depends(get_db),
+):
+    return _patch_state(SCHEDULE_STATE_KEY, "state.schedule.patch", patch, request, response, db)
+
+
+@app.get("/state/schedule/history")
+def list_schedule_state_history(
+    request: Request,
+    before: datetime | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    return _list_state_history(SCHEDULE_STATE_KEY, "state.schedule.history.list", request, before, limit, db)
+
+
+@app.get("/state/schedule/history/{version}")
+def get_schedule_state_history(version: int, request: Request, db: Session = Depends(get_db)):
+    result = get_history_state(db, SCHEDULE_STATE_KEY, version)
+    log_event(logger, "INFO", "state.schedule.history.get", request_id=_request_id(request), version=version)
+    return result
+
+
+@app.post("/state/schedule/history/{version}/restore")
+def restore_schedule_state_history(
+    version: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+):
+    return _restore_state_history(
+        SCHEDULE_STATE_KEY,
+        "state.schedule.history.restore",
+        version,
+        request,
+        response,
+        db,
+    )
+
+
+@app.get("/workspaces/{workspace_id}/state")
+def get_workspace_state(workspace_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    key = workspace_state_key(workspace_id)
+    return _get_state(key, "state.workspace.get", request, response, db, workspace_id=workspace_id)
+
+
+@app.put("/workspaces/{workspace_id}/state")
+def put_workspace_state(
+    workspace_id: str,
+    payload: dict[str, Any],
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+):
+    key = workspace_state_key(workspace_id)
+    return _put_state(key, "state.workspace.put", payload, request, response, db, workspace_id=workspace_id)
+
+
+@app.patch("/workspaces/{workspace_id}/state")
+def patch_workspace_state(
+    workspace_id: str,
+    request: Request,
+    response: Response,
+    patch: Any = Body(...),
+    db: Session = Depends(get_db),
+):
+    key = workspace_state_key(workspace_id)
+    return _patch_state(key, "state.workspace.patch", patch, request, response, db, workspace_id=workspace_id)
+
+
+@app.get("/workspaces/{workspace_id}/state/history")
+def list_workspace_state_history(
+    workspace_id: str,
+    request: Request,
+    before: datetime | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    key = workspace_state_key(workspace_id)
+    return _list_state_history(
+        key,
+        "state.workspace.history.list",
+        request,
+        before,
+        limit,
+        db,
+        workspace_id=workspace_id,
+    )
+
+
+@app.get("/workspaces/{workspace_id}/state/history/{version}")
+def get_workspace_state_history(workspace_id: str, version: int, request: Request, db: Session = Depends(get_db)):
+    result = get_history_state(db, workspace_state_key(workspace_id), version)
+    log_event(
+        logger,
+        "INFO",
+        "state.workspace.history.get",
+        request_id=_request_id(request),
+        workspace_id=workspace_id,
+        version=version,
+    )
+    return result
+
+
+@app.post("/workspaces/{workspace_id}/state/history/{version}/restore")
+def restore_workspace_state_history(
+    workspace_id: str,
+    version: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+):
+    return _restore_state_history(
+        workspace_state_key(workspace_id),
+        "state.workspace.history.restore",
+        version,
+        request,
+        response,
+        db,
+        workspace_id=workspace_id,
+    )
+
+
+@app.get("/admin/profiles")
+def list_request_profiles(limit: int = Query(50, ge=1, le=500)):
+    # Cele mai recente profiluri (`PROFILE_DIR`), cu request-ul, durata si numarul de esantioane.
+    return {"enabled": profiling_enabled(), "profiles": list_profiles(limit)}
+
+
+@app.get("/admin/profiles/{name}")
+def get_request_profile(name: str):
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{name}' not found.")
+    return FileResponse(path, media_type="text/plain")
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+
+from .logging_utils import get_logger, log_event
+
+# Profilarea este opt-in: fara director middleware-ul nici nu este instalat.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+# Fractiunea request-urilor profilate fara header (ex. 0.01); 0 = doar la cerere.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+# `X-Profile: 1` profileaza request-ul curent.
+PROFILE_HEADER = "X-Profile"
+PROFILE_EXCLUDED_PREFIXES = ("/health", "/admin")
+
+# Frunzele unui thread care asteapta (worker de threadpool liber, event loop fara
+# treaba); nu spun nimic despre request si ar domina numaratoarea.
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+_PROFILE_NAME_PATTERN = re.compile(r"[A-Za-z0-9_.-]+")
+
+logger = get_logger()
+_write_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    return bool(PROFILE_DIR)
+
+
+def collapse_stack(frame: FrameType) -> str | None:
+    """Stiva in format "collapsed" (radacina;...;frunza), sau None pentru un thread inactiv."""
+    labels = []
+    leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+    if leaf in _IDLE_LEAVES:
+        return None
+    current: FrameType | None = frame
+    while current is not None:
+        code = current.f_code
+        # Fara spatii ("<frozen runpy>"): numarul de esantioane este dupa ultimul spatiu.
+        labels.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}".replace(" ", "_"))
+        current = current.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class StackSampler:
+    """
+    Profiler statistic: esantioneaza stivele Python ale tuturor thread-urilor.
+
+    Motivatie:
+    Un solve trece prin event loop (validare, serializare) si prin threadpool
+    (model, CP-SAT, diagnostice), iar cProfile vede doar thread-ul in care a fost
+    pornit. Esantionarea costa doar cat ruleaza si nu incetineste apelurile mici.
+    Request-urile concurente apar si ele in stive.
+    """
+
+    def __init__(self, interval_seconds: float) -> None:
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_thread_id = threading.get_ident()
+        while not self._stopped.wait(self.interval_seconds):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id:
+                    continue
+                stack = collapse_stack(frame)
+                if stack is not None:
+                    self.stacks[stack] += 1
+
+
+def profile_trigger(scope) -> str | None:
+    path = scope.get("path", "")
+    if path.startswith(PROFILE_EXCLUDED_PREFIXES):
+        return None
+    header_name = PROFILE_HEADER.lower().encode("latin-1")
+    for name, value in scope.get("headers", []):
+        if name == header_name and value.decode("latin-1").lower() in ("1", "true", "yes"):
+            return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def _ensure_request_id(scope) -> str:
+    # Endpoint-ul genereaza altfel un id propriu; il fixam aici ca profilul
+    # sa poarte acelasi id ca liniile de log ale request-ului.
+    for name, value in scope.get("headers", []):
+        if name == b"x-request-id" and value:
+            return value.decode("latin-1")
+    request_id = uuid4().hex[:8]
+    scope["headers"] = [*scope.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+    return request_id
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI care ruleaza request-urile selectate sub `StackSampler`."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        trigger = profile_trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _ensure_request_id(scope)
+        status_code = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        sampler = StackSampler(PROFILE_INTERVAL_MS / 1000.0)
+        started_at = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            sampler.stop()
+            await run_in_threadpool(
+                write_profile,
+                sampler=sampler,
+                request_id=request_id,
+                method=scope.get("method", ""),
+                path=scope.get("path", ""),
+                status_code=status_code,
+                trigger=trigger,
+                elapsed_us=int((time.perf_counter() - started_at) * 1_000_000),
+            )
+
+
+def write_profile(
+    sampler: StackSampler,
+    request_id: str,
+    method: str,
+    path: str,
+    status_code: int,
+    trigger: str,
+    elapsed_us: int,
+) -> None:
+    """
+    Scrie `<timestamp>_<request_id>.collapsed` (o linie "stiva numar", direct
+    utilizabila de flamegraph.pl / speedscope) si `.json` cu metadatele request-ului.
+    """
+    now = time.time()
+    timestamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + f"{int(now * 1000) % 1000:03d}"
+    safe_request_id = re.sub(r"[^A-Za-z0-9_.-]", "_", request_id)[:64]
+    name = f"{timestamp}_{safe_request_id}"
+    meta = {
+        "name": name,
+        "request_id": request_id,
+        "method": method,
+        "path": path,
+        "status_code": status_code,
+        "trigger": trigger,
+        "elapsed_us": elapsed_us,
+        "interval_ms": PROFILE_INTERVAL_MS,
+        "samples": sampler.samples,
+        "stacks": len(sampler.stacks),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now)),
+    }
+    root = Path(PROFILE_DIR)
+    try:
+        with _write_lock:
+            root.mkdir(parents=True, exist_ok=True)
+            lines = [f"{stack} {count}" for stack, count in sampler.stacks.most_common()]
+            (root / f"{name}.collapsed").write_text("\n".join(lines) + "\n", encoding="utf-8")
+            (root / f"{name}.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            removed = prune_profiles(root)
+    except OSError as exc:
+        log_event(logger, "ERROR", "profile.write.failed", request_id=request_id, error=str(exc))
+        return
+    log_event(
+        logger,
+        "INFO",
+        "profile.written",
+        request_id=request_id,
+        profile=name,
+        path=path,
+        trigger=trigger,
+        samples=sampler.samples,
+        pruned=removed,
+    )
+
+
+def prune_profiles(root: Path) -> int:
+    # Numele incep cu timestamp-ul, deci ordinea alfabetica este cea cronologica.
+    metas = sorted(root.glob("*.json"))
+    removed = 0
+    for meta_path in metas[: max(0, len(metas) - PROFILE_MAX_FILES)]:
+        meta_path.unlink(missing_ok=True)
+        meta_path.with_suffix(".collapsed").unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+def list_profiles(limit: int) -> list[dict]:
+    if not profiling_enabled() or not Path(PROFILE_DIR).is_dir():
+        return []
+    profiles = []
+    for meta_path in sorted(Path(PROFILE_DIR).glob("*.json"), reverse=True)[:limit]:
+        try:
+            profiles.append(json.loads(meta_path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_path(name: str) -> Path | None:
+    if not profiling_enabled() or not _PROFILE_NAME_PATTERN.fullmatch(name):
+        return None
+    path = Path(PROFILE_DIR) / f"{name}.collapsed"
+    return path if path.is_file() else None
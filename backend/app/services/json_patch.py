@@ -0,0 +1,157 @@
+import copy
+from typing import Any
+
+
+JSON_PATCH_CONTENT_TYPE = "application/json-patch+json"
+MERGE_PATCH_CONTENT_TYPE = "application/merge-patch+json"
+
+
+class JsonPatchError(ValueError):
+    pass
+
+
+def _parse_pointer(pointer: str) -> list[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer '{pointer}'.")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _list_index(container: list, token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index '{token}'.")
+    index = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if index > limit:
+        raise JsonPatchError(f"Array index {index} out of range.")
+    return index
+
+
+def _resolve_parent(document: Any, tokens: list[str]) -> tuple[Any, str]:
+    current = document
+    for token in tokens[:-1]:
+        if isinstance(current, dict):
+            if token not in current:
+                raise JsonPatchError(f"Path segment '{token}' does not exist.")
+            current = current[token]
+        elif isinstance(current, list):
+            current = current[_list_index(current, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"Path segment '{token}' is not a container.")
+    return current, tokens[-1]
+
+
+def _get(document: Any, pointer: str) -> Any:
+    current = document
+    for token in _parse_pointer(pointer):
+        if isinstance(current, dict):
+            if token not in current:
+                raise JsonPatchError(f"Path '{pointer}' does not exist.")
+            current = current[token]
+        elif isinstance(current, list):
+            current = current[_list_index(current, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"Path '{pointer}' does not exist.")
+    return current
+
+
+def _add(document: Any, pointer: str, value: Any) -> Any:
+    tokens = _parse_pointer(pointer)
+    if not tokens:
+        return value
+    parent, token = _resolve_parent(document, tokens)
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, token, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"Cannot add at '{pointer}'.")
+    return document
+
+
+def _remove(document: Any, pointer: str) -> Any:
+    tokens = _parse_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("Cannot remove the document root.")
+    parent, token = _resolve_parent(document, tokens)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"Path '{pointer}' does not exist.")
+        del parent[token]
+    elif isinstance(parent, list):
+        del parent[_list_index(parent, token, allow_end=False)]
+    else:
+        raise JsonPatchError(f"Cannot remove at '{pointer}'.")
+    return document
+
+
+def apply_json_patch(document: Any, operations: Any) -> Any:
+    """Aplica un JSON Patch (RFC 6902). Documentul poate fi modificat in-place."""
+    if not isinstance(operations, list):
+        raise JsonPatchError("JSON Patch body must be an array of operations.")
+
+    result = document
+    for operation in operations:
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise JsonPatchError("Each JSON Patch operation needs 'op' and 'path'.")
+        op = operation["op"]
+        path = operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"Operation '{op}' needs 'value'.")
+        if op in ("move", "copy") and "from" not in operation:
+            raise JsonPatchError(f"Operation '{op}' needs 'from'.")
+
+        if op == "add":
+            result = _add(result, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            result = _remove(result, path)
+        elif op == "replace":
+            _get(result, path)
+            if path == "":
+                result = copy.deepcopy(operation["value"])
+            else:
+                result = _remove(result, path)
+                result = _add(result, path, copy.deepcopy(operation["value"]))
+        elif op == "move":
+            if path.startswith(operation["from"] + "/"):
+                raise JsonPatchError("Cannot move a value into one of its children.")
+            value = _get(result, operation["from"])
+            result = _remove(result, operation["from"])
+            result = _add(result, path, value)
+        elif op == "copy":
+            result = _add(result, path, copy.deepcopy(_get(result, operation["from"])))
+        elif op == "test":
+            if _get(result, path) != operation["value"]:
+                raise JsonPatchError(f"Test failed at '{path}'.")
+        else:
+            raise JsonPatchError(f"Unsupported JSON Patch operation '{op}'.")
+    return result
+
+
+def apply_merge_patch(document: Any, patch: Any) -> Any:
+    """Aplica un JSON Merge Patch (RFC 7386); `null` sterge cheia. Modifica in-place."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = document if isinstance(document, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def apply_patch(document: Any, patch_type: str, patch: Any) -> Any:
+    # Motivatie:
+    # Patch-urile modifica documentul in-place, ca replay-ul deltelor la incarcare sa nu
+    # copieze tot workspace-ul la fiecare delta. Apelantul da un document care ii apartine:
+    # proaspat din `json.loads` la incarcare, sau o copie a starii din cache la PATCH (un
+    # JSON Patch care esueaza la jumatate nu are voie sa lase cache-ul modificat partial).
+    if patch_type == JSON_PATCH_CONTENT_TYPE:
+        return apply_json_patch(document, patch)
+    if patch_type == MERGE_PATCH_CONTENT_TYPE:
+        return apply_merge_patch(document, patch)
+    raise JsonPatchError(f"Unsupported patch type '{patch_type}'.")
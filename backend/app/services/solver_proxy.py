@@ -1,6 +1,7 @@
+import asyncio
 import os
 import time
-from typing import Any
+from typing import Any, Awaitable, Callable
 
 import httpx
 from fastapi import HTTPException
@@ -8,14 +9,47 @@ from fastapi import HTTPException
 from ..logging_utils import get_logger, log_event
 
 SOLVER_URL = os.getenv("SOLVER_URL", "http://solver:9000")
+# Timeout-urile implicite, folosite cand clientul nu trimite un deadline.
+SOLVER_TIMEOUT_SECONDS = float(os.getenv("SOLVER_TIMEOUT_SECONDS", "60"))
+SOLVER_SCENARIOS_TIMEOUT_SECONDS = float(os.getenv("SOLVER_SCENARIOS_TIMEOUT_SECONDS", "150"))
+# Milisecundele ramase pana cand apelantul renunta; trimis mai departe solverului
+# cu timpul deja consumat in backend scazut.
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+# Scazut din deadline-ul trimis solverului: transportul raspunsului inapoi prin backend.
+DEADLINE_FORWARD_MARGIN_SECONDS = float(os.getenv("SOLVER_DEADLINE_FORWARD_MARGIN_SECONDS", "0.25"))
+# Cat de des verificam, cat asteptam solverul, daca clientul a inchis conexiunea.
+DISCONNECT_POLL_SECONDS = float(os.getenv("SOLVER_DISCONNECT_POLL_SECONDS", "0.25"))
 logger = get_logger()
 
 
+def parse_deadline(headers, started_at: float, request_id: str) -> float | None:
+    """Deadline-ul absolut (pe ceasul `time.perf_counter`) din headerul clientului, daca exista."""
+    raw_value = headers.get(DEADLINE_HEADER)
+    if raw_value is None:
+        return None
+    try:
+        timeout_ms = int(raw_value)
+    except ValueError:
+        timeout_ms = 0
+    if timeout_ms <= 0:
+        log_event(
+            logger,
+            "WARN",
+            "solver_proxy.deadline.invalid",
+            request_id=request_id,
+            value=raw_value,
+        )
+        raise HTTPException(status_code=422, detail=f"{DEADLINE_HEADER} must be a positive integer.")
+    return started_at + timeout_ms / 1000.0
+
+
 async def _post_to_solver(
     path: str,
     payload: dict[str, Any],
     timeout_seconds: float,
     request_id: str | None = None,
+    deadline: float | None = None,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
 ) -> dict[str, Any]:
     # Motivatie:
     # Centralizam comunicarea cu solverul intr-un singur loc ca sa avem:
@@ -24,6 +58,17 @@ async def _post_to_solver(
     # 3) un punct unic de modificare daca schimbam protocolul.
     started_at = time.perf_counter()
     request_id_value = request_id or "n/a"
+    if deadline is not None:
+        timeout_seconds = min(timeout_seconds, deadline - started_at)
+        if timeout_seconds <= 0:
+            log_event(
+                logger,
+                "WARN",
+                "solver_proxy.forward.deadline_exceeded",
+                request_id=request_id_value,
+                path=path,
+            )
+            raise HTTPException(status_code=504, detail="Request deadline exceeded before reaching the solver.")
     log_event(
         logger,
         "INFO",
@@ -33,13 +78,31 @@ async def _post_to_solver(
         timeout_seconds=timeout_seconds,
     )
     async with httpx.AsyncClient(timeout=timeout_seconds) as client:
-        try:
-            solver_resp = await client.post(
+        post_task = asyncio.ensure_future(
+            client.post(
                 f"{SOLVER_URL}{path}",
                 json=payload,
-                headers={"X-Request-Id": request_id_value},
+                headers={
+                    "X-Request-Id": request_id_value,
+                    DEADLINE_HEADER: str(max(1, int((timeout_seconds - DEADLINE_FORWARD_MARGIN_SECONDS) * 1000))),
+                },
             )
+        )
+        try:
+            # Clientul plecat (tab inchis, solve repornit) nu mai citeste raspunsul:
+            # inchidem conexiunea catre solver si cerem explicit oprirea cautarii.
+            while not post_task.done():
+                await asyncio.wait({post_task}, timeout=DISCONNECT_POLL_SECONDS)
+                if not post_task.done() and is_disconnected is not None and await is_disconnected():
+                    post_task.cancel()
+                    await _cancel_on_solver(request_id_value, path, reason="client_disconnected")
+                    raise HTTPException(status_code=499, detail="Client closed request.")
+            solver_resp = post_task.result()
             solver_resp.raise_for_status()
+        except asyncio.CancelledError:
+            post_task.cancel()
+            await _cancel_on_solver(request_id_value, path, reason="request_cancelled")
+            raise
         except httpx.HTTPStatusError as exc:
             detail = exc.response.text or "Solver rejected request."
             elapsed_us = int((time.perf_counter() - started_at) * 1_000_000)
@@ -54,6 +117,18 @@ async def _post_to_solver(
                 detail=detail,
             )
             raise HTTPException(status_code=exc.response.status_code, detail=detail) from exc
+        except httpx.TimeoutException as exc:
+            elapsed_us = int((time.perf_counter() - started_at) * 1_000_000)
+            log_event(
+                logger,
+                "WARN",
+                "solver_proxy.forward.timeout",
+                request_id=request_id_value,
+                path=path,
+                timeout_seconds=timeout_seconds,
+                elapsed_us=elapsed_us,
+            )
+            raise HTTPException(status_code=504, detail="Solver did not answer before the deadline.") from exc
         except httpx.HTTPError as exc:
             elapsed_us = int((time.perf_counter() - started_at) * 1_000_000)
             log_event(
@@ -79,5 +154,55 @@ async def _post_to_solver(
     return solver_resp.json()
 
 
-async def solve_schedule(payload: dict[str, Any], request_id: str | None = None) -> dict[str, Any]:
-    return await _post_to_solver("/solve", payload, timeout_seconds=60.0, request_id=request_id)
+async def _cancel_on_solver(request_id: str, path: str, reason: str) -> None:
+    # Best effort: solve-ul poate sa se fi terminat deja (404) sau solverul sa nu raspunda.
+    log_event(
+        logger,
+        "INFO",
+        "solver_proxy.forward.cancelled",
+        request_id=request_id,
+        path=path,
+        reason=reason,
+    )
+    if request_id == "n/a":
+        return
+    try:
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            await client.post(f"{SOLVER_URL}/solve/cancel/{request_id}")
+    except httpx.HTTPError:
+        pass
+
+
+async def solve_schedule(
+    payload: dict[str, Any],
+    request_id: str | None = None,
+    deadline: float | None = None,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+) -> dict[str, Any]:
+    # Formatul columnar are `shifts` ca obiect de liste paralele, nu lista de ture.
+    path = "/solve/columnar" if isinstance(payload.get("shifts"), dict) else "/solve"
+    return await _post_to_solver(
+        path,
+        payload,
+        timeout_seconds=SOLVER_TIMEOUT_SECONDS,
+        request_id=request_id,
+        deadline=deadline,
+        is_disconnected=is_disconnected,
+    )
+
+
+async def solve_scenarios(
+    payload: dict[str, Any],
+    request_id: str | None = None,
+    deadline: float | None = None,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+) -> dict[str, Any]:
+    # Bugetul de timp al batch-ului este limitat in solver la 120s.
+    return await _post_to_solver(
+        "/solve/scenarios",
+        payload,
+        timeout_seconds=SOLVER_SCENARIOS_TIMEOUT_SECONDS,
+        request_id=request_id,
+        deadline=deadline,
+        is_disconnected=is_disconnected,
+    )
@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from ..db import AppStateBlob, AppStateHistory
+
+try:  # zstd este optional; fara el folosim gzip.
+    import zstandard
+except ImportError:  # pragma: no cover - depinde de mediu
+    zstandard = None
+
+# Politica de retentie: pastram tot din ultimele ore, apoi cate o versiune
+# pe ora, apoi cate una pe zi; ce e mai vechi se sterge.
+STATE_HISTORY_KEEP_ALL_HOURS = int(os.getenv("STATE_HISTORY_KEEP_ALL_HOURS", "24"))
+STATE_HISTORY_HOURLY_DAYS = int(os.getenv("STATE_HISTORY_HOURLY_DAYS", "7"))
+STATE_HISTORY_DAILY_DAYS = int(os.getenv("STATE_HISTORY_DAILY_DAYS", "90"))
+STATE_HISTORY_RETENTION_EVERY = int(os.getenv("STATE_HISTORY_RETENTION_EVERY", "25"))
+
+_inserts_since_retention: dict[str, int] = defaultdict(int)
+
+
+def _compress(raw: bytes) -> tuple[str, bytes]:
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=6).compress(raw)
+    return "gzip", gzip.compress(raw, compresslevel=6)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise HTTPException(status_code=500, detail="History blob is zstd-compressed but zstandard is missing.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise HTTPException(status_code=500, detail=f"Unknown history blob codec '{codec}'.")
+
+
+def record_history(db: Session, key: str, version: int, serialized: str, created_at: datetime) -> bool:
+    """
+    Adauga o versiune in istoric (fara commit; ruleaza in tranzactia writer-ului).
+
+    Continutul este stocat comprimat, adresat dupa sha256, deci autosave-urile
+    identice refolosesc acelasi blob. Daca ultima intrare are acelasi hash,
+    nu adaugam nici macar un rand nou de metadate.
+    """
+    raw = serialized.encode("utf-8")
+    content_hash = hashlib.sha256(raw).hexdigest()
+
+    latest_hash = (
+        db.query(AppStateHistory.content_hash)
+        .filter(AppStateHistory.key == key)
+        .order_by(AppStateHistory.created_at.desc(), AppStateHistory.id.desc())
+        .limit(1)
+        .scalar()
+    )
+    if latest_hash == content_hash:
+        return False
+
+    if db.get(AppStateBlob, content_hash) is None:
+        codec, data = _compress(raw)
+        db.add(
+            AppStateBlob(
+                content_hash=content_hash,
+                codec=codec,
+                data=data,
+                size_bytes=len(raw),
+                compressed_bytes=len(data),
+            )
+        )
+        # Sesiunea nu face autoflush: alt workspace din acelasi batch poate avea acelasi continut.
+        db.flush()
+    db.add(
+        AppStateHistory(
+            key=key,
+            version=version,
+            content_hash=content_hash,
+            size_bytes=len(raw),
+            created_at=created_at,
+        )
+    )
+
+    _inserts_since_retention[key] += 1
+    if _inserts_since_retention[key] >= STATE_HISTORY_RETENTION_EVERY:
+        _inserts_since_retention[key] = 0
+        db.flush()
+        apply_history_retention(db, key, now=created_at)
+    return True
+
+
+def _retention_bucket(created_at: datetime, now: datetime) -> tuple | None:
+    age = now - created_at
+    if age <= timedelta(hours=STATE_HISTORY_KEEP_ALL_HOURS):
+        return None
+    if age <= timedelta(days=STATE_HISTORY_HOURLY_DAYS):
+        return ("hour", created_at.replace(minute=0, second=0, microsecond=0))
+    if age <= timedelta(days=STATE_HISTORY_DAILY_DAYS):
+        return ("day", created_at.date())
+    return ("expired",)
+
+
+def apply_history_retention(db: Session, key: str, now: datetime | None = None) -> int:
+    now = now or datetime.utcnow()
+    rows = (
+        db.query(AppStateHistory.id, AppStateHistory.created_at)
+        .filter(AppStateHistory.key == key)
+        .order_by(AppStateHistory.created_at.desc(), AppStateHistory.id.desc())
+        .all()
+    )
+
+    seen_buckets: set[tuple] = set()
+    drop_ids: list[int] = []
+    for row_id, created_at in rows:
+        bucket = _retention_bucket(created_at, now)
+        if bucket is None:
+            continue
+        # Pastram cea mai noua versiune din fiecare ora/zi.
+        if bucket == ("expired",) or bucket in seen_buckets:
+            drop_ids.append(row_id)
+        else:
+            seen_buckets.add(bucket)
+
+    if not drop_ids:
+        return 0
+    db.query(AppStateHistory).filter(AppStateHistory.id.in_(drop_ids)).delete(synchronize_session=False)
+    referenced = db.query(AppStateHistory.content_hash).distinct()
+    db.query(AppStateBlob).filter(~AppStateBlob.content_hash.in_(referenced)).delete(synchronize_session=False)
+    return len(drop_ids)
+
+
+def _history_item(row: AppStateHistory) -> dict[str, Any]:
+    return {
+        "version": row.version,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "content_hash": row.content_hash,
+        "size_bytes": row.size_bytes,
+    }
+
+
+def list_history(
+    db: Session,
+    key: str,
+    before: datetime | None = None,
+    limit: int = 50,
+) -> list[dict[str, Any]]:
+    # Citim doar coloanele de metadate; blob-urile nu sunt incarcate/decomprimate.
+    query = db.query(AppStateHistory).filter(AppStateHistory.key == key)
+    if before is not None:
+        query = query.filter(AppStateHistory.created_at <= before)
+    rows = query.order_by(AppStateHistory.created_at.desc(), AppStateHistory.id.desc()).limit(limit).all()
+    return [_history_item(row) for row in rows]
+
+
+def get_history_state(db: Session, key: str, version: int) -> dict[str, Any]:
+    row = (
+        db.query(AppStateHistory)
+        .filter(AppStateHistory.key == key, AppStateHistory.version == version)
+        .order_by(AppStateHistory.id.desc())
+        .first()
+    )
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"History version {version} not found.")
+    blob = db.get(AppStateBlob, row.content_hash)
+    if blob is None:
+        raise HTTPException(status_code=500, detail=f"History blob for version {version} is missing.")
+    try:
+        state = json.loads(_decompress(blob.codec, blob.data))
+    except (OSError, json.JSONDecodeError) as exc:
+        raise HTTPException(status_code=500, detail=f"History version {version} is corrupted.") from exc
+    return {**_history_item(row), "state": state}
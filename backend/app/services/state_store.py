@@ -1,30 +1,214 @@
+import copy
 import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Any
 
 from fastapi import HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from ..db import AppState
+from ..db import AppState, AppStateDelta
+from .json_patch import JsonPatchError, apply_patch
+from .state_writer import state_writer
 
+# Dupa cate delte (sau cand deltele depasesc marimea snapshot-ului)
+# rescriem snapshot-ul complet si stergem deltele acumulate.
+STATE_COMPACT_EVERY = int(os.getenv("STATE_COMPACT_EVERY", "50"))
+# Limitele cache-ului LRU de workspace-uri decodate (numar intrari / bytes JSON).
+STATE_CACHE_MAX_ENTRIES = int(os.getenv("STATE_CACHE_MAX_ENTRIES", "256"))
+STATE_CACHE_MAX_BYTES = int(os.getenv("STATE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Numarul fix de lock-uri de scriere; fiecare cheie foloseste lock-ul dat de hash-ul ei.
+STATE_LOCK_STRIPES = int(os.getenv("STATE_LOCK_STRIPES", "1024"))
 
-def get_json_state(db: Session, key: str) -> dict[str, Any]:
+
+@dataclass
+class CachedState:
+    state: Any
+    version: int
+    updated_at: datetime | None
+    snapshot_bytes: int
+    pending_delta_count: int = 0
+    pending_delta_bytes: int = 0
+
+
+class StateCache:
+    """
+    LRU marginit de workspace-uri decodate, cu lock-uri de scriere impartite pe chei (striping).
+
+    Motivatie:
+    - GET-urile pe workspace-uri "calde" nu mai ating SQLite si nici `json.loads`;
+    - cache-ul este actualizat write-through inainte ca writer-ul sa persiste
+      scrierea, deci nu evacuam chei cu scrieri inca nepersistate;
+    - un save mare pentru un tenant tine doar lock-ul stripe-ului lui; cu multe
+      stripe-uri, alti tenanti il impart rar. Numarul de lock-uri e fix, deci nu creste
+      cu numarul de workspace-uri vazute (un lock per cheie ar trai dupa evacuare).
+    Presupune un singur proces backend per fisier SQLite.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, lock_stripes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, CachedState] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(max(1, lock_stripes))]
+
+    def key_lock(self, key: str) -> threading.Lock:
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def get(self, key: str) -> CachedState | None:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+            return cached
+
+    def put(self, key: str, cached: CachedState) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous.snapshot_bytes
+            self._entries[key] = cached
+            self._total_bytes += cached.snapshot_bytes
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries and self._total_bytes <= self.max_bytes:
+                return
+            if len(self._entries) == 1 or state_writer.has_pending(key):
+                continue
+            evicted = self._entries.pop(key)
+            self._total_bytes -= evicted.snapshot_bytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+_state_cache = StateCache(
+    max_entries=STATE_CACHE_MAX_ENTRIES,
+    max_bytes=STATE_CACHE_MAX_BYTES,
+    lock_stripes=STATE_LOCK_STRIPES,
+)
+
+
+def format_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_etag(value: str | None) -> int | None:
+    if not value:
+        return None
+    candidate = value.strip()
+    if candidate.startswith("W/"):
+        candidate = candidate[2:]
+    candidate = candidate.strip('"')
+    return int(candidate) if candidate.isdigit() else None
+
+
+def _isoformat(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def _load_state_from_db(db: Session, key: str) -> CachedState | None:
     row = db.query(AppState).filter(AppState.key == key).first()
     if not row:
-        return {"exists": False, "state": None, "updated_at": None}
+        return None
 
     try:
         state = json.loads(row.value)
     except json.JSONDecodeError as exc:
         raise HTTPException(status_code=500, detail="Stored schedule state is invalid JSON.") from exc
 
+    deltas = (
+        db.query(AppStateDelta)
+        .filter(AppStateDelta.key == key, AppStateDelta.version > row.version)
+        .order_by(AppStateDelta.version)
+        .all()
+    )
+    for delta in deltas:
+        try:
+            state = apply_patch(state, delta.patch_type, json.loads(delta.patch))
+        except (json.JSONDecodeError, JsonPatchError) as exc:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Stored schedule state delta v{delta.version} cannot be applied.",
+            ) from exc
+
+    head = deltas[-1] if deltas else None
+    return CachedState(
+        state=state,
+        version=head.version if head else row.version,
+        updated_at=head.created_at if head else row.updated_at,
+        snapshot_bytes=len(row.value),
+        pending_delta_count=len(deltas),
+        pending_delta_bytes=sum(len(delta.patch) for delta in deltas),
+    )
+
+
+def _get_cached(db: Session, key: str) -> CachedState | None:
+    cached = _state_cache.get(key)
+    if cached is not None:
+        return cached
+    with _state_cache.key_lock(key):
+        return _get_cached_locked(db, key)
+
+
+def _get_cached_locked(db: Session, key: str) -> CachedState | None:
+    # Apelat cu lock-ul cheii tinut: o singura incarcare din SQLite per cheie.
+    cached = _state_cache.get(key)
+    if cached is None:
+        cached = _load_state_from_db(db, key)
+        if cached is not None:
+            _state_cache.put(key, cached)
+    return cached
+
+
+def get_state_version(db: Session, key: str) -> int | None:
+    cached = _state_cache.get(key)
+    if cached is not None:
+        return cached.version
+    # Citim doar versiunile (fara blob-ul JSON), pentru GET conditionat (304).
+    snapshot_version = db.query(AppState.version).filter(AppState.key == key).scalar()
+    if snapshot_version is None:
+        return None
+    delta_version = db.query(func.max(AppStateDelta.version)).filter(AppStateDelta.key == key).scalar()
+    return max(snapshot_version, delta_version or 0)
+
+
+def get_json_state(db: Session, key: str) -> dict[str, Any]:
+    cached = _get_cached(db, key)
+    if cached is None:
+        return {"exists": False, "state": None, "updated_at": None, "version": None}
+
     return {
         "exists": True,
-        "state": state,
-        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+        "state": cached.state,
+        "updated_at": _isoformat(cached.updated_at),
+        "version": cached.version,
     }
 
 
-def put_json_state(db: Session, key: str, payload: dict[str, Any]) -> dict[str, Any]:
+def _check_expected_version(expected_version: int | None, current_version: int | None) -> None:
+    if expected_version is not None and expected_version != (current_version or 0):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Schedule state version conflict: expected {expected_version}, current {current_version or 0}.",
+        )
+
+
+def put_json_state(
+    db: Session,
+    key: str,
+    payload: dict[str, Any],
+    expected_version: int | None = None,
+) -> dict[str, Any]:
     # Motivatie:
     # Persistam tot workspace-ul UI ca JSON "snapshot" pentru a evita
     # schema migrations frecvente in faza de prototip.
@@ -34,13 +218,91 @@ def put_json_state(db: Session, key: str, payload: dict[str, Any]) -> dict[str,
     except (TypeError, ValueError) as exc:
         raise HTTPException(status_code=422, detail="Schedule state payload is not JSON serializable.") from exc
 
-    row = db.query(AppState).filter(AppState.key == key).first()
-    if row is None:
-        row = AppState(key=key, value=serialized)
-        db.add(row)
-    else:
-        row.value = serialized
-
-    db.commit()
-    db.refresh(row)
-    return {"ok": True, "updated_at": row.updated_at.isoformat() if row.updated_at else None}
+    with _state_cache.key_lock(key):
+        cached = _get_cached_locked(db, key)
+        current_version = cached.version if cached else None
+        _check_expected_version(expected_version, current_version)
+        new_version = (current_version or 0) + 1
+        updated_at = datetime.utcnow()
+        # Intai writer-ul, apoi cache-ul: o cheie cu scriere in asteptare nu poate fi evacuata.
+        state_writer.submit_snapshot(key, serialized, new_version, updated_at, payload)
+        _state_cache.put(
+            key,
+            CachedState(
+                state=payload,
+                version=new_version,
+                updated_at=updated_at,
+                snapshot_bytes=len(serialized),
+            ),
+        )
+    return {"ok": True, "updated_at": _isoformat(updated_at), "version": new_version}
+
+
+def patch_json_state(
+    db: Session,
+    key: str,
+    patch_type: str,
+    patch: Any,
+    expected_version: int,
+) -> dict[str, Any]:
+    # Motivatie:
+    # Autosave-ul trimite doar diferenta. In mod normal scriem un singur rand
+    # mic in `app_state_delta`; snapshot-ul complet este rescris doar la compactare.
+    with _state_cache.key_lock(key):
+        cached = _get_cached_locked(db, key)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Schedule state does not exist yet; use PUT first.")
+        _check_expected_version(expected_version, cached.version)
+
+        try:
+            serialized_patch = json.dumps(patch)
+            # Starea din cache poate fi serializata in paralel de un GET; o copiem.
+            state = apply_patch(copy.deepcopy(cached.state), patch_type, patch)
+        except (TypeError, ValueError) as exc:
+            raise HTTPException(status_code=422, detail=f"Schedule state patch cannot be applied: {exc}") from exc
+        if not isinstance(state, dict):
+            # Ca la PUT, starea trebuie sa ramana un obiect JSON; respingem inainte de versiune noua.
+            raise HTTPException(
+                status_code=422,
+                detail=f"Schedule state patch must produce a JSON object, got {type(state).__name__}.",
+            )
+
+        new_version = cached.version + 1
+        updated_at = datetime.utcnow()
+        pending_delta_count = cached.pending_delta_count + 1
+        pending_delta_bytes = cached.pending_delta_bytes + len(serialized_patch)
+        compacted = pending_delta_count >= STATE_COMPACT_EVERY or pending_delta_bytes >= cached.snapshot_bytes
+        if compacted:
+            serialized = json.dumps(state)
+            state_writer.submit_snapshot(key, serialized, new_version, updated_at, state)
+            _state_cache.put(
+                key,
+                CachedState(
+                    state=state,
+                    version=new_version,
+                    updated_at=updated_at,
+                    snapshot_bytes=len(serialized),
+                ),
+            )
+        else:
+            state_writer.submit_delta(key, new_version, patch_type, serialized_patch, updated_at, state)
+            _state_cache.put(
+                key,
+                CachedState(
+                    state=state,
+                    version=new_version,
+                    updated_at=updated_at,
+                    snapshot_bytes=cached.snapshot_bytes,
+                    pending_delta_count=pending_delta_count,
+                    pending_delta_bytes=pending_delta_bytes,
+                ),
+            )
+    return {"ok": True, "updated_at": _isoformat(updated_at), "version": new_version, "compacted": compacted}
+
+
+def flush_state_writes(timeout: float | None = None) -> bool:
+    return state_writer.flush(timeout=timeout)
+
+
+def get_state_writer_health() -> dict[str, Any]:
+    return state_writer.health()
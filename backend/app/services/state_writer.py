@@ -0,0 +1,294 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from ..db import AppState, AppStateDelta, SessionLocal
+from ..logging_utils import get_logger, log_event
+from .state_history import record_history
+
+# Fereastra in care PUT/PATCH-urile pentru aceeasi cheie sunt unite intr-o singura scriere.
+STATE_WRITE_COALESCE_MS = float(os.getenv("STATE_WRITE_COALESCE_MS", "50"))
+# Incercari per cheie inainte de a o parca (nepersistata, raportata in /health) si backoff-ul dintre ele.
+STATE_WRITE_MAX_ATTEMPTS = int(os.getenv("STATE_WRITE_MAX_ATTEMPTS", "5"))
+STATE_WRITE_RETRY_BASE_MS = float(os.getenv("STATE_WRITE_RETRY_BASE_MS", "500"))
+STATE_WRITE_RETRY_MAX_MS = float(os.getenv("STATE_WRITE_RETRY_MAX_MS", "30000"))
+logger = get_logger()
+
+
+@dataclass
+class PendingWrite:
+    snapshot: str | None = None
+    snapshot_version: int | None = None
+    deltas: list[tuple[int, str, str]] = field(default_factory=list)
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+    submitted: int = 0
+    # Ultima stare completa (obiect imutabil din cache) pentru istoric.
+    latest_state: Any = None
+    latest_version: int | None = None
+    # Incercari esuate si momentul (time.monotonic) de la care cheia poate fi reincercata.
+    attempts: int = 0
+    retry_at: float = 0.0
+    last_error: str | None = None
+    failing_since: datetime | None = None
+
+
+class StateWriter:
+    """
+    Thread dedicat pentru scrierile in SQLite.
+
+    Request-urile nu mai asteapta commit + fsync: pun scrierea in `pending`
+    si raspund imediat (starea curenta e servita din cache-ul din state_store).
+    Writer-ul asteapta `STATE_WRITE_COALESCE_MS` dupa prima scriere, apoi
+    persista intr-o singura tranzactie ultima versiune a fiecarei chei.
+
+    Daca tranzactia esueaza, cheile sunt scrise separat, ca o cheie stricata sa nu
+    blocheze restul. O cheie care esueaza este reincercata cu backoff exponential;
+    dupa `STATE_WRITE_MAX_ATTEMPTS` este parcata: nu mai e reincercata pana la
+    urmatoarea scriere pentru ea, ramane in cache si apare in `health()`.
+    """
+
+    def __init__(self, coalesce_seconds: float) -> None:
+        self.coalesce_seconds = coalesce_seconds
+        self._pending: dict[str, PendingWrite] = {}
+        self._condition = threading.Condition()
+        self._inflight = 0
+        self._inflight_keys: set[str] = set()
+        self._parked: dict[str, PendingWrite] = {}
+        self._thread: threading.Thread | None = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="state-writer", daemon=True)
+            self._thread.start()
+
+    def _pending_for(self, key: str) -> PendingWrite:
+        # O cheie parcata primeste o noua sansa la urmatoarea scriere; deltele ei raman
+        # in fata celor noi, ca lantul de versiuni din SQLite sa nu aiba goluri.
+        parked = self._parked.pop(key, None)
+        if parked is not None and key not in self._pending:
+            parked.attempts = 0
+            parked.retry_at = 0.0
+            self._pending[key] = parked
+        return self._pending.setdefault(key, PendingWrite())
+
+    def submit_snapshot(self, key: str, serialized: str, version: int, updated_at: datetime, state: Any) -> None:
+        with self._condition:
+            pending = self._pending_for(key)
+            # Snapshot-ul nou include deja toate deltele anterioare din fereastra.
+            pending.snapshot = serialized
+            pending.snapshot_version = version
+            pending.deltas.clear()
+            pending.attempts = 0
+            pending.retry_at = 0.0
+            pending.updated_at = updated_at
+            pending.submitted += 1
+            pending.latest_state = state
+            pending.latest_version = version
+            self._ensure_started()
+            self._condition.notify_all()
+
+    def submit_delta(
+        self,
+        key: str,
+        version: int,
+        patch_type: str,
+        patch: str,
+        updated_at: datetime,
+        state: Any,
+    ) -> None:
+        with self._condition:
+            pending = self._pending_for(key)
+            pending.deltas.append((version, patch_type, patch))
+            pending.updated_at = updated_at
+            pending.submitted += 1
+            pending.latest_state = state
+            pending.latest_version = version
+            self._ensure_started()
+            self._condition.notify_all()
+
+    def has_pending(self, key: str) -> bool:
+        # Include batch-ul aflat in curs de scriere si cheile parcate (inca necomise in SQLite).
+        with self._condition:
+            return key in self._pending or key in self._inflight_keys or key in self._parked
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Asteapta pana cand toate scrierile trimise pana acum sunt persistate sau parcate.
+        Intoarce False la timeout sau daca exista chei parcate (nepersistate).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._condition.notify_all()
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return not self._parked
+
+    def health(self) -> dict[str, Any]:
+        with self._condition:
+            retrying = {key: pending for key, pending in self._pending.items() if pending.attempts}
+            return {
+                "pending_keys": len(self._pending) + len(self._inflight_keys),
+                "retrying_keys": sorted(retrying),
+                "unpersisted_keys": [
+                    {
+                        "key": key,
+                        "version": parked.latest_version,
+                        "attempts": parked.attempts,
+                        "failing_since": parked.failing_since.isoformat() if parked.failing_since else None,
+                        "error": parked.last_error,
+                    }
+                    for key, parked in sorted(self._parked.items())
+                ],
+            }
+
+    def _seconds_until_due(self) -> float | None:
+        # Apelat cu conditia tinuta: cheile in backoff raman in `pending` pana le vine randul.
+        if not self._pending:
+            return None
+        return max(0.0, min(pending.retry_at for pending in self._pending.values()) - time.monotonic())
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while (wait_seconds := self._seconds_until_due()) != 0.0:
+                    self._condition.wait(wait_seconds)
+            # Lasam fereastra de coalescing sa se umple inainte de a scrie.
+            if self.coalesce_seconds > 0:
+                time.sleep(self.coalesce_seconds)
+            with self._condition:
+                now = time.monotonic()
+                due_keys = [key for key, pending in self._pending.items() if pending.retry_at <= now]
+                batch = {key: self._pending.pop(key) for key in due_keys}
+                self._inflight += 1
+                self._inflight_keys = set(batch)
+            try:
+                self._write_batch(batch)
+            except Exception as exc:
+                log_event(logger, "ERROR", "state.writer.flush_failed", keys=len(batch), error=str(exc))
+                self._write_keys_separately(batch, str(exc))
+            finally:
+                with self._condition:
+                    self._inflight -= 1
+                    self._inflight_keys = set()
+                    self._condition.notify_all()
+
+    def _write_keys_separately(self, batch: dict[str, PendingWrite], batch_error: str) -> None:
+        # Izolam cheia stricata: celelalte din batch se persista in tranzactii proprii.
+        for key, pending in batch.items():
+            error = batch_error
+            if len(batch) > 1:
+                try:
+                    self._write_batch({key: pending})
+                    continue
+                except Exception as exc:
+                    error = str(exc)
+            with self._condition:
+                self._requeue(key, pending, error)
+
+    def _requeue(self, key: str, failed: PendingWrite, error: str) -> None:
+        failed.attempts += 1
+        failed.last_error = error
+        failed.failing_since = failed.failing_since or datetime.utcnow()
+        newer = self._pending.get(key)
+        if newer is not None and newer.snapshot is not None:
+            # Snapshot-ul nou inlocuieste tot ce a esuat.
+            return
+        if newer is not None:
+            # Deltele noi se aplica peste cele esuate; pastram ordinea versiunilor.
+            failed.deltas.extend(newer.deltas)
+            failed.updated_at = newer.updated_at
+            failed.submitted += newer.submitted
+            failed.latest_state = newer.latest_state
+            failed.latest_version = newer.latest_version
+        if failed.attempts >= STATE_WRITE_MAX_ATTEMPTS:
+            self._pending.pop(key, None)
+            self._parked[key] = failed
+            log_event(
+                logger,
+                "ERROR",
+                "state.writer.key_parked",
+                key=key,
+                version=failed.latest_version,
+                attempts=failed.attempts,
+                error=error,
+            )
+            return
+        backoff_ms = min(STATE_WRITE_RETRY_MAX_MS, STATE_WRITE_RETRY_BASE_MS * 2 ** (failed.attempts - 1))
+        failed.retry_at = time.monotonic() + backoff_ms / 1000.0
+        self._pending[key] = failed
+        log_event(
+            logger,
+            "WARN",
+            "state.writer.key_retry",
+            key=key,
+            attempts=failed.attempts,
+            retry_in_ms=int(backoff_ms),
+            error=error,
+        )
+
+    def _write_batch(self, batch: dict[str, PendingWrite]) -> None:
+        started_at = time.perf_counter()
+        db = SessionLocal()
+        try:
+            for key, pending in batch.items():
+                if pending.snapshot is not None:
+                    row = db.query(AppState).filter(AppState.key == key).first()
+                    if row is None:
+                        db.add(
+                            AppState(
+                                key=key,
+                                value=pending.snapshot,
+                                version=pending.snapshot_version,
+                                updated_at=pending.updated_at,
+                            )
+                        )
+                    else:
+                        row.value = pending.snapshot
+                        row.version = pending.snapshot_version
+                        row.updated_at = pending.updated_at
+                    db.query(AppStateDelta).filter(
+                        AppStateDelta.key == key,
+                        AppStateDelta.version <= pending.snapshot_version,
+                    ).delete(synchronize_session=False)
+                for version, patch_type, patch in pending.deltas:
+                    db.add(
+                        AppStateDelta(
+                            key=key,
+                            version=version,
+                            patch_type=patch_type,
+                            patch=patch,
+                            created_at=pending.updated_at,
+                        )
+                    )
+                if pending.latest_version is not None:
+                    # O intrare de istoric per fereastra de coalescing (nu per keystroke).
+                    if pending.latest_version == pending.snapshot_version:
+                        history_serialized = pending.snapshot
+                    else:
+                        history_serialized = json.dumps(pending.latest_state)
+                    record_history(db, key, pending.latest_version, history_serialized, pending.updated_at)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        log_event(
+            logger,
+            "DEBUG",
+            "state.writer.flush",
+            keys=len(batch),
+            coalesced_writes=sum(pending.submitted for pending in batch.values()),
+            elapsed_us=int((time.perf_counter() - started_at) * 1_000_000),
+        )
+
+
+state_writer = StateWriter(coalesce_seconds=STATE_WRITE_COALESCE_MS / 1000.0)
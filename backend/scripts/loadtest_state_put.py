@@ -0,0 +1,113 @@
+"""
+Load test pentru PUT-urile de workspace state (autosave).
+
+Compara calea veche (sesiune + query + commit + refresh sincron pe un engine
+SQLite implicit, pentru fiecare PUT) cu state_store-ul curent (WAL + cache
+in proces + writer dedicat care coalesceaza rafalele pe aceeasi cheie).
+
+Rulare (din `backend/`):
+
+    python -m scripts.loadtest_state_put --threads 8 --puts 200 --payload-kb 64
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+def _run_threads(threads: int, puts_per_thread: int, keys: int, worker) -> float:
+    barrier = threading.Barrier(threads)
+
+    def run(thread_idx: int) -> None:
+        barrier.wait()
+        for put_idx in range(puts_per_thread):
+            worker(f"workspace_{(thread_idx + put_idx) % keys}", put_idx)
+
+    started_at = time.perf_counter()
+    pool = [threading.Thread(target=run, args=(idx,)) for idx in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - started_at
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--puts", type=int, default=200, help="PUTs per thread")
+    parser.add_argument("--keys", type=int, default=1, help="distinct state keys")
+    parser.add_argument("--payload-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="creatura-loadtest-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'tuned.db'}"
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.db import AppState, Base, SessionLocal, ensure_schema
+    from app.services.state_store import flush_state_writes, put_json_state
+
+    payload = {"employees": [{"id": f"e{idx}", "name": "x" * 48} for idx in range(args.payload_kb * 12)]}
+    total_puts = args.threads * args.puts
+
+    # Calea veche: engine SQLite implicit (rollback journal, synchronous=FULL), commit per PUT.
+    baseline_engine = create_engine(
+        f"sqlite:///{workdir / 'baseline.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(bind=baseline_engine)
+    BaselineSession = sessionmaker(autocommit=False, autoflush=False, bind=baseline_engine)
+    baseline_lock = threading.Lock()
+
+    def baseline_put(key: str, put_idx: int) -> None:
+        db = BaselineSession()
+        try:
+            serialized = json.dumps({**payload, "rev": put_idx})
+            # Fara lock, SQLite implicit arunca "database is locked" sub concurenta.
+            with baseline_lock:
+                row = db.query(AppState).filter(AppState.key == key).first()
+                if row is None:
+                    row = AppState(key=key, value=serialized)
+                    db.add(row)
+                else:
+                    row.value = serialized
+                db.commit()
+                db.refresh(row)
+        finally:
+            db.close()
+
+    ensure_schema()
+
+    def tuned_put(key: str, put_idx: int) -> None:
+        db = SessionLocal()
+        try:
+            put_json_state(db, key, {**payload, "rev": put_idx})
+        finally:
+            db.close()
+
+    baseline_seconds = _run_threads(args.threads, args.puts, args.keys, baseline_put)
+    tuned_started_at = time.perf_counter()
+    _run_threads(args.threads, args.puts, args.keys, tuned_put)
+    tuned_ack_seconds = time.perf_counter() - tuned_started_at
+    flush_state_writes()
+    tuned_seconds = time.perf_counter() - tuned_started_at
+
+    print(f"threads={args.threads} puts={total_puts} keys={args.keys} payload_kb~{args.payload_kb}")
+    print(f"baseline : {total_puts / baseline_seconds:10.1f} PUT/s ({baseline_seconds:.2f}s)")
+    print(
+        f"tuned    : {total_puts / tuned_seconds:10.1f} PUT/s ({tuned_seconds:.2f}s incl. final flush, "
+        f"{tuned_ack_seconds:.2f}s until last response)"
+    )
+
+
+if __name__ == "__main__":
+    main()
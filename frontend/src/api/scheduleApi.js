@@ -1,3 +1,5 @@
+import { SOLVE_TIMEOUT_MS } from "../constants/schedule";
+
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
 
 async function readErrorBody(resp) {
@@ -5,8 +7,20 @@ async function readErrorBody(resp) {
   return text || "Unknown backend error";
 }
 
-export async function fetchScheduleState() {
-  const resp = await fetch(`${API_URL}/state/schedule`);
+function versionEtag(version) {
+  return `"${version}"`;
+}
+
+// Returneaza `null` cand `knownVersion` este deja versiunea curenta (HTTP 304).
+export async function fetchScheduleState(knownVersion = null) {
+  const headers = {};
+  if (knownVersion !== null && knownVersion !== undefined) {
+    headers["If-None-Match"] = versionEtag(knownVersion);
+  }
+  const resp = await fetch(`${API_URL}/state/schedule`, { headers });
+  if (resp.status === 304) {
+    return null;
+  }
   if (!resp.ok) {
     const detail = await readErrorBody(resp);
     throw new Error(`Load failed (${resp.status}): ${detail}`);
@@ -14,10 +28,14 @@ export async function fetchScheduleState() {
   return resp.json();
 }
 
-export async function saveScheduleState(payload, signal) {
+export async function saveScheduleState(payload, signal, expectedVersion = null) {
+  const headers = { "Content-Type": "application/json" };
+  if (expectedVersion !== null && expectedVersion !== undefined) {
+    headers["If-Match"] = versionEtag(expectedVersion);
+  }
   const resp = await fetch(`${API_URL}/state/schedule`, {
     method: "PUT",
-    headers: { "Content-Type": "application/json" },
+    headers,
     body: JSON.stringify(payload),
     signal,
   });
@@ -28,19 +46,54 @@ export async function saveScheduleState(payload, signal) {
   return resp.json();
 }
 
+// `patch` este un JSON Merge Patch (obiect) sau un JSON Patch (array de operatii).
+// Pe 409 clientul trebuie sa reincarce starea si sa reaplice modificarile.
+export async function patchScheduleState(patch, expectedVersion, signal) {
+  const contentType = Array.isArray(patch) ? "application/json-patch+json" : "application/merge-patch+json";
+  const resp = await fetch(`${API_URL}/state/schedule`, {
+    method: "PATCH",
+    headers: { "Content-Type": contentType, "If-Match": versionEtag(expectedVersion) },
+    body: JSON.stringify(patch),
+    signal,
+  });
+  if (!resp.ok) {
+    const detail = await readErrorBody(resp);
+    const error = new Error(`Patch failed (${resp.status}): ${detail}`);
+    error.status = resp.status;
+    throw error;
+  }
+  return resp.json();
+}
+
+// `options.timeoutMs`: cat asteapta clientul; trimis ca deadline backend-ului si solverului,
+// care isi incadreaza cautarea CP-SAT in timpul ramas.
 export async function solveSchedule(payload, options = {}) {
   const headers = { "Content-Type": "application/json" };
   if (options.requestId) {
     headers["X-Request-Id"] = String(options.requestId);
   }
-  const resp = await fetch(`${API_URL}/solve/schedule`, {
-    method: "POST",
-    headers,
-    body: JSON.stringify(payload),
-  });
-  if (!resp.ok) {
-    const detail = await readErrorBody(resp);
-    throw new Error(`Solve failed (${resp.status}): ${detail}`);
+  const timeoutMs = options.timeoutMs ?? SOLVE_TIMEOUT_MS;
+  headers["X-Request-Timeout-Ms"] = String(timeoutMs);
+  const controller = new AbortController();
+  const timer = setTimeout(() => controller.abort(), timeoutMs);
+  try {
+    const resp = await fetch(`${API_URL}/solve/schedule`, {
+      method: "POST",
+      headers,
+      body: JSON.stringify(payload),
+      signal: controller.signal,
+    });
+    if (!resp.ok) {
+      const detail = await readErrorBody(resp);
+      throw new Error(`Solve failed (${resp.status}): ${detail}`);
+    }
+    return resp.json();
+  } catch (err) {
+    if (err?.name === "AbortError") {
+      throw new Error(`Solve timed out after ${timeoutMs} ms`);
+    }
+    throw err;
+  } finally {
+    clearTimeout(timer);
   }
-  return resp.json();
 }
@@ -13,3 +13,5 @@ export const SHIFT_COLORS = [
 ];
 export const DEFAULT_SHIFT_DURATION_MINUTES = 8 * 60;
 export const MINUTES_IN_DAY = 24 * 60;
+// Cat asteapta UI-ul un solve; backend-ul si solverul primesc timpul ramas (X-Request-Timeout-Ms).
+export const SOLVE_TIMEOUT_MS = 60 * 1000;
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Mapping
+
+from ortools.sat.python import cp_model
+
+from .logging_utils import get_logger, log_event
+
+# Capturarea este opt-in: fara director nu se scrie nimic si engine-ul nu serializeaza modelul.
+CAPTURE_DIR = os.getenv("SOLVER_CAPTURE_DIR", "")
+# Request-urile mai lente de atat sunt capturate (0 = doar cele cu headerul de mai jos).
+CAPTURE_SLOW_MS = int(os.getenv("SOLVER_CAPTURE_SLOW_MS", "10000"))
+CAPTURE_MAX_CASES = int(os.getenv("SOLVER_CAPTURE_MAX_CASES", "50"))
+CAPTURE_MAX_BYTES = int(os.getenv("SOLVER_CAPTURE_MAX_BYTES", str(512 * 1024 * 1024)))
+# `X-Solver-Capture: 1` forteaza capturarea request-ului, indiferent de durata.
+CAPTURE_HEADER = "X-Solver-Capture"
+# Headere pastrate in caz (necesare la replay).
+CAPTURED_HEADERS = ("X-Request-Id", "X-Request-Timeout-Ms")
+
+logger = get_logger()
+
+
+@dataclass
+class CaptureSession:
+    request_id: str
+    # `CpModelProto` serializat al ultimului model rezolvat pentru request (None: fara CP-SAT).
+    model_bytes: bytes | None = None
+
+
+_sessions: dict[str, CaptureSession] = {}
+_sessions_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+
+def capture_enabled() -> bool:
+    return bool(CAPTURE_DIR)
+
+
+@contextmanager
+def capture_session(request_id: str) -> Iterator[CaptureSession | None]:
+    if not capture_enabled():
+        yield None
+        return
+    session = CaptureSession(request_id=request_id)
+    with _sessions_lock:
+        _sessions[request_id] = session
+    try:
+        yield session
+    finally:
+        with _sessions_lock:
+            if _sessions.get(request_id) is session:
+                del _sessions[request_id]
+
+
+def record_capture_model(request_id: str, model: cp_model.CpModel) -> None:
+    # Serializat imediat: LNS rescrie ulterior domeniile variabilelor in acelasi proto.
+    session = _sessions.get(request_id)
+    if session is not None:
+        session.model_bytes = model.proto.SerializeToString()
+
+
+def capture_trigger(headers, elapsed_ms: float) -> str | None:
+    if headers.get(CAPTURE_HEADER, "").lower() in ("1", "true", "yes"):
+        return "header"
+    if CAPTURE_SLOW_MS > 0 and elapsed_ms >= CAPTURE_SLOW_MS:
+        return "slow"
+    return None
+
+
+def write_capture_case(
+    session: CaptureSession,
+    endpoint: str,
+    headers: Mapping[str, str],
+    body: bytes,
+    response: dict,
+    trigger: str,
+    elapsed_us: int,
+) -> None:
+    """
+    Scrie un caz in `SOLVER_CAPTURE_DIR/<timestamp>_<request_id>/`:
+    `request.json` (endpoint, headere, payload), `response.json`, `meta.json`
+    (declansator, timpi, status, obiectiv, `search`) si `model.pb` (`CpModelProto`).
+    Ruleaza dupa trimiterea raspunsului (background task).
+    """
+    started_at = time.perf_counter()
+    safe_request_id = re.sub(r"[^A-Za-z0-9_.-]", "_", session.request_id)[:64]
+    timestamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    case_dir = Path(CAPTURE_DIR) / f"{timestamp}_{safe_request_id}"
+    meta = {
+        "request_id": session.request_id,
+        "endpoint": endpoint,
+        "trigger": trigger,
+        "captured_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "elapsed_us": elapsed_us,
+        "status": response.get("status"),
+        "objective": response.get("objective"),
+        "search": response.get("search"),
+        "model": session.model_bytes is not None,
+    }
+    try:
+        with _write_lock:
+            case_dir.mkdir(parents=True, exist_ok=True)
+            request_record = {
+                "endpoint": endpoint,
+                "headers": {name: headers[name] for name in CAPTURED_HEADERS if name in headers},
+                "payload": json.loads(body),
+            }
+            (case_dir / "request.json").write_text(json.dumps(request_record), encoding="utf-8")
+            (case_dir / "response.json").write_text(json.dumps(response), encoding="utf-8")
+            (case_dir / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            if session.model_bytes is not None:
+                (case_dir / "model.pb").write_bytes(session.model_bytes)
+            removed = prune_capture_dir(Path(CAPTURE_DIR))
+    except (OSError, ValueError) as exc:
+        log_event(
+            logger,
+            "ERROR",
+            "solve.capture.failed",
+            request_id=session.request_id,
+            error=str(exc),
+        )
+        return
+    log_event(
+        logger,
+        "INFO",
+        "solve.capture.written",
+        request_id=session.request_id,
+        case=case_dir.name,
+        trigger=trigger,
+        model_bytes=len(session.model_bytes or b""),
+        pruned=removed,
+        elapsed_us=int((time.perf_counter() - started_at) * 1_000_000),
+    )
+
+
+def prune_capture_dir(root: Path) -> int:
+    # Numele incep cu timestamp-ul, deci ordinea alfabetica este cea cronologica.
+    cases = sorted(path for path in root.iterdir() if path.is_dir())
+    sizes = [sum(item.stat().st_size for item in case.iterdir()) for case in cases]
+    total_bytes = sum(sizes)
+    removed = 0
+    while cases and (len(cases) > CAPTURE_MAX_CASES or total_bytes > CAPTURE_MAX_BYTES):
+        shutil.rmtree(cases.pop(0), ignore_errors=True)
+        total_bytes -= sizes.pop(0)
+        removed += 1
+    return removed
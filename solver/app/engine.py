@@ -1,59 +1,51 @@
 from __future__ import annotations
 
-from datetime import date
 import time
 
 from ortools.sat.python import cp_model
 
-from .engine_constraints import (
-    add_shift_coverage_constraints,
-    apply_balance_worked_hours_constraint,
-    apply_hard_constraints,
-    apply_max_worktime_constraints,
-    apply_min_rest_constraints,
-    apply_objective,
-    apply_user_soft_constraints,
-    build_assignment_variables,
-    collect_enabled_feature_toggles,
+from .capture_utils import record_capture_model
+from .engine_admission import (
+    admit_request,
+    apply_admission,
+    build_estimate_response,
+    build_model_summary,
+    current_rss_mb,
+    reserved_memory,
+)
+from .engine_budget import (
+    SOLVE_PROFILES,
+    build_search_summary,
+    configure_search,
+    reported_status,
+    search_time_limit,
 )
-from .engine_diagnostics import infer_infeasibility_reasons
-from .engine_results import build_feasible_response, build_infeasible_response
-from .engine_utils import shift_duration_minutes, shift_start_abs_minutes
-from .engine_validation import validate_solver_request
-from .logging_utils import log_event
-from .models import SolverRequest
-
 
-def solve_schedule_request(payload: SolverRequest, logger, request_id: str, started_at: float) -> dict:
-    min_rest_hard_enabled = payload.feature_toggles.min_rest_after_shift_hard_enabled
-    min_rest_hard_hours = payload.feature_toggles.min_rest_after_shift_hard_hours
-    min_rest_soft_enabled = payload.feature_toggles.min_rest_after_shift_soft_enabled
-    min_rest_soft_hours = payload.feature_toggles.min_rest_after_shift_soft_hours
-    min_rest_soft_weight = payload.feature_toggles.min_rest_after_shift_soft_weight
+from .engine_cancel import cancellable_search, is_cancelled
+from .engine_greedy import (
+    GREEDY_HINT_ENABLED,
+    build_greedy_schedule,
+    build_heuristic_response,
+    greedy_fallback_reason,
+    solve_instance_quick,
+)
+from .engine_instance import build_instance_from_columnar, build_instance_from_request
+from .engine_lns import LNS_PARALLEL_NEIGHBORHOODS, solve_instance_lns
+from .engine_model import build_model, build_solve_response, log_solve_start, precheck_hard_conflicts
+from .engine_telemetry import attach_search_log, build_search_telemetry
+from .engine_types import SolveInstance
+from .engine_validation import validate_columnar_request, validate_solver_request
+from .logging_utils import log_event
+from .models import ColumnarSolverRequest, SolverRequest
 
-    log_event(
-        logger,
-        "INFO",
-        "solve.request.start",
-        request_id=request_id,
-        horizon_start=payload.horizon.start,
-        days=payload.horizon.days,
-        employees=len(payload.employees),
-        shifts=len(payload.shifts),
-        hard=len(payload.constraints.hard),
-        soft=len(payload.constraints.soft),
-        max_worktime_enabled=payload.feature_toggles.max_worktime_in_row_enabled,
-        max_worktime_hours=payload.feature_toggles.max_worktime_in_row_hours,
-        min_rest_hard_enabled=min_rest_hard_enabled,
-        min_rest_hard_hours=min_rest_hard_hours,
-        min_rest_soft_enabled=min_rest_soft_enabled,
-        min_rest_soft_hours=min_rest_soft_hours,
-        min_rest_soft_weight=min_rest_soft_weight,
-        balance_worked_hours=payload.feature_toggles.balance_worked_hours,
-        balance_span_multiplier=payload.feature_toggles.balance_worked_hours_max_span_multiplier,
-        balance_weight=payload.feature_toggles.balance_worked_hours_weight,
-    )
 
+def solve_schedule_request(
+    payload: SolverRequest,
+    logger,
+    request_id: str,
+    started_at: float,
+    deadline: float | None = None,
+) -> dict:
     # Etapa 1: validam datele de intrare inainte sa construim modelul.
     # Daca aici avem problema (de ex. employee_id duplicat), iesim rapid
     # cu eroare 422 ca sa nu "consumam" timp in solver.
@@ -61,142 +53,139 @@ def solve_schedule_request(payload: SolverRequest, logger, request_id: str, star
 
     # Etapa 2: pregatim structuri numerice simple (indici + minute absolute)
     # care sunt usor de folosit in CP-SAT pentru reguli de timp.
-    employee_idx_by_id = {employee.id: idx for idx, employee in enumerate(payload.employees)}
-    num_employees = len(payload.employees)
-    num_shifts = len(payload.shifts)
-    horizon_start_ord = date.fromisoformat(payload.horizon.start).toordinal()
-    shift_durations = [shift_duration_minutes(shift) for shift in payload.shifts]
-    shift_start_abs = [
-        shift_start_abs_minutes(shift, horizon_start_ord) for shift in payload.shifts
-    ]
-    shift_end_abs = [start + duration for start, duration in zip(shift_start_abs, shift_durations)]
-
-    # Etapa 3: construim modelul CP-SAT.
-    # "assign[(e, s)] = 1" inseamna ca employee e este atribuit pe shift s.
-    model = cp_model.CpModel()
-    assign = build_assignment_variables(
-        model=model,
-        num_employees=num_employees,
-        num_shifts=num_shifts,
-    )
-
-    add_shift_coverage_constraints(
-        model=model,
-        assign=assign,
-        payload=payload,
-        num_employees=num_employees,
-    )
-
-    violating_windows = apply_max_worktime_constraints(
-        payload=payload,
-        model=model,
-        assign=assign,
-        num_employees=num_employees,
-        shift_start_abs=shift_start_abs,
-        shift_end_abs=shift_end_abs,
-        shift_durations=shift_durations,
-    )
-
-    warnings: list[dict] = []
-    enabled_feature_toggles = collect_enabled_feature_toggles(payload)
-    objective_term_refs = []
-
-    apply_hard_constraints(
-        payload=payload,
-        model=model,
-        assign=assign,
-        employee_idx_by_id=employee_idx_by_id,
-        warnings=warnings,
-        logger=logger,
-        request_id=request_id,
-    )
-
-    apply_user_soft_constraints(
-        payload=payload,
-        assign=assign,
-        employee_idx_by_id=employee_idx_by_id,
-        objective_term_refs=objective_term_refs,
-        warnings=warnings,
-        logger=logger,
+    instance = build_instance_from_request(payload, logger=logger, request_id=request_id)
+    if payload.solve_mode == "quick":
+        return solve_instance_quick(instance, logger, request_id, started_at)
+    # LNS tine cate o copie a proto-ului per vecinatate paralela.
+    model_copies = LNS_PARALLEL_NEIGHBORHOODS if payload.solve_mode == "lns" else 1
+    admit_request(instance, logger, request_id, model_copies=model_copies)
+    if payload.solve_mode == "lns":
+        return solve_instance_lns(instance, logger, request_id, started_at, deadline=deadline)
+    return solve_instance(instance, logger, request_id, started_at, deadline=deadline)
+
+
+def solve_columnar_request(
+    payload: ColumnarSolverRequest,
+    logger,
+    request_id: str,
+    started_at: float,
+    deadline: float | None = None,
+) -> dict:
+    # Formatul columnar este validat in bloc (lungimi, intervale, indici)
+    # si intra direct in structurile numerice, fara obiecte per shift.
+    validate_columnar_request(payload=payload, logger=logger, request_id=request_id)
+    instance = build_instance_from_columnar(payload)
+    if payload.solve_mode == "quick":
+        return solve_instance_quick(instance, logger, request_id, started_at)
+    # LNS tine cate o copie a proto-ului per vecinatate paralela.
+    model_copies = LNS_PARALLEL_NEIGHBORHOODS if payload.solve_mode == "lns" else 1
+    admit_request(instance, logger, request_id, model_copies=model_copies)
+    if payload.solve_mode == "lns":
+        return solve_instance_lns(instance, logger, request_id, started_at, deadline=deadline)
+    return solve_instance(instance, logger, request_id, started_at, deadline=deadline)
+
+
+def estimate_schedule_request(payload: SolverRequest, logger, request_id: str, started_at: float) -> dict:
+    # Dry-run pentru `POST /solve/estimate`: aceeasi validare si instanta ca `/solve`,
+    # apoi doar estimarea modelului (fara constructie si fara CP-SAT).
+    validate_solver_request(payload=payload, logger=logger, request_id=request_id)
+    instance = build_instance_from_request(payload, logger=logger, request_id=request_id)
+    model_copies = LNS_PARALLEL_NEIGHBORHOODS if payload.solve_mode == "lns" else 1
+    response = build_estimate_response(instance, model_copies=model_copies)
+    log_event(
+        logger,
+        "INFO",
+        "solve.estimate.done",
         request_id=request_id,
+        elapsed_us=int((time.perf_counter() - started_at) * 1_000_000),
+        fits=response["admission"]["fits"],
+        variables=response["estimate"]["variables"],
+        peak_memory_mb=response["estimate"]["peak_memory_mb"],
     )
+    return response
 
-    apply_min_rest_constraints(
-        payload=payload,
-        model=model,
-        assign=assign,
-        num_employees=num_employees,
-        num_shifts=num_shifts,
-        shift_start_abs=shift_start_abs,
-        shift_end_abs=shift_end_abs,
-        shift_durations=shift_durations,
-        objective_term_refs=objective_term_refs,
-    )
-
-    balance_context = apply_balance_worked_hours_constraint(
-        payload=payload,
-        model=model,
-        assign=assign,
-        num_employees=num_employees,
-        num_shifts=num_shifts,
-        shift_durations=shift_durations,
-        objective_term_refs=objective_term_refs,
-    )
 
-    apply_objective(model=model, objective_term_refs=objective_term_refs)
-
-    # Etapa 4: rulam solverul si construim raspunsul API
-    # (infezabil / fezabil + diagnostice).
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 10.0
-    solver.parameters.num_search_workers = 8
-    status = solver.solve(model)
-
-    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-        elapsed_ms = (time.perf_counter() - started_at) * 1000.0
-        infeasibility_reasons = infer_infeasibility_reasons(
-            payload=payload,
-            num_employees=num_employees,
-            max_worktime_violating_windows=violating_windows,
-        )
-        log_event(
-            logger,
-            "INFO",
-            "solve.request.done",
-            request_id=request_id,
-            status="infeasible",
-            elapsed_us=int(elapsed_ms * 1000),
-            warnings=len(warnings),
-            inferred_reasons=len(infeasibility_reasons),
-        )
-        return build_infeasible_response(
-            warnings=warnings,
-            enabled_feature_toggles=enabled_feature_toggles,
-            infeasibility_reasons=infeasibility_reasons,
-        )
-
-    response, total_assigned_slots = build_feasible_response(
-        payload=payload,
-        solver=solver,
-        assign=assign,
+def solve_instance(
+    instance: SolveInstance,
+    logger,
+    request_id: str,
+    started_at: float,
+    max_time_seconds: float | None = None,
+    num_workers: int | None = None,
+    fixed_assignments: dict[tuple[int, int], int] | None = None,
+    hints: dict[tuple[int, int], int] | None = None,
+    deadline: float | None = None,
+) -> dict:
+    # `max_time_seconds` / `num_workers` lipsa -> bugetul profilului (timp adaptiv
+    # dupa dimensiunea modelului); `deadline` limiteaza oricare dintre ele.
+    log_solve_start(instance, logger, request_id)
+    precheck_response = precheck_hard_conflicts(instance, logger, request_id, started_at)
+    if precheck_response is not None:
+        return precheck_response
+
+    # Solutia greedy (milisecunde) este rezerva daca CP-SAT nu gaseste nimic in timp
+    # si, optional, hint pentru CP-SAT. In repair hint-ul este solutia anterioara.
+    greedy = None
+    if hints is None:
+        greedy = build_greedy_schedule(instance)
+        if GREEDY_HINT_ENABLED:
+            hints = greedy.values
+
+    # Etapa 3: construim modelul CP-SAT, in limitele de memorie ale procesului
+    # (formularea / workerii pot fi degradati de `engine_admission`).
+    admission, num_workers = apply_admission(instance, num_workers)
+    with reserved_memory(admission, logger, request_id):
+        rss_before_mb = current_rss_mb()
+        built = build_model(instance, fixed_assignments=fixed_assignments, hints=hints)
+        record_capture_model(request_id, built.model)
+
+        # Etapa 4: rulam solverul si construim raspunsul API
+        # (infezabil / fezabil + diagnostice).
+        profile = SOLVE_PROFILES[instance.solve_profile]
+        time_limit_seconds, time_limit_source = search_time_limit(profile, built.model, max_time_seconds, deadline)
+        num_workers = num_workers or profile.num_workers
+        solver = cp_model.CpSolver()
+        configure_search(solver, profile, time_limit_seconds, num_workers)
+        search_log = attach_search_log(solver)
+        with cancellable_search(request_id, solver):
+            status = solver.solve(built.model)
+        rss_after_mb = current_rss_mb()
+
+    objective = objective_bound = None
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        # Coeficientii sunt intregi, dar CP-SAT intoarce float-uri (dupa presolve pot iesi
+        # 14.999999999999998): rotunjim, nu trunchiem.
+        objective = round(solver.objective_value) if built.objective_term_refs else 0
+        objective_bound = round(solver.best_objective_bound) if built.objective_term_refs else 0
+    search = build_search_summary(
+        profile=profile,
+        time_limit_seconds=time_limit_seconds,
+        time_limit_source=time_limit_source,
+        num_workers=num_workers,
         status=status,
-        warnings=warnings,
-        enabled_feature_toggles=enabled_feature_toggles,
-        objective_term_refs=objective_term_refs,
-        balance_context=balance_context,
+        objective=objective,
+        objective_bound=objective_bound,
+        wall_time_seconds=solver.wall_time,
+        cancelled=is_cancelled(request_id),
     )
-
-    elapsed_ms = (time.perf_counter() - started_at) * 1000.0
-    log_event(
-        logger,
-        "INFO",
-        "solve.request.done",
-        request_id=request_id,
-        status=response["status"],
-        elapsed_us=int(elapsed_ms * 1000),
-        objective=response["objective"],
-        assigned_slots=total_assigned_slots,
-        warnings=len(warnings),
-        feature_toggles=enabled_feature_toggles,
+    search["model"] = build_model_summary(
+        admission,
+        variables=len(built.model.proto.variables),
+        constraints=len(built.model.proto.constraints),
+        rss_before_mb=rss_before_mb,
+        rss_after_mb=rss_after_mb,
     )
+    log_event(logger, "INFO", "solve.search.done", request_id=request_id, **search)
+    if search_log is not None:
+        search["telemetry"] = build_search_telemetry(solver, search_log)
+        telemetry_fields = {key: value for key, value in search["telemetry"].items() if key != "progress"}
+        log_event(logger, "INFO", "solve.search.telemetry", request_id=request_id, **telemetry_fields)
+
+    response_status = status if objective is None else reported_status(status, objective, objective_bound)
+    fallback_reason = greedy_fallback_reason(instance, greedy, response_status, objective)
+    if fallback_reason is not None:
+        response = build_heuristic_response(instance, greedy, fallback_reason, logger, request_id, started_at)
+    else:
+        response = build_solve_response(instance, built, solver, response_status, logger, request_id, started_at)
+    response["search"] = search
     return response
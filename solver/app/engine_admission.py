@@ -0,0 +1,510 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+from fastapi import HTTPException
+
+from .engine_automaton import get_sequence_automaton
+from .engine_intervals import interval_formulation_applicable
+from .engine_budget import SOLVE_PROFILES
+from .engine_constraints import short_rest_threshold_minutes
+from .engine_normalize import get_normalized_rules
+from .engine_skills import bits_mask, get_eligibility, qualified_employees
+from .engine_types import Admission, ModelEstimate, SequenceAutomaton, SolveInstance
+from .engine_utils import (
+    get_max_worktime_violating_windows,
+    get_minimal_qualifying_chain_by_left,
+    get_overlap_cliques,
+    get_short_rest_pairs,
+)
+from .engine_workload import days_off_targets, get_workload_calendar, mask_minutes
+from .logging_utils import log_event
+
+# Limite per solve; peste ele request-ul este degradat (formulare, workeri) sau respins (422).
+MAX_MODEL_VARIABLES = int(os.getenv("SOLVER_MAX_MODEL_VARIABLES", "1500000"))
+MAX_MODEL_MEMORY_MB = float(os.getenv("SOLVER_MAX_MODEL_MEMORY_MB", "3072"))
+# Memoria estimata a tuturor solve-urilor in curs din proces (0 = fara limita); peste ea -> 503.
+MEMORY_BUDGET_MB = float(os.getenv("SOLVER_MEMORY_BUDGET_MB", "6144"))
+MIN_DOWNGRADE_WORKERS = 2
+
+# Calibrat pe modelele sintetice (120x31 / 300x31, cu si fara ture suprapuse): RSS-ul
+# procesului dupa `build_model` si varful pe durata cautarii, pe formulare si workeri.
+BUILD_KB_PER_VARIABLE = 0.35
+BUILD_KB_PER_CONSTRAINT = 0.45
+BUILD_KB_PER_TERM = 0.06
+# Varful total ~ modelul Python x (baza + per worker): proto-ul, presolve-ul si copia
+# fiecarui worker (120x31: x2.9 cu 1 worker, x6.0 cu 8).
+SEARCH_BASE_FACTOR = 2.5
+SEARCH_FACTOR_PER_WORKER = 0.45
+
+FORMULATIONS = ("pairwise", "interval", "automaton")
+
+_reserved_lock = threading.Lock()
+_reserved_memory_mb = 0.0
+
+
+def estimate_model(
+    instance: SolveInstance,
+    formulation: str | None = None,
+    num_workers: int | None = None,
+    model_copies: int = 1,
+) -> ModelEstimate:
+    """
+    Numara variabilele, restrictiile si termenii pe care `build_model` i-ar crea, fara sa-l
+    construiasca. Structurile folosite (ferestre, lanturi, perechi de rest, automat) sunt
+    cele din cache-ul tabelului de ture, deci sunt refolosite la constructie.
+
+    Valorile sunt o margine superioara pentru repair (celulele fixate nu creeaza literali).
+    `model_copies` > 1 pentru LNS (o copie a proto-ului per vecinatate paralela).
+    """
+    formulation = formulation or instance.formulation
+    num_workers = num_workers or SOLVE_PROFILES[instance.solve_profile].num_workers
+    shifts = instance.shifts
+    feature_toggles = instance.feature_toggles
+    num_employees = instance.num_employees
+    num_shifts = instance.num_shifts
+    normalized = get_normalized_rules(instance)
+
+    automaton = get_sequence_automaton(shifts, feature_toggles) if formulation == "automaton" else None
+    if formulation == "automaton" and automaton is None:
+        # Acelasi fallback ca `build_model`: automat prea mare -> "pairwise".
+        formulation = "pairwise"
+    if formulation == "interval" and not interval_formulation_applicable(instance):
+        formulation = "pairwise"
+
+    # Comun: `assign` (celulele neeligibile impart o constanta), acoperirea turelor si
+    # minimele per skill, celulele hard, termenii soft.
+    eligibility = get_eligibility(instance)
+    eligible_cells = num_employees * num_shifts - eligibility.ineligible_cells
+    variables = eligible_cells + int(eligibility.restricted)
+    constraints = num_shifts + len(normalized.required_cells) + len(normalized.forbidden_cells)
+    terms = eligible_cells + len(normalized.required_cells) + len(normalized.forbidden_cells)
+    objective_terms = len(normalized.soft_cells)
+    for shift_idx, requirements in enumerate(shifts.skill_requirements):
+        for skill in requirements:
+            constraints += 1
+            terms += qualified_employees(instance, shift_idx, skill).bit_count()
+
+    # Per angajat; angajatii cu aceleasi ture eligibile au aceleasi restrictii.
+    employees_by_eligible_shifts = Counter(eligibility.eligible_shifts)
+    for eligible_shifts, group_size in employees_by_eligible_shifts.items():
+        employee_counts = _estimate_employee(instance, formulation, automaton, eligible_shifts)
+        variables += group_size * employee_counts[0]
+        constraints += group_size * employee_counts[1]
+        terms += group_size * employee_counts[2]
+        objective_terms += group_size * employee_counts[3]
+        if feature_toggles.no_double_booking_enabled and formulation != "interval":
+            # Un "cel mult unu" per grup de ture simultane (interval: `NoOverlap`-ul existent).
+            for clique in get_overlap_cliques(shifts):
+                clique_size = (bits_mask(clique) & eligible_shifts).bit_count()
+                if clique_size > 1:
+                    constraints += group_size
+                    terms += group_size * clique_size
+        workload_counts = _estimate_workload(instance, eligible_shifts)
+        variables += group_size * workload_counts[0]
+        constraints += group_size * workload_counts[1]
+        terms += group_size * workload_counts[2]
+        objective_terms += group_size * workload_counts[3]
+    if feature_toggles.balance_worked_hours:
+        # Ore lucrate per angajat (minutele sunt agregatele); min / max / span / exces sunt globale.
+        variables += num_employees + 4
+        constraints += num_employees + 5
+        terms += 3 * num_employees + 2 * num_employees + 8
+        objective_terms += 1
+
+    build_memory_mb = (
+        variables * BUILD_KB_PER_VARIABLE + constraints * BUILD_KB_PER_CONSTRAINT + terms * BUILD_KB_PER_TERM
+    ) / 1024.0
+    peak_memory_mb = build_memory_mb * (
+        SEARCH_BASE_FACTOR + SEARCH_FACTOR_PER_WORKER * num_workers + (model_copies - 1)
+    )
+    return ModelEstimate(
+        formulation=formulation,
+        num_workers=num_workers,
+        variables=variables,
+        constraints=constraints,
+        terms=terms,
+        objective_terms=objective_terms,
+        build_memory_mb=round(build_memory_mb, 1),
+        peak_memory_mb=round(peak_memory_mb, 1),
+    )
+
+
+def _estimate_employee(
+    instance: SolveInstance,
+    formulation: str,
+    automaton: SequenceAutomaton | None,
+    eligible_shifts: int,
+) -> tuple[int, int, int, int]:
+    """(variabile, restrictii, termeni, termeni in obiectiv) ale unui angajat cu turele `eligible_shifts`."""
+    shifts = instance.shifts
+    feature_toggles = instance.feature_toggles
+    max_chain_minutes = feature_toggles.max_worktime_in_row_hours * 60
+    ineligible_shifts = ~eligible_shifts
+    variables = constraints = terms = objective_terms = 0
+    if automaton is not None:
+        minimal_chain_by_left = get_minimal_qualifying_chain_by_left(shifts, max_chain_minutes)
+        rest_items = sum(
+            1
+            for item in automaton.items
+            if item[0] != "shift" and not bits_mask([*minimal_chain_by_left[item[1]], item[2]]) & ineligible_shifts
+        )
+        return rest_items, 1, len(automaton.items) + 3 * len(automaton.transitions), rest_items
+
+    if formulation == "interval":
+        # Un interval optional per tura eligibila + un `NoOverlap` per angajat, mereu
+        # (si fara reguli de rest: el impune `no_double_booking`).
+        shift_intervals = eligible_shifts.bit_count()
+        constraints += shift_intervals + 1
+        terms += 4 * shift_intervals
+    if feature_toggles.max_worktime_in_row_enabled:
+        windows = get_max_worktime_violating_windows(shifts, max_chain_minutes)
+        for window in windows:
+            if not bits_mask(window) & ineligible_shifts:
+                constraints += 1
+                terms += len(window)
+    if feature_toggles.min_rest_after_shift_hard_enabled or feature_toggles.min_rest_after_shift_soft_enabled:
+        minimal_chain_by_left = get_minimal_qualifying_chain_by_left(shifts, max_chain_minutes)
+        hard_pairs, soft_pairs = _split_short_rest_pairs(instance, minimal_chain_by_left)
+        # Lanturile cu o tura neeligibila nu au literal; perechile lor nici atat.
+        reachable_lefts = {
+            left_shift_idx
+            for left_shift_idx in {pair[0] for pair in hard_pairs} | {pair[0] for pair in soft_pairs}
+            if not bits_mask(minimal_chain_by_left[left_shift_idx]) & ineligible_shifts
+        }
+        hard_pairs = [pair for pair in hard_pairs if pair[0] in reachable_lefts]
+        soft_pairs = [pair for pair in soft_pairs if pair[0] in reachable_lefts and eligible_shifts >> pair[1] & 1]
+        for left_shift_idx in reachable_lefts:
+            chain_length = len(minimal_chain_by_left[left_shift_idx])
+            if chain_length > 1:
+                variables += 1
+                constraints += 2
+                terms += 2 * chain_length + 2
+        if formulation == "interval":
+            # Un interval de rest per `left` hard atins (in acelasi `NoOverlap` ca turele).
+            rest_intervals = len({pair[0] for pair in hard_pairs})
+            constraints += rest_intervals
+            terms += 4 * rest_intervals
+        else:
+            hard_pairs = [pair for pair in hard_pairs if eligible_shifts >> pair[1] & 1]
+            constraints += len(hard_pairs)
+            terms += 2 * len(hard_pairs)
+        variables += len(soft_pairs)
+        constraints += 2 * len(soft_pairs)
+        terms += 6 * len(soft_pairs)
+        objective_terms += len(soft_pairs)
+    return variables, constraints, terms, objective_terms
+
+
+def _estimate_workload(instance: SolveInstance, eligible_shifts: int) -> tuple[int, int, int, int]:
+    """Ca `_estimate_employee`, pentru agregatele de volum (`engine_workload`) si regulile peste ele."""
+    shifts = instance.shifts
+    feature_toggles = instance.feature_toggles
+    calendar = get_workload_calendar(shifts)
+    variables = constraints = terms = objective_terms = 0
+    if feature_toggles.max_shifts_per_day_enabled:
+        for day_mask in calendar.day_masks.values():
+            day_shifts = (eligible_shifts & day_mask).bit_count()
+            if day_shifts > feature_toggles.max_shifts_per_day:
+                constraints += 1
+                terms += day_shifts
+    # Variabilele saptamanale: cele peste limita, sau toate cele cu ture cand le foloseste balance-ul.
+    weeks = set()
+    if feature_toggles.max_hours_per_week_enabled:
+        max_week_minutes = feature_toggles.max_hours_per_week * 60
+        weeks.update(
+            week
+            for week, week_mask in calendar.week_masks.items()
+            if mask_minutes(shifts, eligible_shifts & week_mask) > max_week_minutes
+        )
+    if feature_toggles.balance_worked_hours:
+        eligible_weeks = [week for week, week_mask in calendar.week_masks.items() if eligible_shifts & week_mask]
+        weeks.update(eligible_weeks)
+        variables += 1
+        constraints += 1
+        terms += len(eligible_weeks) + 1
+    for week in weeks:
+        variables += 1
+        constraints += 1
+        terms += (eligible_shifts & calendar.week_masks[week]).bit_count() + 1
+    if feature_toggles.min_days_off_per_week_enabled:
+        for _, _, workable_days in days_off_targets(instance, eligible_shifts):
+            variables += 1
+            constraints += 1
+            terms += len(workable_days) + 1
+            objective_terms += 1
+            for day in workable_days:
+                # O singura tura pe zi refoloseste literalul ei.
+                day_shifts = (eligible_shifts & calendar.day_masks[day]).bit_count()
+                if day_shifts > 1:
+                    variables += 1
+                    constraints += 1
+                    terms += day_shifts + 1
+    return variables, constraints, terms, objective_terms
+
+
+def _split_short_rest_pairs(
+    instance: SolveInstance,
+    minimal_chain_by_left: dict[int, list[int]],
+) -> tuple[list[tuple[int, int, int]], list[tuple[int, int, int]]]:
+    # Aceleasi perechi ca `apply_min_rest_constraints` (doar cele cu lant care le poate activa).
+    feature_toggles = instance.feature_toggles
+    hard_pairs = []
+    soft_pairs = []
+    for pair in get_short_rest_pairs(instance.shifts, short_rest_threshold_minutes(feature_toggles)):
+        if pair[0] not in minimal_chain_by_left:
+            continue
+        rest_minutes = pair[2]
+        if (
+            feature_toggles.min_rest_after_shift_hard_enabled
+            and rest_minutes < feature_toggles.min_rest_after_shift_hard_hours * 60
+        ):
+            hard_pairs.append(pair)
+        if (
+            feature_toggles.min_rest_after_shift_soft_enabled
+            and rest_minutes < feature_toggles.min_rest_after_shift_soft_hours * 60
+        ):
+            soft_pairs.append(pair)
+    return hard_pairs, soft_pairs
+
+
+def _exceeded_limit(estimate: ModelEstimate) -> str | None:
+    if estimate.variables > MAX_MODEL_VARIABLES:
+        return "max_variables"
+    if estimate.peak_memory_mb > MAX_MODEL_MEMORY_MB:
+        return "max_memory"
+    return None
+
+
+def equivalent_formulations(instance: SolveInstance) -> list[str]:
+    """
+    Formularile care accepta exact aceleasi orare ca cea ceruta: pairwise si automaton
+    mereu, interval doar cand NoOverlap-ul lui nu adauga o regula (vezi
+    `interval_formulation_applicable`).
+    """
+    return [
+        formulation
+        for formulation in FORMULATIONS
+        if formulation != "interval" or interval_formulation_applicable(instance)
+    ]
+
+
+def plan_admission(instance: SolveInstance, num_workers: int | None = None, model_copies: int = 1) -> Admission:
+    """
+    Alege formularea si numarul de workeri sub limite.
+
+    Motivatie:
+    Un singur request mare (31 de zile, multe ture de noapte, sute de angajati, rest
+    activ) poate aloca milioane de literali reificati si scoate containerul din memorie,
+    oprind toate solve-urile in curs. Incercam, in ordine: request-ul asa cum e, celelalte
+    formulari (cea mai mica estimare intai), apoi injumatatirea workerilor CP-SAT.
+    O degradare nu schimba niciodata ce orare sunt valide: se aleg doar formulari
+    echivalente; daca nici acestea nu intra, request-ul este respins.
+    """
+    requested_workers = num_workers or SOLVE_PROFILES[instance.solve_profile].num_workers
+    estimate = estimate_model(instance, num_workers=requested_workers, model_copies=model_copies)
+    admission = Admission(
+        estimate=estimate,
+        requested_formulation=instance.formulation,
+        requested_workers=requested_workers,
+    )
+    if _exceeded_limit(estimate) is None:
+        return admission
+
+    candidates = [estimate] + [
+        estimate_model(instance, formulation, requested_workers, model_copies)
+        for formulation in equivalent_formulations(instance)
+        if formulation != estimate.formulation
+    ]
+    best = min(candidates, key=lambda candidate: (candidate.peak_memory_mb, candidate.variables))
+    workers = requested_workers
+    while _exceeded_limit(best) is not None and workers > MIN_DOWNGRADE_WORKERS:
+        workers = max(MIN_DOWNGRADE_WORKERS, workers // 2)
+        best = estimate_model(instance, best.formulation, workers, model_copies)
+
+    admission.estimate = best
+    # Fallback-urile formularii (automaton / interval -> pairwise) nu sunt degradari.
+    if best.formulation != estimate.formulation:
+        admission.downgrades.append(f"formulation:{best.formulation}")
+    if best.num_workers != requested_workers:
+        admission.downgrades.append(f"num_workers:{best.num_workers}")
+    admission.reason = _exceeded_limit(best)
+    admission.fits = admission.reason is None
+    return admission
+
+
+def admit_request(
+    instance: SolveInstance,
+    logger,
+    request_id: str,
+    model_copies: int = 1,
+) -> Admission:
+    """
+    Admiterea unui request `POST /solve` / `/solve/columnar` inainte de orice constructie:
+    aplica degradarile pe instanta si respinge (422) ce nu intra nici degradat.
+    """
+    admission = plan_admission(instance, model_copies=model_copies)
+    estimate = admission.estimate
+    log_event(
+        logger,
+        "INFO" if admission.fits else "WARN",
+        "solve.admission",
+        request_id=request_id,
+        fits=admission.fits,
+        reason=admission.reason,
+        formulation=estimate.formulation,
+        num_workers=estimate.num_workers,
+        variables=estimate.variables,
+        constraints=estimate.constraints,
+        terms=estimate.terms,
+        peak_memory_mb=estimate.peak_memory_mb,
+        downgrades=admission.downgrades,
+    )
+    if not admission.fits:
+        log_event(
+            logger,
+            "WARN",
+            "solve.request.rejected",
+            request_id=request_id,
+            reason="model_too_large",
+            limit=admission.reason,
+        )
+        raise HTTPException(
+            status_code=422,
+            detail=(
+                f"Model too large: ~{estimate.variables} variables, ~{estimate.peak_memory_mb:.0f} MB estimated "
+                f"(limits: {MAX_MODEL_VARIABLES} variables, {MAX_MODEL_MEMORY_MB:.0f} MB). "
+                "Reduce the horizon, employees or sequence rules, or use solve_mode 'quick'."
+            ),
+        )
+    instance.formulation = estimate.formulation
+    instance.admission = admission
+    return admission
+
+
+def apply_admission(instance: SolveInstance, num_workers: int | None) -> tuple[Admission, int | None]:
+    """Admiterea folosita de un solve: cea a request-ului sau, pentru solve-uri interne (scenarii), un plan nou."""
+    admission = instance.admission
+    if admission is None:
+        # Fara respingere: scenariile au fost deja validate in procesul principal.
+        admission = plan_admission(instance, num_workers)
+        instance.formulation = admission.estimate.formulation
+    if admission.estimate.num_workers != admission.requested_workers:
+        num_workers = admission.estimate.num_workers
+    return admission, num_workers
+
+
+@contextmanager
+def reserved_memory(admission: Admission, logger, request_id: str) -> Iterator[None]:
+    """Rezerva memoria estimata a solve-ului in bugetul procesului cat timp ruleaza (503 daca nu incape)."""
+    global _reserved_memory_mb
+    needed_mb = admission.estimate.peak_memory_mb
+    with _reserved_lock:
+        in_flight_mb = _reserved_memory_mb
+        # Un solve singur (fara altele in curs) este admis oricum: limita lui e `MAX_MODEL_MEMORY_MB`.
+        admitted = MEMORY_BUDGET_MB <= 0 or in_flight_mb == 0 or in_flight_mb + needed_mb <= MEMORY_BUDGET_MB
+        if admitted:
+            _reserved_memory_mb += needed_mb
+    if not admitted:
+        log_event(
+            logger,
+            "WARN",
+            "solve.request.rejected",
+            request_id=request_id,
+            reason="memory_budget_exhausted",
+            needed_mb=needed_mb,
+            in_flight_mb=round(in_flight_mb, 1),
+            budget_mb=MEMORY_BUDGET_MB,
+        )
+        raise HTTPException(
+            status_code=503,
+            detail="Solver memory budget is exhausted by running solves; retry shortly.",
+            headers={"Retry-After": "5"},
+        )
+    try:
+        yield
+    finally:
+        with _reserved_lock:
+            _reserved_memory_mb = max(0.0, _reserved_memory_mb - needed_mb)
+
+
+def current_rss_mb() -> float | None:
+    # Linux (containerul solver-ului); in alte medii masuratoarea lipseste.
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def build_model_summary(
+    admission: Admission,
+    variables: int,
+    constraints: int,
+    rss_before_mb: float | None,
+    rss_after_mb: float | None,
+) -> dict:
+    """Estimarea vs. modelul construit si memoria procesului, pentru calibrarea limitelor."""
+    estimate = admission.estimate
+    rss_delta_mb = None
+    if rss_before_mb is not None and rss_after_mb is not None:
+        rss_delta_mb = round(rss_after_mb - rss_before_mb, 1)
+    return {
+        "formulation": estimate.formulation,
+        "variables": variables,
+        "constraints": constraints,
+        "estimated_variables": estimate.variables,
+        "estimated_constraints": estimate.constraints,
+        "estimated_peak_memory_mb": estimate.peak_memory_mb,
+        "rss_delta_mb": rss_delta_mb,
+        "downgrades": list(admission.downgrades),
+    }
+
+
+def estimate_summary(estimate: ModelEstimate) -> dict:
+    return {
+        "formulation": estimate.formulation,
+        "num_workers": estimate.num_workers,
+        "variables": estimate.variables,
+        "constraints": estimate.constraints,
+        "terms": estimate.terms,
+        "objective_terms": estimate.objective_terms,
+        "build_memory_mb": estimate.build_memory_mb,
+        "peak_memory_mb": estimate.peak_memory_mb,
+    }
+
+
+def build_estimate_response(instance: SolveInstance, model_copies: int = 1) -> dict:
+    """Raspunsul `POST /solve/estimate`: estimarea, decizia de admitere si starea memoriei, fara solve."""
+    admission = plan_admission(instance, model_copies=model_copies)
+    with _reserved_lock:
+        in_flight_mb = _reserved_memory_mb
+    rss_mb = current_rss_mb()
+    return {
+        "admission": {
+            "fits": admission.fits,
+            "reason": admission.reason,
+            "downgrades": list(admission.downgrades),
+        },
+        "estimate": estimate_summary(admission.estimate),
+        "formulations": {
+            formulation: estimate_summary(
+                estimate_model(instance, formulation, admission.requested_workers, model_copies)
+            )
+            for formulation in FORMULATIONS
+        },
+        "limits": {
+            "max_variables": MAX_MODEL_VARIABLES,
+            "max_memory_mb": MAX_MODEL_MEMORY_MB,
+            "memory_budget_mb": MEMORY_BUDGET_MB,
+        },
+        "memory": {
+            "in_flight_mb": round(in_flight_mb, 1),
+            "rss_mb": None if rss_mb is None else round(rss_mb, 1),
+        },
+    }
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import os
+from typing import Callable, Hashable
+
+from ortools.sat.python import cp_model
+
+from .engine_constraints import min_rest_term, short_rest_threshold_minutes
+from .engine_skills import bits_mask, get_eligibility
+from .engine_types import AssignVars, ObjectiveTerm, SequenceAutomaton, ShiftTable, SolveInstance
+from .engine_utils import (
+    get_max_worktime_violating_windows,
+    get_minimal_qualifying_chain_by_left,
+    get_short_rest_pairs,
+)
+from .models import FeatureToggles
+
+# Peste acest numar de tranzitii automatul nu mai e construit, iar modelul
+# revine la formularea "pairwise" (aceeasi semantica).
+AUTOMATON_MAX_TRANSITIONS = int(os.getenv("SOLVER_AUTOMATON_MAX_TRANSITIONS", "200000"))
+
+# Pasul automatului: (pozitia in secventa, starea curenta, valoarea etichetei)
+# -> starea urmatoare sau None daca eticheta e interzisa.
+AutomatonStep = Callable[[int, Hashable, int], Hashable | None]
+
+
+def build_layered_automaton(
+    num_items: int,
+    start_info: Hashable,
+    step: AutomatonStep,
+    max_transitions: int = AUTOMATON_MAX_TRANSITIONS,
+) -> tuple[list[tuple[int, int, int]], list[int], int] | None:
+    """
+    Construieste un DFA stratificat pe etichete 0/1: starile sunt (pozitie, info),
+    deci un singur tabel de tranzitii descrie reguli care depind de pozitie (ore,
+    durate, pauze). Doar starile atinse din `start_info` sunt generate, apoi
+    automatul e minimizat. Starea de start este 0.
+
+    Regulile noi de secventa (ex. zile consecutive, rotatii) extind doar `info`
+    si `step`, fara expandari noi pe perechi de ture.
+    """
+    edges: list[list[tuple[int, int]]] = [[]]
+    layers: list[list[int]] = [[0]]
+    layer: dict[Hashable, int] = {start_info: 0}
+    num_transitions = 0
+    for position in range(num_items):
+        next_layer: dict[Hashable, int] = {}
+        for info, state in layer.items():
+            for value in (0, 1):
+                next_info = step(position, info, value)
+                if next_info is None:
+                    continue
+                next_state = next_layer.get(next_info)
+                if next_state is None:
+                    next_state = len(edges)
+                    next_layer[next_info] = next_state
+                    edges.append([])
+                edges[state].append((value, next_state))
+                num_transitions += 1
+        if num_transitions > max_transitions:
+            return None
+        layers.append(list(next_layer.values()))
+        layer = next_layer
+
+    # Minimizare de la coada: pe acelasi strat, starile cu aceleasi tranzitii spre
+    # clase echivalente devin o singura stare; starile fara continuare dispar.
+    # Clasa 0 = starea finala (toate starile ultimului strat).
+    class_of: dict[int, int] = {state: 0 for state in layers[-1]}
+    class_edges: list[tuple[tuple[int, int], ...]] = [()]
+    for layer_states in reversed(layers[:-1]):
+        class_by_signature: dict[tuple[tuple[int, int], ...], int] = {}
+        for state in layer_states:
+            signature = tuple(
+                (value, class_of[next_state]) for value, next_state in edges[state] if next_state in class_of
+            )
+            if not signature:
+                continue
+            state_class = class_by_signature.get(signature)
+            if state_class is None:
+                state_class = len(class_edges)
+                class_edges.append(signature)
+                class_by_signature[signature] = state_class
+            class_of[state] = state_class
+
+    # Renumerotare in ordinea parcurgerii, cu starea de start pe 0.
+    state_by_class = {class_of[0]: 0}
+    queue = [class_of[0]]
+    transitions: list[tuple[int, int, int]] = []
+    for state_class in queue:
+        for value, next_class in class_edges[state_class]:
+            if next_class not in state_by_class:
+                state_by_class[next_class] = len(state_by_class)
+                queue.append(next_class)
+            transitions.append((state_by_class[state_class], value, state_by_class[next_class]))
+    return transitions, [state_by_class[0]], len(state_by_class)
+
+
+def compile_sequence_automaton(shifts: ShiftTable, feature_toggles: FeatureToggles) -> SequenceAutomaton | None:
+    """
+    Compileaza max-worktime si rest-ul dupa lant intr-un automat pe turele sortate dupa start.
+
+    Info-ul starii este `(run, pending, last_value)`:
+    - `run`: minutele lantului atribuit curent (ture consecutive, gap == 0), plafonat la prag;
+    - `pending`: turele "left" care au atins pragul si a caror pauza inca poate acoperi ture viitoare;
+    - `last_value`: valoarea ultimei ture, folosita de literalele de rest soft care o urmeaza.
+    Semantica este identica cu `apply_max_worktime_constraints` + `apply_min_rest_constraints`.
+    """
+    max_chain_minutes = feature_toggles.max_worktime_in_row_hours * 60
+    windows_enabled = feature_toggles.max_worktime_in_row_enabled
+    hard_enabled = feature_toggles.min_rest_after_shift_hard_enabled
+    soft_enabled = feature_toggles.min_rest_after_shift_soft_enabled
+    min_hard_rest_minutes = feature_toggles.min_rest_after_shift_hard_hours * 60
+    min_soft_rest_minutes = feature_toggles.min_rest_after_shift_soft_hours * 60
+    if len(shifts) == 0 or not (windows_enabled or hard_enabled or soft_enabled):
+        return None
+
+    rest_horizon_minutes = short_rest_threshold_minutes(feature_toggles)
+    hard_short_rest_pairs: set[tuple[int, int]] = set()
+    soft_pairs_by_right: dict[int, list[tuple[int, int]]] = {}
+    rest_lefts: set[int] = set()
+    if hard_enabled or soft_enabled:
+        minimal_chain_by_left = get_minimal_qualifying_chain_by_left(shifts, max_chain_minutes)
+        for left_shift_idx, right_shift_idx, rest_minutes in get_short_rest_pairs(shifts, rest_horizon_minutes):
+            if left_shift_idx not in minimal_chain_by_left:
+                continue
+            if hard_enabled and rest_minutes < min_hard_rest_minutes:
+                hard_short_rest_pairs.add((left_shift_idx, right_shift_idx))
+                rest_lefts.add(left_shift_idx)
+            if soft_enabled and rest_minutes < min_soft_rest_minutes:
+                soft_pairs_by_right.setdefault(right_shift_idx, []).append((left_shift_idx, rest_minutes))
+                rest_lefts.add(left_shift_idx)
+
+    sorted_indices = shifts.sorted_indices
+    start_abs = shifts.start_abs
+    end_abs = shifts.end_abs
+    durations = shifts.durations
+    items: list[tuple] = []
+    # Pentru fiecare item "shift": daca lantul continua de la tura anterioara (gap == 0).
+    continues_chain: list[bool] = []
+    for pos, shift_idx in enumerate(sorted_indices):
+        items.append(("shift", shift_idx))
+        continues_chain.append(pos > 0 and start_abs[shift_idx] == end_abs[sorted_indices[pos - 1]])
+        for left_shift_idx, rest_minutes in soft_pairs_by_right.get(shift_idx, []):
+            items.append(("short_rest", left_shift_idx, shift_idx, rest_minutes))
+            continues_chain.append(False)
+
+    def step(position: int, info: tuple, value: int) -> tuple | None:
+        run, pending, last_value = info
+        item = items[position]
+        if item[0] == "short_rest":
+            # Literalul de rest soft = lantul din `left` a atins pragul SI tura curenta e atribuita.
+            expected = int(last_value == 1 and item[1] in pending)
+            return info if value == expected else None
+
+        shift_idx = item[1]
+        if not continues_chain[position]:
+            run = 0
+        if pending:
+            pending = tuple(
+                left_shift_idx
+                for left_shift_idx in pending
+                if start_abs[shift_idx] - end_abs[left_shift_idx] < rest_horizon_minutes
+            )
+        if not value:
+            return (0, pending, 0)
+
+        if any((left_shift_idx, shift_idx) in hard_short_rest_pairs for left_shift_idx in pending):
+            return None
+        if windows_enabled and run > 0 and run + durations[shift_idx] > max_chain_minutes:
+            return None
+        run = min(run + durations[shift_idx], max_chain_minutes)
+        if run >= max_chain_minutes and shift_idx in rest_lefts:
+            pending = pending + (shift_idx,)
+        return (run, pending, 1)
+
+    compiled = build_layered_automaton(num_items=len(items), start_info=(0, (), 0), step=step)
+    if compiled is None:
+        return None
+    transitions, final_states, num_states = compiled
+    return SequenceAutomaton(
+        items=items,
+        transitions=transitions,
+        final_states=final_states,
+        num_states=num_states,
+    )
+
+
+def get_sequence_automaton(shifts: ShiftTable, feature_toggles: FeatureToggles) -> SequenceAutomaton | None:
+    key = (
+        "sequence_automaton",
+        feature_toggles.max_worktime_in_row_enabled,
+        feature_toggles.max_worktime_in_row_hours,
+        feature_toggles.min_rest_after_shift_hard_enabled,
+        feature_toggles.min_rest_after_shift_hard_hours,
+        feature_toggles.min_rest_after_shift_soft_enabled,
+        feature_toggles.min_rest_after_shift_soft_hours,
+    )
+    # Rezultatul (inclusiv None = "automat prea mare") e memorat pe tabel.
+    if key not in shifts.derived:
+        shifts.derived[key] = compile_sequence_automaton(shifts, feature_toggles)
+    return shifts.derived[key]
+
+
+def apply_automaton_sequence_constraints(
+    instance: SolveInstance,
+    automaton: SequenceAutomaton,
+    model: cp_model.CpModel,
+    assign: AssignVars,
+    num_employees: int,
+    objective_term_refs: list[ObjectiveTerm],
+) -> list[list[int]]:
+    """
+    Formularea "automaton": un `AddAutomaton` per angajat peste secventa `automaton.items`,
+    in locul ferestrelor max-worktime si al restrictiilor de rest pe perechi.
+    Literalele de rest soft sunt fortate de automat si intra in obiectiv ca in "pairwise".
+    Un rest soft care atinge o celula neeligibila nu poate aparea: eticheta lui e constanta 0.
+    """
+    feature_toggles = instance.feature_toggles
+    eligibility = get_eligibility(instance)
+    # Pozitia in `items` -> turele (lantul din `left` + `right`) de care depinde restul soft.
+    rest_masks: dict[int, int] = {}
+    if eligibility.restricted:
+        minimal_chain_by_left = get_minimal_qualifying_chain_by_left(
+            instance.shifts, feature_toggles.max_worktime_in_row_hours * 60
+        )
+        rest_masks = {
+            position: bits_mask([*minimal_chain_by_left[item[1]], item[2]])
+            for position, item in enumerate(automaton.items)
+            if item[0] != "shift"
+        }
+    for employee_idx in range(num_employees):
+        ineligible_shifts = ~eligibility.eligible_shifts[employee_idx]
+        labels = []
+        for position, item in enumerate(automaton.items):
+            if item[0] == "shift":
+                labels.append(assign[(employee_idx, item[1])])
+                continue
+            _, left_shift_idx, right_shift_idx, rest_minutes = item
+            if rest_masks.get(position, 0) & ineligible_shifts:
+                labels.append(model.new_constant(0))
+                continue
+            short_rest_after_max_chain = model.new_bool_var(
+                f"short_rest_after_max_e{employee_idx}_s{left_shift_idx}_s{right_shift_idx}"
+            )
+            labels.append(short_rest_after_max_chain)
+            objective_term_refs.append(
+                min_rest_term(
+                    instance, employee_idx, left_shift_idx, right_shift_idx, rest_minutes, short_rest_after_max_chain
+                )
+            )
+        model.add_automaton(labels, 0, automaton.final_states, automaton.transitions)
+
+    if not feature_toggles.max_worktime_in_row_enabled:
+        return []
+    # Ferestrele raman necesare doar pentru diagnosticele de infezabilitate.
+    return get_max_worktime_violating_windows(instance.shifts, feature_toggles.max_worktime_in_row_hours * 60)
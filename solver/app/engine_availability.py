@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from fastapi import HTTPException
+
+from .engine_skills import bits_mask
+from .engine_types import ShiftTable
+from .engine_utils import MINUTES_PER_DAY, WEEKDAY_LABELS, cached_derived, parse_minutes
+from .logging_utils import log_event
+from .models import AvailabilityWindow, SolverRequest
+
+
+class ShiftIntervalIndex:
+    """
+    Turele sortate dupa start (minute absolute), pentru cautari de interval in O(log S + k).
+
+    Motivatie:
+    O fereastra de indisponibilitate verificata pe fiecare tura costa R x S; cu
+    start-urile sortate o singura data (cache pe tabel), fiecare fereastra este doua
+    cautari binare plus turele gasite.
+    """
+
+    def __init__(self, shifts: ShiftTable) -> None:
+        self.order = list(shifts.sorted_indices)
+        self.starts = [shifts.start_abs[shift_idx] for shift_idx in self.order]
+        self.ends = [shifts.end_abs[shift_idx] for shift_idx in self.order]
+        self.max_duration = max(shifts.durations, default=0)
+
+    def overlapping(self, start: int, end: int) -> list[int]:
+        # O tura [s, e) atinge [start, end) cand s < end si e > start; cum e - s <= durata
+        # maxima, candidatele incep in (start - max_duration, end).
+        low = bisect_right(self.starts, start - self.max_duration)
+        high = bisect_left(self.starts, end)
+        return [self.order[pos] for pos in range(low, high) if self.ends[pos] > start]
+
+    def contained(self, start: int, end: int) -> list[int]:
+        low = bisect_left(self.starts, start)
+        high = bisect_left(self.starts, end)
+        return [self.order[pos] for pos in range(low, high) if self.ends[pos] <= end]
+
+
+def get_shift_interval_index(shifts: ShiftTable) -> ShiftIntervalIndex:
+    return cached_derived(shifts, ("shift_interval_index",), lambda: ShiftIntervalIndex(shifts))
+
+
+def _parse_clock(value: str) -> int:
+    minutes = parse_minutes(value)
+    if not 0 <= minutes <= MINUTES_PER_DAY:
+        raise ValueError(f"time '{value}' is outside 00:00..24:00")
+    return minutes
+
+
+def _point_minutes(value: str, horizon_start: date, is_end: bool) -> int:
+    # Data simpla: inceputul zilei, iar pentru `end` sfarsitul ei (zile inclusive).
+    day_text, _, time_text = value.partition("T")
+    day_offset = (date.fromisoformat(day_text) - horizon_start).days
+    if not time_text:
+        return (day_offset + int(is_end)) * MINUTES_PER_DAY
+    return day_offset * MINUTES_PER_DAY + _parse_clock(time_text[:5])
+
+
+def window_intervals(
+    window: AvailabilityWindow,
+    horizon_start: date,
+    first_day: int,
+    last_day: int,
+) -> list[tuple[int, int]]:
+    """Intervalele [start, end) in minute fata de `horizon_start`; cele saptamanale pe zilele `first_day..last_day`."""
+    absolute = None
+    if window.start is not None or window.end is not None:
+        if window.start is None or window.end is None:
+            raise ValueError("absolute windows need both start and end")
+        absolute = (
+            _point_minutes(window.start, horizon_start, is_end=False),
+            _point_minutes(window.end, horizon_start, is_end=True),
+        )
+        if absolute[1] <= absolute[0]:
+            raise ValueError("end must be after start")
+    if not window.weekdays:
+        if absolute is None:
+            raise ValueError("set start/end, weekdays, or both")
+        return [absolute]
+
+    start_minute = _parse_clock(window.start_time)
+    end_minute = _parse_clock(window.end_time)
+    duration = (end_minute - start_minute) % MINUTES_PER_DAY or MINUTES_PER_DAY
+    weekdays = set(window.weekdays)
+    intervals = []
+    for day_offset in range(first_day, last_day + 1):
+        current = horizon_start + timedelta(days=day_offset)
+        if WEEKDAY_LABELS[current.weekday()] not in weekdays:
+            continue
+        start = day_offset * MINUTES_PER_DAY + start_minute
+        end = start + duration
+        if absolute is not None:
+            start, end = max(start, absolute[0]), min(end, absolute[1])
+        if start < end:
+            intervals.append((start, end))
+    return intervals
+
+
+def merge_intervals(intervals: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def resolve_availability(
+    payload: SolverRequest,
+    shifts: ShiftTable,
+    employee_idx_by_id: dict[str, int],
+    warnings: list[dict],
+    logger,
+    request_id: str,
+) -> list[int]:
+    """
+    Bitset-ul turelor indisponibile, per angajat ([] cand request-ul nu are ferestre).
+
+    - `unavailable`: orice tura care se suprapune cu fereastra;
+    - `available`: daca un angajat are astfel de ferestre, poate lucra doar turele
+      cuprinse complet in reuniunea lor.
+    Celulele rezultate devin neeligibile (`engine_skills.build_eligibility`), deci nu
+    ajung in model, la fel ca cele excluse de skill-uri.
+    """
+    if not payload.availability or not len(shifts):
+        return []
+    index = get_shift_interval_index(shifts)
+    horizon_start = date.fromisoformat(payload.horizon.start)
+    # Ziua dinainte acopera ferestrele saptamanale peste noapte care intra in prima zi.
+    first_day = min(shifts.start_abs) // MINUTES_PER_DAY - 1
+    last_day = max(shifts.end_abs) // MINUTES_PER_DAY
+
+    unavailable: dict[int, int] = {}
+    available: dict[int, list[tuple[int, int]]] = {}
+    for window_idx, window in enumerate(payload.availability):
+        employee_idx = employee_idx_by_id.get(window.employee_id)
+        if employee_idx is None:
+            log_event(
+                logger,
+                "WARN",
+                "solve.request.rejected",
+                request_id=request_id,
+                reason="availability_unknown_employee",
+                employee_id=window.employee_id,
+            )
+            raise HTTPException(
+                status_code=422,
+                detail=f"Availability window references unknown employee_id '{window.employee_id}'.",
+            )
+        try:
+            intervals = window_intervals(window, horizon_start, first_day, last_day)
+        except ValueError as exc:
+            log_event(
+                logger,
+                "WARN",
+                "solve.request.rejected",
+                request_id=request_id,
+                reason="availability_invalid_window",
+                window_idx=window_idx,
+                error=str(exc),
+            )
+            raise HTTPException(
+                status_code=422,
+                detail=f"Availability window #{window_idx} is invalid: {exc}.",
+            ) from exc
+        if window.type == "available":
+            available.setdefault(employee_idx, []).extend(intervals)
+            continue
+        for start, end in intervals:
+            unavailable[employee_idx] = unavailable.get(employee_idx, 0) | bits_mask(index.overlapping(start, end))
+
+    all_shifts = (1 << len(shifts)) - 1
+    for employee_idx, intervals in available.items():
+        allowed = 0
+        for start, end in merge_intervals(intervals):
+            allowed |= bits_mask(index.contained(start, end))
+        unavailable[employee_idx] = unavailable.get(employee_idx, 0) | (all_shifts & ~allowed)
+    for employee_idx, mask in unavailable.items():
+        if mask == all_shifts:
+            warnings.append(
+                {
+                    "code": "employee_unavailable_for_all_shifts",
+                    "employee_id": payload.employees[employee_idx].id,
+                }
+            )
+    return [unavailable.get(employee_idx, 0) for employee_idx in range(len(payload.employees))]
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import os
+import time
+
+from fastapi import HTTPException
+from google.protobuf import text_format
+from ortools.sat.python import cp_model
+
+from .engine_types import SolveProfile
+from .logging_utils import log_event
+
+# Milisecundele ramase pana cand apelantul renunta la request. Fiecare nivel
+# (frontend -> backend -> solver) trimite mai departe doar cat i-a ramas.
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+# Rezervat din deadline pentru construirea raspunsului (breakdown, serializare) si transport.
+DEADLINE_MARGIN_SECONDS = float(os.getenv("SOLVER_DEADLINE_MARGIN_SECONDS", "1.0"))
+# CP-SAT primeste macar atat, chiar daca deadline-ul e foarte aproape
+# (fara solutie, raspunsul ramane cel greedy).
+MIN_SEARCH_SECONDS = 0.1
+# Parametri CP-SAT suplimentari, in format text `SatParameters`
+# (ex. "linearization_level:2 symmetry_level:0"); au prioritate fata de profil.
+# Folositi la experimente si de `scripts.replay_captures --param`.
+CP_SAT_PARAMETERS = os.getenv("SOLVER_CP_SAT_PARAMETERS", "")
+
+SOLVE_PROFILES: dict[str, SolveProfile] = {
+    "quick": SolveProfile(
+        name="quick",
+        base_seconds=0.5,
+        seconds_per_10k_variables=0.5,
+        min_seconds=0.5,
+        max_seconds=3.0,
+        num_workers=4,
+        relative_gap_limit=0.05,
+    ),
+    "balanced": SolveProfile(
+        name="balanced",
+        base_seconds=2.0,
+        seconds_per_10k_variables=2.0,
+        min_seconds=2.0,
+        max_seconds=30.0,
+        num_workers=8,
+        relative_gap_limit=0.01,
+    ),
+    "thorough": SolveProfile(
+        name="thorough",
+        base_seconds=5.0,
+        seconds_per_10k_variables=6.0,
+        min_seconds=5.0,
+        max_seconds=120.0,
+        num_workers=8,
+        relative_gap_limit=0.0,
+    ),
+}
+
+
+def parse_deadline(headers, started_at: float, logger, request_id: str) -> float | None:
+    """Deadline-ul absolut (pe ceasul `time.perf_counter`) din headerul request-ului, daca exista."""
+    raw_value = headers.get(DEADLINE_HEADER)
+    if raw_value is None:
+        return None
+    try:
+        timeout_ms = int(raw_value)
+    except ValueError:
+        timeout_ms = 0
+    if timeout_ms <= 0:
+        log_event(
+            logger,
+            "WARN",
+            "solve.request.rejected",
+            request_id=request_id,
+            reason="invalid_deadline_header",
+            value=raw_value,
+        )
+        raise HTTPException(status_code=422, detail=f"{DEADLINE_HEADER} must be a positive integer.")
+    return started_at + timeout_ms / 1000.0
+
+
+def adaptive_time_limit(profile: SolveProfile, model: cp_model.CpModel) -> float:
+    # Motivatie:
+    # Un orar saptamanal mic se inchide in sub o secunda, iar unul lunar mare
+    # are nevoie de zeci de secunde; un buget fix e prea mare pentru primul
+    # (cand cautarea stagneaza) si prea mic pentru al doilea. Numarul de
+    # variabile din proto creste cu angajati x ture si cu regulile de secventa.
+    num_variables = len(model.proto.variables)
+    seconds = profile.base_seconds + profile.seconds_per_10k_variables * num_variables / 10_000
+    return min(profile.max_seconds, max(profile.min_seconds, seconds))
+
+
+def search_time_limit(
+    profile: SolveProfile,
+    model: cp_model.CpModel,
+    max_time_seconds: float | None,
+    deadline: float | None,
+) -> tuple[float, str]:
+    """Intoarce (secunde de cautare, sursa limitei: `adaptive` / `fixed` / `deadline`)."""
+    if max_time_seconds is None:
+        seconds, source = adaptive_time_limit(profile, model), "adaptive"
+    else:
+        seconds, source = max_time_seconds, "fixed"
+    if deadline is not None:
+        remaining_seconds = deadline - time.perf_counter() - DEADLINE_MARGIN_SECONDS
+        if remaining_seconds < seconds:
+            seconds, source = max(MIN_SEARCH_SECONDS, remaining_seconds), "deadline"
+    return seconds, source
+
+
+def configure_search(
+    solver: cp_model.CpSolver,
+    profile: SolveProfile,
+    max_time_seconds: float,
+    num_workers: int,
+) -> None:
+    solver.parameters.max_time_in_seconds = max_time_seconds
+    solver.parameters.num_workers = num_workers
+    solver.parameters.relative_gap_limit = profile.relative_gap_limit
+    if CP_SAT_PARAMETERS:
+        text_format.Merge(CP_SAT_PARAMETERS, solver.parameters)
+
+
+def relative_gap(objective: float, objective_bound: float) -> float:
+    # Aceeasi definitie ca `relative_gap_limit` din CP-SAT.
+    return abs(objective_bound - objective) / max(1.0, abs(objective))
+
+
+def reported_status(status: int, objective: float, objective_bound: float) -> int:
+    # La `relative_gap_limit` CP-SAT intoarce OPTIMAL fara ca solutia sa fie dovedit optima;
+    # in raspuns o raportam ca "feasible", cu `search.stop_reason = "gap_limit"`.
+    if status == cp_model.OPTIMAL and objective < objective_bound:
+        return cp_model.FEASIBLE
+    return status
+
+
+def build_search_summary(
+    profile: SolveProfile,
+    time_limit_seconds: float,
+    time_limit_source: str,
+    num_workers: int,
+    status: int,
+    objective: float | None,
+    objective_bound: float | None,
+    wall_time_seconds: float,
+    cancelled: bool = False,
+) -> dict:
+    gap = None
+    if objective is not None and objective_bound is not None:
+        gap = round(relative_gap(objective, objective_bound), 6)
+
+    if status == cp_model.OPTIMAL:
+        stop_reason = "optimal" if not gap else "gap_limit"
+    elif status == cp_model.INFEASIBLE:
+        stop_reason = "infeasible"
+    elif status == cp_model.MODEL_INVALID:
+        stop_reason = "model_invalid"
+    elif cancelled:
+        stop_reason = "cancelled"
+    else:
+        stop_reason = "deadline" if time_limit_source == "deadline" else "time_limit"
+
+    return {
+        "profile": profile.name,
+        "time_limit_seconds": round(time_limit_seconds, 3),
+        "time_limit_source": time_limit_source,
+        "num_workers": num_workers,
+        "relative_gap_limit": profile.relative_gap_limit,
+        "objective_bound": objective_bound,
+        "gap": gap,
+        "stop_reason": stop_reason,
+        "wall_time_seconds": round(wall_time_seconds, 3),
+    }
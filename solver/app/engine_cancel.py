@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from ortools.sat.python import cp_model
+
+
+class CancelToken:
+    """Starea de anulare a unui request: flag + solverele CP-SAT care ruleaza acum pentru el."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.solvers: set[cp_model.CpSolver] = set()
+        # Request-uri concurente cu acelasi X-Request-Id impart token-ul.
+        self.refs = 0
+
+    def cancel(self) -> None:
+        with self.lock:
+            self.cancelled = True
+            solvers = list(self.solvers)
+        for solver in solvers:
+            solver.stop_search()
+
+
+_tokens: dict[str, CancelToken] = {}
+_tokens_lock = threading.Lock()
+
+
+@contextmanager
+def registered_request(request_id: str) -> Iterator[CancelToken]:
+    """Face request-ul anulabil (deconectare client sau `POST /solve/cancel/{request_id}`) cat timp ruleaza."""
+    with _tokens_lock:
+        token = _tokens.get(request_id)
+        if token is None:
+            token = _tokens[request_id] = CancelToken()
+        token.refs += 1
+    try:
+        yield token
+    finally:
+        with _tokens_lock:
+            token.refs -= 1
+            if token.refs == 0:
+                _tokens.pop(request_id, None)
+
+
+def cancel_request(request_id: str) -> bool:
+    with _tokens_lock:
+        token = _tokens.get(request_id)
+    if token is None:
+        return False
+    token.cancel()
+    return True
+
+
+def is_cancelled(request_id: str) -> bool:
+    token = _tokens.get(request_id)
+    return token is not None and token.cancelled
+
+
+@contextmanager
+def cancellable_search(request_id: str, solver: cp_model.CpSolver) -> Iterator[None]:
+    """
+    Inregistreaza `solver` pe request pe durata unui `solve()`, ca anularea sa-l opreasca
+    (`stop_search`; CP-SAT intoarce cea mai buna solutie gasita pana atunci).
+
+    Daca request-ul e deja anulat, cautarea primeste timp 0: `stop_search` nu are efect
+    inainte ca `solve()` sa porneasca.
+    """
+    token = _tokens.get(request_id)
+    if token is None:
+        yield
+        return
+    with token.lock:
+        token.solvers.add(solver)
+        if token.cancelled:
+            solver.parameters.max_time_in_seconds = 0.0
+    try:
+        yield
+    finally:
+        with token.lock:
+            token.solvers.discard(solver)
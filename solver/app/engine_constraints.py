@@ -2,37 +2,62 @@ from __future__ import annotations
 
 import math
 
-from fastapi import HTTPException
 from ortools.sat.python import cp_model
 
-from .engine_types import AssignVars, BalanceContext, ObjectiveTerm
+from .engine_normalize import get_normalized_rules
+from .engine_proto import ProtoConstraintWriter, negated
+from .engine_skills import filter_eligible, get_eligibility, group_masks, iter_bits, qualified_employees
+from .engine_types import (
+    AssignIndex,
+    AssignVars,
+    BalanceContext,
+    Eligibility,
+    ObjectiveTerm,
+    SoftCellTerm,
+    SolveInstance,
+)
 from .engine_utils import (
-    build_minimal_qualifying_chain_by_left,
-    compute_max_worktime_violating_windows,
-    find_matching_shift_ids,
-    shift_order_key,
-    shift_to_meta,
+    get_max_worktime_violating_windows,
+    get_minimal_qualifying_chain_by_left,
+    get_overlap_cliques,
+    get_short_rest_pairs,
 )
-from .logging_utils import log_event
-from .models import SolverRequest
+from .engine_workload import WorkloadAggregates
+from .models import FeatureToggles
 
 
 def build_assignment_variables(
     model: cp_model.CpModel,
     num_employees: int,
     num_shifts: int,
+    fixed_assignments: dict[tuple[int, int], int] | None = None,
+    eligibility: Eligibility | None = None,
 ) -> AssignVars:
+    # `fixed_assignments` (mod repair): celulele din afara vecinatatii devin
+    # constante, iar presolve-ul CP-SAT elimina restrictiile care le ating.
+    # Celulele neeligibile (skill-uri) refolosesc constanta 0 a modelului (o singura
+    # variabila in proto, oricate celule).
     assign: AssignVars = {}
+    fixed_assignments = fixed_assignments or {}
+    ineligible = model.new_constant(0) if eligibility is not None and eligibility.restricted else None
     for employee_idx in range(num_employees):
+        eligible_shifts = eligibility.eligible_shifts[employee_idx] if ineligible is not None else -1
         for shift_idx in range(num_shifts):
-            assign[(employee_idx, shift_idx)] = model.new_bool_var(f"a_e{employee_idx}_s{shift_idx}")
+            if not eligible_shifts >> shift_idx & 1:
+                assign[(employee_idx, shift_idx)] = ineligible
+                continue
+            fixed_value = fixed_assignments.get((employee_idx, shift_idx))
+            if fixed_value is not None:
+                assign[(employee_idx, shift_idx)] = model.new_constant(fixed_value)
+            else:
+                assign[(employee_idx, shift_idx)] = model.new_bool_var(f"a_e{employee_idx}_s{shift_idx}")
     return assign
 
 
 def add_shift_coverage_constraints(
-    model: cp_model.CpModel,
-    assign: AssignVars,
-    payload: SolverRequest,
+    writer: ProtoConstraintWriter,
+    assign_index: AssignIndex,
+    instance: SolveInstance,
     num_employees: int,
 ) -> None:
     # Motivatie:
@@ -40,37 +65,58 @@ def add_shift_coverage_constraints(
     # Astfel, solverul cauta doar orare unde fiecare tura are exact
     # numarul cerut de oameni, iar preferintele influenteaza doar
     # alegerea dintre solutiile deja fezabile.
-    for shift_idx, shift in enumerate(payload.shifts):
-        model.add(
-            sum(assign[(employee_idx, shift_idx)] for employee_idx in range(num_employees))
-            == shift.required
-        )
-
-
-def collect_enabled_feature_toggles(payload: SolverRequest) -> list[str]:
+    # Sumele merg doar peste angajatii eligibili; `skill_requirements` adauga cate o
+    # restrictie "cel putin n" peste cei eligibili care au skill-ul.
+    eligibility = get_eligibility(instance)
+    shifts = instance.shifts
+    ones = [1] * num_employees
+    for shift_idx, required in enumerate(shifts.required):
+        if eligibility.restricted:
+            column = [
+                assign_index[employee_idx][shift_idx]
+                for employee_idx in iter_bits(eligibility.eligible_employees[shift_idx])
+            ]
+        else:
+            column = [assign_index[employee_idx][shift_idx] for employee_idx in range(num_employees)]
+        writer.add_linear(column, ones[: len(column)], required, required)
+        for skill, count in shifts.skill_requirements[shift_idx].items():
+            skilled = [
+                assign_index[employee_idx][shift_idx]
+                for employee_idx in iter_bits(qualified_employees(instance, shift_idx, skill))
+            ]
+            writer.add_linear(skilled, [1] * len(skilled), count, required)
+
+
+def collect_enabled_feature_toggles(feature_toggles: FeatureToggles) -> list[str]:
     enabled_feature_toggles: list[str] = []
-    if payload.feature_toggles.max_worktime_in_row_enabled:
+    if feature_toggles.max_worktime_in_row_enabled:
         enabled_feature_toggles.append("max_worktime_in_row")
-    if payload.feature_toggles.min_rest_after_shift_hard_enabled:
+    if feature_toggles.min_rest_after_shift_hard_enabled:
         enabled_feature_toggles.append("min_rest_after_shift_hard")
-    if payload.feature_toggles.min_rest_after_shift_soft_enabled:
+    if feature_toggles.min_rest_after_shift_soft_enabled:
         enabled_feature_toggles.append("min_rest_after_shift_soft")
-    if payload.feature_toggles.balance_worked_hours:
+    if feature_toggles.balance_worked_hours:
         enabled_feature_toggles.append("balance_worked_hours")
+    if feature_toggles.no_double_booking_enabled:
+        enabled_feature_toggles.append("no_double_booking")
+    if feature_toggles.max_shifts_per_day_enabled:
+        enabled_feature_toggles.append("max_shifts_per_day")
+    if feature_toggles.max_hours_per_week_enabled:
+        enabled_feature_toggles.append("max_hours_per_week")
+    if feature_toggles.min_days_off_per_week_enabled:
+        enabled_feature_toggles.append("min_days_off_per_week")
     return enabled_feature_toggles
 
 
 def apply_max_worktime_constraints(
-    payload: SolverRequest,
-    model: cp_model.CpModel,
-    assign: AssignVars,
+    instance: SolveInstance,
+    writer: ProtoConstraintWriter,
+    assign_index: AssignIndex,
     num_employees: int,
-    shift_start_abs: list[int],
-    shift_end_abs: list[int],
-    shift_durations: list[int],
+    fixed_assignments: dict[tuple[int, int], int] | None = None,
 ) -> list[list[int]]:
     violating_windows: list[list[int]] = []
-    if not payload.feature_toggles.max_worktime_in_row_enabled:
+    if not instance.feature_toggles.max_worktime_in_row_enabled:
         return violating_windows
 
     # Motivatie:
@@ -78,137 +124,145 @@ def apply_max_worktime_constraints(
     # Un shift individual poate depasi pragul,
     # dar nu permitem sa fie lipit de alte ture daca lantul rezultat
     # depaseste limita configurata.
-    violating_windows = compute_max_worktime_violating_windows(
-        payload,
-        shift_start_abs,
-        shift_end_abs,
-        shift_durations,
+    violating_windows = get_max_worktime_violating_windows(
+        instance.shifts,
+        instance.feature_toggles.max_worktime_in_row_hours * 60,
     )
 
+    # "Nu toate turele din fereastra" = o clauza pe literalele negate.
+    fixed_assignments = fixed_assignments or {}
+    eligibility = get_eligibility(instance)
+    window_masks = group_masks(violating_windows) if eligibility.restricted else None
     for employee_idx in range(num_employees):
-        for window in violating_windows:
-            model.add(sum(assign[(employee_idx, shift_idx)] for shift_idx in window) <= len(window) - 1)
+        employee_literals = assign_index[employee_idx]
+        for window in filter_eligible(violating_windows, window_masks, eligibility.eligible_shifts[employee_idx]):
+            if fixed_assignments:
+                window_values = [fixed_assignments.get((employee_idx, shift_idx)) for shift_idx in window]
+                if None not in window_values:
+                    # Fereastra complet fixata (mod repair): o verificam direct.
+                    if all(window_values):
+                        writer.add_bool_or([])
+                    continue
+            writer.add_bool_or([negated(employee_literals[shift_idx]) for shift_idx in window])
 
     return violating_windows
 
 
+def apply_no_double_booking_constraints(
+    instance: SolveInstance,
+    writer: ProtoConstraintWriter,
+    assign_index: AssignIndex,
+    num_employees: int,
+) -> None:
+    # "Cel mult o tura" per grup de ture care ruleaza simultan; formularea "interval"
+    # obtine acelasi lucru din `NoOverlap` si nu le adauga.
+    if not instance.feature_toggles.no_double_booking_enabled:
+        return
+    cliques = get_overlap_cliques(instance.shifts)
+    eligibility = get_eligibility(instance)
+    for employee_idx in range(num_employees):
+        eligible_shifts = eligibility.eligible_shifts[employee_idx]
+        employee_literals = assign_index[employee_idx]
+        for clique in cliques:
+            literals = [employee_literals[shift_idx] for shift_idx in clique if eligible_shifts >> shift_idx & 1]
+            if len(literals) > 1:
+                writer.add_linear(literals, [1] * len(literals), 0, 1)
+
+
 def apply_hard_constraints(
-    payload: SolverRequest,
+    instance: SolveInstance,
     model: cp_model.CpModel,
     assign: AssignVars,
-    employee_idx_by_id: dict[str, int],
-    warnings: list[dict],
-    logger,
-    request_id: str,
 ) -> None:
-    for hard in payload.constraints.hard:
-        employee_idx = employee_idx_by_id.get(hard.employee_id)
-        if employee_idx is None:
-            log_event(
-                logger,
-                "WARN",
-                "solve.request.rejected",
-                request_id=request_id,
-                reason="hard_constraint_unknown_employee",
-                employee_id=hard.employee_id,
-            )
-            raise HTTPException(
-                status_code=422,
-                detail=f"Hard constraint references unknown employee_id '{hard.employee_id}'.",
-            )
-
-        matching_shift_ids = find_matching_shift_ids(payload.shifts, hard)
-        if not matching_shift_ids:
-            warnings.append(
-                {
-                    "code": "no_matching_shift_for_hard_constraint",
-                    "constraint_type": hard.type,
-                    "employee_id": hard.employee_id,
-                }
-            )
-            continue
-
-        for shift_idx in matching_shift_ids:
-            if hard.type == "forbid_shift":
-                model.add(assign[(employee_idx, shift_idx)] == 0)
-            elif hard.type == "require_shift":
-                model.add(assign[(employee_idx, shift_idx)] == 1)
+    # Celulele sunt deja fara duplicate (`engine_normalize`).
+    normalized = get_normalized_rules(instance)
+    for cell in normalized.forbidden_cells:
+        model.add(assign[cell] == 0)
+    for cell in normalized.required_cells:
+        model.add(assign[cell] == 1)
 
 
 def apply_user_soft_constraints(
-    payload: SolverRequest,
+    instance: SolveInstance,
     assign: AssignVars,
-    employee_idx_by_id: dict[str, int],
     objective_term_refs: list[ObjectiveTerm],
-    warnings: list[dict],
-    logger,
-    request_id: str,
 ) -> None:
-    for soft in payload.constraints.soft:
-        employee_idx = employee_idx_by_id.get(soft.employee_id)
-        if employee_idx is None:
-            log_event(
-                logger,
-                "WARN",
-                "solve.request.rejected",
-                request_id=request_id,
-                reason="soft_constraint_unknown_employee",
-                employee_id=soft.employee_id,
-            )
-            raise HTTPException(
-                status_code=422,
-                detail=f"Soft constraint references unknown employee_id '{soft.employee_id}'.",
-            )
+    # Un singur termen per celula, cu ponderile regulilor care o ating insumate
+    # (celulele neeligibile sunt deja scoase la normalizare).
+    for soft_cell in get_normalized_rules(instance).soft_cells:
+        objective_term_refs.append(
+            user_soft_term(instance, soft_cell, assign[(soft_cell.employee_idx, soft_cell.shift_idx)])
+        )
 
-        matching_shift_ids = find_matching_shift_ids(payload.shifts, soft)
-        if not matching_shift_ids:
-            warnings.append(
-                {
-                    "code": "no_matching_shift_for_soft_constraint",
-                    "constraint_type": soft.type,
-                    "employee_id": soft.employee_id,
-                }
-            )
-            continue
 
-        for shift_idx in matching_shift_ids:
-            shift = payload.shifts[shift_idx]
-            coefficient = soft.weight if soft.type == "prefer_assignment" else -soft.weight
-            objective_term_refs.append(
-                {
-                    "var": assign[(employee_idx, shift_idx)],
-                    "coefficient": coefficient,
-                    "source": "user_soft_constraint",
-                    "constraint_type": soft.type,
-                    "employee_id": payload.employees[employee_idx].id,
-                    "employee_name": payload.employees[employee_idx].name,
-                    "weight": soft.weight,
-                    "shift": shift_to_meta(shift),
-                }
-            )
+def user_soft_term(
+    instance: SolveInstance,
+    soft_cell: SoftCellTerm,
+    var: cp_model.IntVar | int,
+) -> ObjectiveTerm:
+    # `var` poate fi si o valoare deja cunoscuta (evaluarea solutiei greedy).
+    # Breakdown-ul imparte termenul inapoi pe regulile din `soft_cell.sources`.
+    employee_idx = soft_cell.employee_idx
+    shift_idx = soft_cell.shift_idx
+    return {
+        "var": var,
+        "coefficient": soft_cell.coefficient,
+        "source": "user_soft_constraint",
+        "constraint_type": "user_soft_cell",
+        "employee_id": instance.employee_ids[employee_idx],
+        "employee_name": instance.employee_names[employee_idx],
+        "shift": instance.shifts.meta(shift_idx),
+        "cells": [(employee_idx, shift_idx)],
+        "soft_cell": soft_cell,
+    }
+
+
+def short_rest_threshold_minutes(feature_toggles: FeatureToggles) -> int:
+    thresholds = [0]
+    if feature_toggles.min_rest_after_shift_hard_enabled:
+        thresholds.append(feature_toggles.min_rest_after_shift_hard_hours * 60)
+    if feature_toggles.min_rest_after_shift_soft_enabled:
+        thresholds.append(feature_toggles.min_rest_after_shift_soft_hours * 60)
+    return max(thresholds)
+
+
+def prepare_derived_structures(instance: SolveInstance) -> None:
+    """
+    Calculeaza in avans structurile derivate din tabelul de ture de care va avea
+    nevoie modelul (cache pe `ShiftTable.derived`).
+
+    Util cand acelasi tabel este trimis in alte procese (scenarii batch):
+    fiecare proces primeste structurile gata calculate.
+    """
+    feature_toggles = instance.feature_toggles
+    max_chain_minutes = feature_toggles.max_worktime_in_row_hours * 60
+    if feature_toggles.max_worktime_in_row_enabled:
+        get_max_worktime_violating_windows(instance.shifts, max_chain_minutes)
+    if feature_toggles.min_rest_after_shift_hard_enabled or feature_toggles.min_rest_after_shift_soft_enabled:
+        get_minimal_qualifying_chain_by_left(instance.shifts, max_chain_minutes)
+        get_short_rest_pairs(instance.shifts, short_rest_threshold_minutes(feature_toggles))
 
 
 def apply_min_rest_constraints(
-    payload: SolverRequest,
+    instance: SolveInstance,
     model: cp_model.CpModel,
+    writer: ProtoConstraintWriter,
     assign: AssignVars,
+    assign_index: AssignIndex,
     num_employees: int,
     num_shifts: int,
-    shift_start_abs: list[int],
-    shift_end_abs: list[int],
-    shift_durations: list[int],
     objective_term_refs: list[ObjectiveTerm],
+    fixed_assignments: dict[tuple[int, int], int] | None = None,
 ) -> None:
-    min_rest_hard_enabled = payload.feature_toggles.min_rest_after_shift_hard_enabled
-    min_rest_soft_enabled = payload.feature_toggles.min_rest_after_shift_soft_enabled
+    feature_toggles = instance.feature_toggles
+    min_rest_hard_enabled = feature_toggles.min_rest_after_shift_hard_enabled
+    min_rest_soft_enabled = feature_toggles.min_rest_after_shift_soft_enabled
     if not (min_rest_hard_enabled or min_rest_soft_enabled):
         return
 
-    min_hard_rest_minutes = payload.feature_toggles.min_rest_after_shift_hard_hours * 60
-    min_soft_rest_minutes = payload.feature_toggles.min_rest_after_shift_soft_hours * 60
-    short_rest_penalty_weight = payload.feature_toggles.min_rest_after_shift_soft_weight
-    max_chain_for_rest_minutes = payload.feature_toggles.max_worktime_in_row_hours * 60
-    sorted_shift_indices = sorted(range(num_shifts), key=lambda idx: shift_order_key(payload.shifts[idx]))
+    min_hard_rest_minutes = feature_toggles.min_rest_after_shift_hard_hours * 60
+    min_soft_rest_minutes = feature_toggles.min_rest_after_shift_soft_hours * 60
+    max_chain_for_rest_minutes = feature_toggles.max_worktime_in_row_hours * 60
 
     # Motivatie:
     # Regulile de "minimum rest gap" se aplica doar dupa ce un angajat a atins
@@ -216,116 +270,180 @@ def apply_min_rest_constraints(
     # Avem doua variante:
     # - hard: combinatia devine interzisa;
     # - soft: combinatia e permisa, dar penalizata in obiectiv.
-    minimal_chain_by_left = build_minimal_qualifying_chain_by_left(
-        sorted_shift_indices=sorted_shift_indices,
-        shift_start_abs=shift_start_abs,
-        shift_end_abs=shift_end_abs,
-        shift_durations=shift_durations,
-        max_chain_minutes=max_chain_for_rest_minutes,
-    )
+    minimal_chain_by_left = get_minimal_qualifying_chain_by_left(instance.shifts, max_chain_for_rest_minutes)
 
+    # Perechile scurte sunt calculate o data pentru pragul maxim, apoi filtrate.
+    short_rest_pairs = get_short_rest_pairs(instance.shifts, short_rest_threshold_minutes(feature_toggles))
     hard_short_rest_pairs = []
     soft_short_rest_pairs = []
-    for left_shift_idx in range(num_shifts):
-        left_end = shift_end_abs[left_shift_idx]
-        for right_shift_idx in range(num_shifts):
-            if left_shift_idx == right_shift_idx:
-                continue
-            right_start = shift_start_abs[right_shift_idx]
-            rest_minutes = right_start - left_end
-            if rest_minutes < 0:
-                continue
-            if min_rest_hard_enabled and rest_minutes < min_hard_rest_minutes:
-                hard_short_rest_pairs.append((left_shift_idx, right_shift_idx, rest_minutes))
-            if min_rest_soft_enabled and rest_minutes < min_soft_rest_minutes:
-                soft_short_rest_pairs.append((left_shift_idx, right_shift_idx, rest_minutes))
+    for pair in short_rest_pairs:
+        rest_minutes = pair[2]
+        if min_rest_hard_enabled and rest_minutes < min_hard_rest_minutes:
+            hard_short_rest_pairs.append(pair)
+        if min_rest_soft_enabled and rest_minutes < min_soft_rest_minutes:
+            soft_short_rest_pairs.append(pair)
+
+    # Literalele "lant atins" sunt create doar pentru shift-urile left folosite de
+    # o pereche si sunt comune regulilor hard si soft.
+    used_lefts = sorted(
+        {left_shift_idx for left_shift_idx, _, _ in hard_short_rest_pairs + soft_short_rest_pairs}
+        & minimal_chain_by_left.keys()
+    )
 
+    # Mod repair: celulele fixate au valori cunoscute; lanturile si perechile
+    # formate doar din ele sunt evaluate direct, fara variabile/restrictii noi.
+    fixed_assignments = fixed_assignments or {}
+    eligibility = get_eligibility(instance)
+    chain_masks = None
+    if eligibility.restricted:
+        chain_masks = group_masks([minimal_chain_by_left[left_shift_idx] for left_shift_idx in used_lefts])
     for employee_idx in range(num_employees):
-        reached_max_chain_by_left: dict[int, cp_model.IntVar] = {}
-        for left_shift_idx, minimal_chain in minimal_chain_by_left.items():
-            reached_max_chain = model.new_bool_var(f"max_chain_reached_e{employee_idx}_left{left_shift_idx}")
-            for shift_idx in minimal_chain:
-                model.add(reached_max_chain <= assign[(employee_idx, shift_idx)])
-            model.add(
-                reached_max_chain
-                >= sum(assign[(employee_idx, shift_idx)] for shift_idx in minimal_chain)
-                - len(minimal_chain)
-                + 1
+        employee_literals = assign_index[employee_idx]
+        eligible_shifts = eligibility.eligible_shifts[employee_idx]
+        # Valoare cunoscuta (int, celule fixate) sau indexul literalului "lant atins".
+        # Lanturile cu o tura neeligibila nu pot fi atinse: fara literal si fara perechi.
+        reached_max_chain_by_left: dict[int, tuple[bool, int]] = {}
+        for left_shift_idx in filter_eligible(used_lefts, chain_masks, eligible_shifts):
+            minimal_chain = minimal_chain_by_left[left_shift_idx]
+            if fixed_assignments:
+                chain_values = [fixed_assignments.get((employee_idx, shift_idx)) for shift_idx in minimal_chain]
+                if None not in chain_values:
+                    reached_max_chain_by_left[left_shift_idx] = (True, int(all(chain_values)))
+                    continue
+            reached_max_chain_by_left[left_shift_idx] = (
+                False,
+                chain_reached_literal(model, writer, employee_literals, employee_idx, left_shift_idx, minimal_chain),
             )
-            reached_max_chain_by_left[left_shift_idx] = reached_max_chain
 
         # Hard minimum rest: daca lantul a atins pragul, urmatoarea tura
         # cu pauza insuficienta devine interzisa.
         for left_shift_idx, right_shift_idx, _ in hard_short_rest_pairs:
-            reached_max_chain = reached_max_chain_by_left.get(left_shift_idx)
-            if reached_max_chain is None:
+            reached = reached_max_chain_by_left.get(left_shift_idx)
+            if reached is None or not eligible_shifts >> right_shift_idx & 1:
+                continue
+            reached_is_known, reached_max_chain = reached
+            if reached_is_known and not reached_max_chain:
                 continue
-            model.add(reached_max_chain + assign[(employee_idx, right_shift_idx)] <= 1)
+            right_value = fixed_assignments.get((employee_idx, right_shift_idx)) if fixed_assignments else None
+            if reached_is_known and right_value is not None:
+                if right_value:
+                    writer.add_bool_or([])
+                continue
+            right_literal = employee_literals[right_shift_idx]
+            if reached_is_known:
+                writer.add_bool_or([negated(right_literal)])
+            else:
+                writer.add_bool_or([negated(reached_max_chain), negated(right_literal)])
 
         # Soft minimum rest: pastram aceeasi logica, dar cu penalizare.
         for left_shift_idx, right_shift_idx, rest_minutes in soft_short_rest_pairs:
-            reached_max_chain = reached_max_chain_by_left.get(left_shift_idx)
-            if reached_max_chain is None:
+            reached = reached_max_chain_by_left.get(left_shift_idx)
+            if reached is None or not eligible_shifts >> right_shift_idx & 1:
                 continue
+            reached_is_known, reached_max_chain = reached
+
+            right_value = fixed_assignments.get((employee_idx, right_shift_idx)) if fixed_assignments else None
+            if reached_is_known and (not reached_max_chain or right_value is not None):
+                short_rest_after_max_chain = model.new_constant(int(bool(reached_max_chain) and right_value == 1))
+            elif reached_is_known:
+                # Lant atins cu certitudine: penalizarea urmeaza direct tura din dreapta.
+                short_rest_after_max_chain = assign[(employee_idx, right_shift_idx)]
+            else:
+                short_rest_after_max_chain = short_rest_literal(
+                    model,
+                    writer,
+                    reached_max_chain,
+                    employee_literals[right_shift_idx],
+                    f"short_rest_after_max_e{employee_idx}_s{left_shift_idx}_s{right_shift_idx}",
+                )
 
-            short_rest_after_max_chain = model.new_bool_var(
-                f"short_rest_after_max_e{employee_idx}_s{left_shift_idx}_s{right_shift_idx}"
-            )
-            model.add(short_rest_after_max_chain <= reached_max_chain)
-            model.add(short_rest_after_max_chain <= assign[(employee_idx, right_shift_idx)])
-            model.add(
-                short_rest_after_max_chain
-                >= reached_max_chain + assign[(employee_idx, right_shift_idx)] - 1
-            )
-
-            left_shift = payload.shifts[left_shift_idx]
-            right_shift = payload.shifts[right_shift_idx]
             objective_term_refs.append(
-                {
-                    "var": short_rest_after_max_chain,
-                    "coefficient": -short_rest_penalty_weight,
-                    "source": "feature_toggle",
-                    "constraint_type": "min_rest_after_shift",
-                    "employee_id": payload.employees[employee_idx].id,
-                    "employee_name": payload.employees[employee_idx].name,
-                    "weight": short_rest_penalty_weight,
-                    "rest_minutes": rest_minutes,
-                    "required_rest_minutes": min_soft_rest_minutes,
-                    "left_shift": shift_to_meta(left_shift),
-                    "right_shift": shift_to_meta(right_shift),
-                }
+                min_rest_term(
+                    instance, employee_idx, left_shift_idx, right_shift_idx, rest_minutes, short_rest_after_max_chain
+                )
             )
 
 
+def chain_reached_literal(
+    model: cp_model.CpModel,
+    writer: ProtoConstraintWriter,
+    employee_literals: list[int],
+    employee_idx: int,
+    left_shift_idx: int,
+    minimal_chain: list[int],
+) -> int:
+    """
+    Indexul literalului "lantul minim care se termina in `left` este complet atribuit"
+    (reified prin clauze); un lant de o singura tura refoloseste direct `assign`.
+    """
+    chain_literals = [employee_literals[shift_idx] for shift_idx in minimal_chain]
+    if len(chain_literals) == 1:
+        return chain_literals[0]
+    reached_max_chain = model.new_bool_var(f"max_chain_reached_e{employee_idx}_left{left_shift_idx}").index
+    writer.add_bool_and(chain_literals, reached_max_chain)
+    writer.add_bool_or([negated(literal) for literal in chain_literals] + [reached_max_chain])
+    return reached_max_chain
+
+
+def short_rest_literal(
+    model: cp_model.CpModel,
+    writer: ProtoConstraintWriter,
+    reached_max_chain: int,
+    right_literal: int,
+    name: str,
+) -> cp_model.IntVar:
+    # short <=> reached AND right, ca doua clauze in loc de trei inegalitati liniare.
+    short_rest_after_max_chain = model.new_bool_var(name)
+    short_index = short_rest_after_max_chain.index
+    writer.add_bool_and([reached_max_chain, right_literal], short_index)
+    writer.add_bool_or([negated(reached_max_chain), negated(right_literal), short_index])
+    return short_rest_after_max_chain
+
+
+def min_rest_term(
+    instance: SolveInstance,
+    employee_idx: int,
+    left_shift_idx: int,
+    right_shift_idx: int,
+    rest_minutes: int,
+    var: cp_model.IntVar | int,
+) -> ObjectiveTerm:
+    feature_toggles = instance.feature_toggles
+    return {
+        "var": var,
+        "coefficient": -feature_toggles.min_rest_after_shift_soft_weight,
+        "source": "feature_toggle",
+        "constraint_type": "min_rest_after_shift",
+        "employee_id": instance.employee_ids[employee_idx],
+        "employee_name": instance.employee_names[employee_idx],
+        "weight": feature_toggles.min_rest_after_shift_soft_weight,
+        "rest_minutes": rest_minutes,
+        "required_rest_minutes": feature_toggles.min_rest_after_shift_soft_hours * 60,
+        "left_shift": instance.shifts.meta(left_shift_idx),
+        "right_shift": instance.shifts.meta(right_shift_idx),
+        "cells": [(employee_idx, left_shift_idx), (employee_idx, right_shift_idx)],
+    }
+
+
 def apply_balance_worked_hours_constraint(
-    payload: SolverRequest,
+    instance: SolveInstance,
     model: cp_model.CpModel,
-    assign: AssignVars,
+    aggregates: WorkloadAggregates,
     num_employees: int,
-    num_shifts: int,
-    shift_durations: list[int],
     objective_term_refs: list[ObjectiveTerm],
 ) -> BalanceContext:
     context = BalanceContext()
-    if not payload.feature_toggles.balance_worked_hours:
+    feature_toggles = instance.feature_toggles
+    if not feature_toggles.balance_worked_hours:
         return context
 
-    total_shift_minutes = sum(shift_durations)
-    max_hours_upper = max(1, (total_shift_minutes + 59) // 60)
+    _, max_hours_upper, average_shift_duration_minutes, allowed_span_hours = compute_balance_limits(instance)
     employee_work_hours = []
 
+    # Minutele per angajat sunt agregatele partajate (suma variabilelor saptamanale).
     for employee_idx in range(num_employees):
-        work_minutes = model.new_int_var(0, total_shift_minutes, f"work_minutes_e{employee_idx}")
-        model.add(
-            work_minutes
-            == sum(
-                shift_durations[shift_idx] * assign[(employee_idx, shift_idx)]
-                for shift_idx in range(num_shifts)
-            )
-        )
-
         work_hours = model.new_int_var(0, max_hours_upper, f"work_hours_e{employee_idx}")
-        model.add_division_equality(work_hours, work_minutes, 60)
+        model.add_division_equality(work_hours, aggregates.work_minutes(employee_idx), 60)
         employee_work_hours.append(work_hours)
 
     context.min_hours_var = model.new_int_var(0, max_hours_upper, "min_work_hours")
@@ -336,40 +454,57 @@ def apply_balance_worked_hours_constraint(
     context.hours_span_var = model.new_int_var(0, max_hours_upper, "worked_hours_span")
     model.add(context.hours_span_var == context.max_hours_var - context.min_hours_var)
 
-    context.average_shift_duration_minutes = total_shift_minutes / max(1, len(shift_durations))
-    context.allowed_span_hours = math.ceil(
-        (
-            context.average_shift_duration_minutes
-            * payload.feature_toggles.balance_worked_hours_max_span_multiplier
-        )
-        / 60
-    )
-    context.allowed_span_hours = min(context.allowed_span_hours, max_hours_upper)
+    context.average_shift_duration_minutes = average_shift_duration_minutes
+    context.allowed_span_hours = allowed_span_hours
 
     balance_excess_span_hours = model.new_int_var(0, max_hours_upper, "worked_hours_span_excess")
     model.add(balance_excess_span_hours >= context.hours_span_var - context.allowed_span_hours)
     model.add(balance_excess_span_hours >= 0)
 
-    objective_term_refs.append(
-        {
-            "var": balance_excess_span_hours,
-            "coefficient": -payload.feature_toggles.balance_worked_hours_weight,
-            "source": "feature_toggle",
-            "constraint_type": "balance_worked_hours",
-            "employee_id": "all",
-            "employee_name": "All employees",
-            "weight": payload.feature_toggles.balance_worked_hours_weight,
-            "allowed_span_hours": context.allowed_span_hours,
-            "span_multiplier": payload.feature_toggles.balance_worked_hours_max_span_multiplier,
-            "average_shift_duration_minutes": context.average_shift_duration_minutes,
-        }
-    )
-
+    objective_term_refs.append(balance_term(instance, context, balance_excess_span_hours))
     return context
 
 
+def compute_balance_limits(instance: SolveInstance) -> tuple[int, int, float, int]:
+    """(total minute ture, limita superioara ore, durata medie tura, span permis in ore)."""
+    shift_durations = instance.shifts.durations
+    total_shift_minutes = sum(shift_durations)
+    max_hours_upper = max(1, (total_shift_minutes + 59) // 60)
+    average_shift_duration_minutes = total_shift_minutes / max(1, len(shift_durations))
+    allowed_span_hours = math.ceil(
+        (
+            average_shift_duration_minutes
+            * instance.feature_toggles.balance_worked_hours_max_span_multiplier
+        )
+        / 60
+    )
+    allowed_span_hours = min(allowed_span_hours, max_hours_upper)
+    return total_shift_minutes, max_hours_upper, average_shift_duration_minutes, allowed_span_hours
+
+
+def balance_term(instance: SolveInstance, context: BalanceContext, var: cp_model.IntVar | int) -> ObjectiveTerm:
+    feature_toggles = instance.feature_toggles
+    return {
+        "var": var,
+        "coefficient": -feature_toggles.balance_worked_hours_weight,
+        "source": "feature_toggle",
+        "constraint_type": "balance_worked_hours",
+        "employee_id": "all",
+        "employee_name": "All employees",
+        "weight": feature_toggles.balance_worked_hours_weight,
+        "allowed_span_hours": context.allowed_span_hours,
+        "span_multiplier": feature_toggles.balance_worked_hours_max_span_multiplier,
+        "average_shift_duration_minutes": context.average_shift_duration_minutes,
+    }
+
+
 def apply_objective(model: cp_model.CpModel, objective_term_refs: list[ObjectiveTerm]) -> None:
     if not objective_term_refs:
         return
-    model.maximize(sum(ref["coefficient"] * ref["var"] for ref in objective_term_refs))
+    model.maximize(
+        cp_model.LinearExpr.weighted_sum(
+            [ref["var"] for ref in objective_term_refs],
+            [ref["coefficient"] for ref in objective_term_refs],
+        )
+    )
 
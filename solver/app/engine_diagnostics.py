@@ -1,28 +1,24 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from datetime import date
+from collections import Counter, defaultdict
 import json
 
-from .engine_utils import (
-    build_minimal_qualifying_chain_by_left,
-    find_matching_shift_ids,
-    shift_duration_minutes,
-    shift_label,
-    shift_order_key,
-    shift_start_abs_minutes,
-    shift_to_meta,
-)
-from .models import SolverRequest
+from .engine_normalize import get_normalized_rules
+from .engine_skills import bits_mask, get_eligibility, iter_bits, qualified_employees
+from .engine_types import SolveInstance
+from .engine_utils import get_minimal_qualifying_chain_by_left, get_overlap_cliques, get_short_rest_pairs
+from .engine_workload import get_workload_calendar, mask_minutes, week_start_date
 
 
 def infer_infeasibility_reasons(
-    payload: SolverRequest,
+    instance: SolveInstance,
     num_employees: int,
     max_worktime_violating_windows: list[list[int]],
 ) -> list[dict]:
     reasons: list[dict] = []
-    employee_name_by_id = {employee.id: employee.name for employee in payload.employees}
+    shifts = instance.shifts
+    feature_toggles = instance.feature_toggles
+    employee_name_by_id = dict(zip(instance.employee_ids, instance.employee_names))
 
     def add_reason(code: str, message: str, **data) -> None:
         reasons.append(
@@ -33,20 +29,47 @@ def infer_infeasibility_reasons(
             }
         )
 
-    hard_require_by_shift = [set() for _ in payload.shifts]
-    hard_forbid_by_shift = [set() for _ in payload.shifts]
+    hard_require_by_shift = [set() for _ in range(len(shifts))]
+    hard_forbid_by_shift = [set() for _ in range(len(shifts))]
     hard_require_by_employee: dict[str, set[int]] = defaultdict(set)
+    eligibility = get_eligibility(instance)
+    employee_idx_by_id = {employee_id: idx for idx, employee_id in enumerate(instance.employee_ids)}
 
-    for hard in payload.constraints.hard:
-        matching_shift_ids = find_matching_shift_ids(payload.shifts, hard)
-        for shift_idx in matching_shift_ids:
+    for employee_idx, shift_idx in get_normalized_rules(instance).ineligible_required_cells:
+        employee_id = instance.employee_ids[employee_idx]
+        if instance.unavailable_shifts and instance.unavailable_shifts[employee_idx] >> shift_idx & 1:
+            add_reason(
+                "hard_required_employee_unavailable",
+                f"{employee_name_by_id.get(employee_id, employee_id)} is hard-required on {shifts.label(shift_idx)} "
+                "but is unavailable then.",
+                shift=shifts.meta(shift_idx),
+                employee_id=employee_id,
+            )
+            continue
+        employee_skills = instance.employee_skills[employee_idx] if instance.employee_skills else []
+        missing_skills = sorted(set(shifts.skills[shift_idx]) - set(employee_skills))
+        add_reason(
+            "hard_required_employee_missing_skills",
+            f"{employee_name_by_id.get(employee_id, employee_id)} is hard-required on {shifts.label(shift_idx)} "
+            f"but lacks skill(s) {', '.join(missing_skills)}.",
+            shift=shifts.meta(shift_idx),
+            employee_id=employee_id,
+            missing_skills=missing_skills,
+        )
+
+    for hard in instance.hard_rules:
+        employee_id = instance.employee_ids[hard.employee_idx]
+        for shift_idx in hard.shift_ids:
             if hard.type == "require_shift":
-                hard_require_by_shift[shift_idx].add(hard.employee_id)
-                hard_require_by_employee[hard.employee_id].add(shift_idx)
+                hard_require_by_shift[shift_idx].add(employee_id)
+                hard_require_by_employee[employee_id].add(shift_idx)
             elif hard.type == "forbid_shift":
-                hard_forbid_by_shift[shift_idx].add(hard.employee_id)
+                hard_forbid_by_shift[shift_idx].add(employee_id)
 
-    for shift_idx, shift in enumerate(payload.shifts):
+    for shift_idx in range(len(shifts)):
+        shift_required = shifts.required[shift_idx]
+        shift_label = shifts.label(shift_idx)
+        shift_meta = shifts.meta(shift_idx)
         required_ids = hard_require_by_shift[shift_idx]
         forbidden_ids = hard_forbid_by_shift[shift_idx]
         overlap = required_ids & forbidden_ids
@@ -56,36 +79,54 @@ def infer_infeasibility_reasons(
             )
             add_reason(
                 "hard_conflict_required_and_forbidden",
-                f"{shift_label(shift)}: same employee(s) are both required and forbidden ({overlap_names}).",
-                shift=shift_to_meta(shift),
+                f"{shift_label}: same employee(s) are both required and forbidden ({overlap_names}).",
+                shift=shift_meta,
                 employee_names=overlap_names,
             )
 
-        if len(required_ids) > shift.required:
+        if len(required_ids) > shift_required:
             add_reason(
                 "hard_required_exceeds_shift_coverage",
-                f"{shift_label(shift)}: {len(required_ids)} hard-required employee(s) exceed required coverage {shift.required}.",
-                shift=shift_to_meta(shift),
+                f"{shift_label}: {len(required_ids)} hard-required employee(s) exceed required coverage {shift_required}.",
+                shift=shift_meta,
                 hard_required_count=len(required_ids),
-                required_coverage=shift.required,
+                required_coverage=shift_required,
             )
 
-        allowed_employees = num_employees - len(forbidden_ids)
-        if shift.required > allowed_employees:
+        # Forbid-urile pe celule neeligibile nu mai scad o data aceiasi oameni.
+        eligible_mask = eligibility.eligible_employees[shift_idx]
+        forbidden_mask = 0
+        for employee_id in forbidden_ids:
+            forbidden_mask |= 1 << employee_idx_by_id[employee_id]
+        allowed_employees = (eligible_mask & ~forbidden_mask).bit_count()
+        if shift_required > allowed_employees:
             add_reason(
                 "coverage_exceeds_available_after_forbids",
-                f"{shift_label(shift)}: required coverage {shift.required} exceeds available employees {allowed_employees} after forbids.",
-                shift=shift_to_meta(shift),
-                required_coverage=shift.required,
+                f"{shift_label}: required coverage {shift_required} exceeds available employees {allowed_employees} after forbids"
+                + (" and skills/availability." if eligibility.restricted else "."),
+                shift=shift_meta,
+                required_coverage=shift_required,
                 available_employees=allowed_employees,
             )
 
-    if payload.feature_toggles.max_worktime_in_row_enabled:
+        for skill, count in shifts.skill_requirements[shift_idx].items():
+            qualified_count = (qualified_employees(instance, shift_idx, skill) & ~forbidden_mask).bit_count()
+            if count > qualified_count:
+                add_reason(
+                    "skill_coverage_exceeds_qualified",
+                    f"{shift_label}: needs {count} employee(s) with skill '{skill}', but only {qualified_count} are eligible after forbids.",
+                    shift=shift_meta,
+                    skill=skill,
+                    required_count=count,
+                    qualified_employees=qualified_count,
+                )
+
+    if feature_toggles.max_worktime_in_row_enabled:
         for window in max_worktime_violating_windows:
-            window_required = sum(payload.shifts[shift_idx].required for shift_idx in window)
+            window_required = sum(shifts.required[shift_idx] for shift_idx in window)
             window_capacity = num_employees * (len(window) - 1)
             if window_required > window_capacity:
-                window_preview = ", ".join(shift_label(payload.shifts[shift_idx]) for shift_idx in window[:3])
+                window_preview = ", ".join(shifts.label(shift_idx) for shift_idx in window[:3])
                 if len(window) > 3:
                     window_preview += f", ... ({len(window)} shifts)"
                 add_reason(
@@ -96,65 +137,142 @@ def infer_infeasibility_reasons(
                     allowed_assignments=window_capacity,
                 )
 
-            for employee in payload.employees:
+            for employee_id, employee_name in zip(instance.employee_ids, instance.employee_names):
                 required_count = sum(
-                    1 for shift_idx in window if shift_idx in hard_require_by_employee.get(employee.id, set())
+                    1 for shift_idx in window if shift_idx in hard_require_by_employee.get(employee_id, set())
                 )
                 if required_count > len(window) - 1:
-                    window_preview = ", ".join(
-                        shift_label(payload.shifts[shift_idx]) for shift_idx in window[:3]
-                    )
+                    window_preview = ", ".join(shifts.label(shift_idx) for shift_idx in window[:3])
                     if len(window) > 3:
                         window_preview += f", ... ({len(window)} shifts)"
                     add_reason(
                         "max_worktime_window_employee_overrequired",
-                        f"{employee.name} is hard-required on {required_count} shifts inside max-worktime window [{window_preview}], exceeding allowed {len(window) - 1}.",
-                        employee_id=employee.id,
-                        employee_name=employee.name,
+                        f"{employee_name} is hard-required on {required_count} shifts inside max-worktime window [{window_preview}], exceeding allowed {len(window) - 1}.",
+                        employee_id=employee_id,
+                        employee_name=employee_name,
                         hard_required_count=required_count,
                         allowed_assignments=len(window) - 1,
                         window_preview=window_preview,
                     )
 
+    if feature_toggles.no_double_booking_enabled:
+        employees_by_eligible_shifts = Counter(eligibility.eligible_shifts)
+        for clique in get_overlap_cliques(shifts):
+            # Fiecare angajat eligibil acopera cel mult o tura din grupul suprapus.
+            clique_mask = bits_mask(clique)
+            clique_required = sum(shifts.required[shift_idx] for shift_idx in clique)
+            clique_capacity = sum(
+                group_size
+                for eligible_shifts, group_size in employees_by_eligible_shifts.items()
+                if eligible_shifts & clique_mask
+            )
+            if clique_required > clique_capacity:
+                add_reason(
+                    "no_double_booking_capacity_conflict",
+                    f"Overlapping shifts {', '.join(shifts.label(shift_idx) for shift_idx in clique[:3])} need "
+                    f"{clique_required} assignments, but only {clique_capacity} employee(s) can cover them.",
+                    shifts=[shifts.meta(shift_idx) for shift_idx in clique],
+                    required_assignments=clique_required,
+                    allowed_assignments=clique_capacity,
+                )
+            for employee_id, required_shift_ids in hard_require_by_employee.items():
+                overlapping = [shift_idx for shift_idx in clique if shift_idx in required_shift_ids]
+                if len(overlapping) > 1:
+                    employee_name = employee_name_by_id.get(employee_id, employee_id)
+                    add_reason(
+                        "hard_required_overlapping_shifts",
+                        f"{employee_name} is hard-required on overlapping shifts "
+                        f"{' and '.join(shifts.label(shift_idx) for shift_idx in overlapping[:2])}.",
+                        employee_id=employee_id,
+                        employee_name=employee_name,
+                        shifts=[shifts.meta(shift_idx) for shift_idx in overlapping],
+                    )
+
+    # Limitele de volum: capacitatea unei zile / saptamani (fiecare angajat eligibil cel
+    # mult la limita) si require-urile unui singur angajat peste limita.
+    calendar = get_workload_calendar(shifts)
+    employees_by_eligible_shifts = Counter(eligibility.eligible_shifts)
+    if feature_toggles.max_shifts_per_day_enabled:
+        max_shifts_per_day = feature_toggles.max_shifts_per_day
+        for day, day_mask in calendar.day_masks.items():
+            day_date = shifts.dates[next(iter_bits(day_mask))]
+            day_required = sum(shifts.required[shift_idx] for shift_idx in iter_bits(day_mask))
+            day_capacity = sum(
+                group_size * min(max_shifts_per_day, (eligible_shifts & day_mask).bit_count())
+                for eligible_shifts, group_size in employees_by_eligible_shifts.items()
+            )
+            if day_required > day_capacity:
+                add_reason(
+                    "max_shifts_per_day_capacity_conflict",
+                    f"{day_date}: shifts need {day_required} assignments, but at most {max_shifts_per_day} shift(s) per employee per day allow {day_capacity}.",
+                    date=day_date,
+                    required_assignments=day_required,
+                    allowed_assignments=day_capacity,
+                )
+            for employee_id, required_shift_ids in hard_require_by_employee.items():
+                required_count = sum(1 for shift_idx in required_shift_ids if day_mask >> shift_idx & 1)
+                if required_count > max_shifts_per_day:
+                    employee_name = employee_name_by_id.get(employee_id, employee_id)
+                    add_reason(
+                        "max_shifts_per_day_employee_overrequired",
+                        f"{employee_name} is hard-required on {required_count} shifts on {day_date}, exceeding the maximum of {max_shifts_per_day} per day.",
+                        employee_id=employee_id,
+                        employee_name=employee_name,
+                        date=day_date,
+                        hard_required_count=required_count,
+                        max_shifts_per_day=max_shifts_per_day,
+                    )
+
+    if feature_toggles.max_hours_per_week_enabled:
+        max_week_minutes = feature_toggles.max_hours_per_week * 60
+        for week, week_mask in calendar.week_masks.items():
+            week_start = week_start_date(instance.horizon_start, week)
+            week_required_minutes = sum(
+                shifts.required[shift_idx] * shifts.durations[shift_idx] for shift_idx in iter_bits(week_mask)
+            )
+            week_capacity_minutes = sum(
+                group_size * min(max_week_minutes, mask_minutes(shifts, eligible_shifts & week_mask))
+                for eligible_shifts, group_size in employees_by_eligible_shifts.items()
+            )
+            if week_required_minutes > week_capacity_minutes:
+                add_reason(
+                    "max_hours_per_week_capacity_conflict",
+                    f"Week of {week_start}: shifts need {week_required_minutes / 60:.1f}h of work, but {feature_toggles.max_hours_per_week}h per employee allow {week_capacity_minutes / 60:.1f}h.",
+                    week_start=week_start,
+                    required_hours=round(week_required_minutes / 60, 1),
+                    allowed_hours=round(week_capacity_minutes / 60, 1),
+                )
+            for employee_id, required_shift_ids in hard_require_by_employee.items():
+                required_minutes = mask_minutes(shifts, week_mask & bits_mask(required_shift_ids))
+                if required_minutes > max_week_minutes:
+                    employee_name = employee_name_by_id.get(employee_id, employee_id)
+                    add_reason(
+                        "max_hours_per_week_employee_overrequired",
+                        f"{employee_name} is hard-required on {required_minutes / 60:.1f}h in the week of {week_start}, exceeding the maximum of {feature_toggles.max_hours_per_week}h.",
+                        employee_id=employee_id,
+                        employee_name=employee_name,
+                        week_start=week_start,
+                        hard_required_hours=round(required_minutes / 60, 1),
+                        max_hours_per_week=feature_toggles.max_hours_per_week,
+                    )
+
     # Motivatie:
     # Cand regula de repaus hard este activa, vrem un indiciu explicit daca
     # infezabilitatea vine din "require" care forteaza un lant + o tura urmatoare
     # cu pauza mai mica decat minimul configurat.
-    if payload.feature_toggles.min_rest_after_shift_hard_enabled:
-        min_rest_hard_hours = payload.feature_toggles.min_rest_after_shift_hard_hours
+    if feature_toggles.min_rest_after_shift_hard_enabled:
+        min_rest_hard_hours = feature_toggles.min_rest_after_shift_hard_hours
         min_rest_hard_minutes = min_rest_hard_hours * 60
-        max_chain_for_rest_minutes = payload.feature_toggles.max_worktime_in_row_hours * 60
-        horizon_start_ord = date.fromisoformat(payload.horizon.start).toordinal()
-        shift_durations = [shift_duration_minutes(shift) for shift in payload.shifts]
-        shift_start_abs = [
-            shift_start_abs_minutes(shift, horizon_start_ord) for shift in payload.shifts
-        ]
-        shift_end_abs = [start + duration for start, duration in zip(shift_start_abs, shift_durations)]
-        sorted_shift_indices = sorted(
-            range(len(payload.shifts)),
-            key=lambda idx: shift_order_key(payload.shifts[idx]),
-        )
+        max_chain_for_rest_minutes = feature_toggles.max_worktime_in_row_hours * 60
 
-        minimal_chain_by_left = build_minimal_qualifying_chain_by_left(
-            sorted_shift_indices=sorted_shift_indices,
-            shift_start_abs=shift_start_abs,
-            shift_end_abs=shift_end_abs,
-            shift_durations=shift_durations,
-            max_chain_minutes=max_chain_for_rest_minutes,
-        )
+        minimal_chain_by_left = get_minimal_qualifying_chain_by_left(shifts, max_chain_for_rest_minutes)
 
         short_rest_by_left: dict[int, list[tuple[int, int]]] = defaultdict(list)
-        for left_shift_idx in range(len(payload.shifts)):
-            left_end = shift_end_abs[left_shift_idx]
-            for right_shift_idx in range(len(payload.shifts)):
-                if left_shift_idx == right_shift_idx:
-                    continue
-                rest_minutes = shift_start_abs[right_shift_idx] - left_end
-                if 0 <= rest_minutes < min_rest_hard_minutes:
-                    short_rest_by_left[left_shift_idx].append((right_shift_idx, rest_minutes))
+        for left_shift_idx, right_shift_idx, rest_minutes in get_short_rest_pairs(shifts, min_rest_hard_minutes):
+            short_rest_by_left[left_shift_idx].append((right_shift_idx, rest_minutes))
 
-        for employee in payload.employees:
-            required_shift_ids = hard_require_by_employee.get(employee.id, set())
+        for employee_id, employee_name in zip(instance.employee_ids, instance.employee_names):
+            required_shift_ids = hard_require_by_employee.get(employee_id, set())
             if not required_shift_ids:
                 continue
 
@@ -169,15 +287,13 @@ def infer_infeasibility_reasons(
                 for right_shift_idx, rest_minutes in short_rest_targets:
                     if right_shift_idx not in required_shift_ids:
                         continue
-                    left_shift = payload.shifts[left_shift_idx]
-                    right_shift = payload.shifts[right_shift_idx]
                     add_reason(
                         "hard_min_rest_conflict_on_required_chain",
-                        f"{employee.name} is hard-required on {shift_label(left_shift)} and {shift_label(right_shift)} with only {rest_minutes / 60:.1f}h rest (< {min_rest_hard_hours}h hard minimum).",
-                        employee_id=employee.id,
-                        employee_name=employee.name,
-                        left_shift=shift_to_meta(left_shift),
-                        right_shift=shift_to_meta(right_shift),
+                        f"{employee_name} is hard-required on {shifts.label(left_shift_idx)} and {shifts.label(right_shift_idx)} with only {rest_minutes / 60:.1f}h rest (< {min_rest_hard_hours}h hard minimum).",
+                        employee_id=employee_id,
+                        employee_name=employee_name,
+                        left_shift=shifts.meta(left_shift_idx),
+                        right_shift=shifts.meta(right_shift_idx),
                         rest_hours=round(rest_minutes / 60, 1),
                         min_rest_hours=min_rest_hard_hours,
                     )
@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+import os
+import time
+
+from ortools.sat.python import cp_model
+
+from .engine_constraints import (
+    balance_term,
+    collect_enabled_feature_toggles,
+    compute_balance_limits,
+    min_rest_term,
+    short_rest_threshold_minutes,
+    user_soft_term,
+)
+from .engine_model import precheck_hard_conflicts
+from .engine_normalize import get_normalized_rules
+from .engine_results import build_feasible_response
+from .engine_skills import get_eligibility, iter_bits, qualified_employees
+from .engine_types import BalanceContext, GreedySchedule, ObjectiveTerm, SolveInstance
+from .engine_utils import (
+    get_max_worktime_violating_windows,
+    get_minimal_qualifying_chain_by_left,
+    get_short_rest_pairs,
+)
+from .engine_workload import DAYS_PER_WEEK, days_in_week, days_off_term, days_off_targets, get_workload_calendar
+from .logging_utils import log_event
+
+# Hint-ul greedy pentru CP-SAT este optional: pe instantele sintetice (40..300 angajati,
+# 28..31 zile) ancoreaza cautarea langa un optim local si scade obiectivul final.
+GREEDY_HINT_ENABLED = os.getenv("SOLVER_GREEDY_HINT", "0") == "1"
+
+class _GreedyState:
+    """Regulile hard indexate per tura si starea curenta (celule atribuite, minute lucrate)."""
+
+    def __init__(self, instance: SolveInstance) -> None:
+        shifts = instance.shifts
+        feature_toggles = instance.feature_toggles
+        num_shifts = instance.num_shifts
+        self.instance = instance
+        self.assigned: set[tuple[int, int]] = set()
+        self.worked_minutes = [0] * instance.num_employees
+        self.eligible_shifts = get_eligibility(instance).eligible_shifts
+        # Volumul per (angajat, zi) si (angajat, saptamana), pe calendarul regulilor de volum.
+        self.shift_days = get_workload_calendar(shifts).shift_days
+        self.day_shifts: dict[tuple[int, int], int] = {}
+        self.week_minutes: dict[tuple[int, int], int] = {}
+        self.week_worked_days: dict[tuple[int, int], set[int]] = {}
+
+        normalized = get_normalized_rules(instance)
+        self.forbidden: set[tuple[int, int]] = set(normalized.forbidden_cells)
+        self.soft_score: dict[tuple[int, int], int] = {
+            (soft_cell.employee_idx, soft_cell.shift_idx): soft_cell.coefficient for soft_cell in normalized.soft_cells
+        }
+
+        # Fara `no_double_booking` modelul permite suprapunerile; greedy-ul le evita oricum
+        # (tot fezabil pentru model).
+        self.overlapping: list[list[int]] = [[] for _ in range(num_shifts)]
+        sorted_indices = shifts.sorted_indices
+        for pos, shift_idx in enumerate(sorted_indices):
+            for other_idx in sorted_indices[pos + 1 :]:
+                if shifts.start_abs[other_idx] >= shifts.end_abs[shift_idx]:
+                    break
+                self.overlapping[shift_idx].append(other_idx)
+                self.overlapping[other_idx].append(shift_idx)
+
+        self.windows_by_shift: list[list[list[int]]] = [[] for _ in range(num_shifts)]
+        if feature_toggles.max_worktime_in_row_enabled:
+            max_worktime_minutes = feature_toggles.max_worktime_in_row_hours * 60
+            for window in get_max_worktime_violating_windows(shifts, max_worktime_minutes):
+                for shift_idx in window:
+                    self.windows_by_shift[shift_idx].append(window)
+
+        # Lanturile minime (capat "left") si perechile de rest scurt, indexate in ambele directii.
+        self.chain_by_left: dict[int, list[int]] = {}
+        self.lefts_by_chain_member: list[list[int]] = [[] for _ in range(num_shifts)]
+        self.hard_rights_by_left: dict[int, list[int]] = {}
+        self.hard_lefts_by_right: list[list[int]] = [[] for _ in range(num_shifts)]
+        self.soft_lefts_by_right: list[list[int]] = [[] for _ in range(num_shifts)]
+        hard_enabled = feature_toggles.min_rest_after_shift_hard_enabled
+        soft_enabled = feature_toggles.min_rest_after_shift_soft_enabled
+        if hard_enabled or soft_enabled:
+            max_chain_minutes = feature_toggles.max_worktime_in_row_hours * 60
+            self.chain_by_left = get_minimal_qualifying_chain_by_left(shifts, max_chain_minutes)
+            for left_shift_idx, chain in self.chain_by_left.items():
+                for shift_idx in chain:
+                    self.lefts_by_chain_member[shift_idx].append(left_shift_idx)
+            pairs = get_short_rest_pairs(shifts, short_rest_threshold_minutes(feature_toggles))
+            for left_shift_idx, right_shift_idx, rest_minutes in pairs:
+                if left_shift_idx not in self.chain_by_left:
+                    continue
+                if hard_enabled and rest_minutes < feature_toggles.min_rest_after_shift_hard_hours * 60:
+                    self.hard_rights_by_left.setdefault(left_shift_idx, []).append(right_shift_idx)
+                    self.hard_lefts_by_right[right_shift_idx].append(left_shift_idx)
+                if soft_enabled and rest_minutes < feature_toggles.min_rest_after_shift_soft_hours * 60:
+                    self.soft_lefts_by_right[right_shift_idx].append(left_shift_idx)
+
+    def _chain_complete(self, employee_idx: int, left_shift_idx: int, extra_shift_idx: int) -> bool:
+        return all(
+            shift_idx == extra_shift_idx or (employee_idx, shift_idx) in self.assigned
+            for shift_idx in self.chain_by_left[left_shift_idx]
+        )
+
+    def can_assign(self, employee_idx: int, shift_idx: int) -> bool:
+        assigned = self.assigned
+        if not self.eligible_shifts[employee_idx] >> shift_idx & 1:
+            return False
+        if (employee_idx, shift_idx) in self.forbidden or (employee_idx, shift_idx) in assigned:
+            return False
+        if any((employee_idx, other_idx) in assigned for other_idx in self.overlapping[shift_idx]):
+            return False
+        feature_toggles = self.instance.feature_toggles
+        day = self.shift_days[shift_idx]
+        if (
+            feature_toggles.max_shifts_per_day_enabled
+            and self.day_shifts.get((employee_idx, day), 0) >= feature_toggles.max_shifts_per_day
+        ):
+            return False
+        if feature_toggles.max_hours_per_week_enabled and (
+            self.week_minutes.get((employee_idx, day // DAYS_PER_WEEK), 0) + self.instance.shifts.durations[shift_idx]
+            > feature_toggles.max_hours_per_week * 60
+        ):
+            return False
+        for window in self.windows_by_shift[shift_idx]:
+            if all(other_idx == shift_idx or (employee_idx, other_idx) in assigned for other_idx in window):
+                return False
+        # Hard rest: tura este "right" dupa un lant complet...
+        for left_shift_idx in self.hard_lefts_by_right[shift_idx]:
+            if self._chain_complete(employee_idx, left_shift_idx, shift_idx):
+                return False
+        # ...sau completeaza un lant dupa care exista deja o tura prea apropiata.
+        for left_shift_idx in self.lefts_by_chain_member[shift_idx]:
+            rights = self.hard_rights_by_left.get(left_shift_idx)
+            if not rights or not self._chain_complete(employee_idx, left_shift_idx, shift_idx):
+                continue
+            if any((employee_idx, right_shift_idx) in assigned for right_shift_idx in rights):
+                return False
+        return True
+
+    def score(self, employee_idx: int, shift_idx: int) -> int:
+        score = self.soft_score.get((employee_idx, shift_idx), 0)
+        soft_lefts = self.soft_lefts_by_right[shift_idx]
+        if soft_lefts:
+            weight = self.instance.feature_toggles.min_rest_after_shift_soft_weight
+            for left_shift_idx in soft_lefts:
+                if self._chain_complete(employee_idx, left_shift_idx, shift_idx):
+                    score -= weight
+        feature_toggles = self.instance.feature_toggles
+        if feature_toggles.min_days_off_per_week_enabled:
+            # O zi lucrata in plus, intr-o saptamana fara zile libere de rezerva.
+            day = self.shift_days[shift_idx]
+            week = day // DAYS_PER_WEEK
+            worked_days = self.week_worked_days.get((employee_idx, week), set())
+            allowed_worked_days = days_in_week(self.instance.horizon_days, week) - feature_toggles.min_days_off_per_week
+            if day not in worked_days and len(worked_days) >= allowed_worked_days:
+                score -= feature_toggles.min_days_off_per_week_weight
+        return score
+
+    def assign(self, employee_idx: int, shift_idx: int) -> None:
+        self.assigned.add((employee_idx, shift_idx))
+        duration = self.instance.shifts.durations[shift_idx]
+        self.worked_minutes[employee_idx] += duration
+        day = self.shift_days[shift_idx]
+        week_key = (employee_idx, day // DAYS_PER_WEEK)
+        self.day_shifts[(employee_idx, day)] = self.day_shifts.get((employee_idx, day), 0) + 1
+        self.week_minutes[week_key] = self.week_minutes.get(week_key, 0) + duration
+        self.week_worked_days.setdefault(week_key, set()).add(day)
+
+
+def build_greedy_schedule(instance: SolveInstance) -> GreedySchedule:
+    # Motivatie:
+    # Un orar utilizabil in milisecunde: preview rapid in UI, hint pentru CP-SAT
+    # si rezerva cand CP-SAT nu gaseste nicio solutie in timp. Turele sunt
+    # parcurse cronologic; pe fiecare alegem angajatii eligibili (cu skill-urile
+    # turei, fara forbid, suprapuneri, ferestre max-worktime, rest hard incalcat sau
+    # limite de ture pe zi / ore pe saptamana depasite)
+    # dupa preferinte, apoi dupa cele mai putine minute lucrate. Minimele per skill
+    # (`skill_requirements`) se ocupa primele, din angajatii care au skill-ul.
+    started_at = time.perf_counter()
+    shifts = instance.shifts
+    state = _GreedyState(instance)
+    conflicts: list[dict] = []
+
+    # Require-urile sunt fixate primele, ca alegerile greedy sa le tina cont.
+    for employee_idx, shift_idx in get_normalized_rules(instance).required_cells:
+        if (employee_idx, shift_idx) in state.assigned:
+            continue
+        if not state.can_assign(employee_idx, shift_idx):
+            conflicts.append(
+                {
+                    "employee_id": instance.employee_ids[employee_idx],
+                    "shift": shifts.meta(shift_idx),
+                }
+            )
+            continue
+        state.assign(employee_idx, shift_idx)
+
+    assigned_count = [0] * instance.num_shifts
+    for employee_idx, shift_idx in state.assigned:
+        assigned_count[shift_idx] += 1
+
+    eligible_employees = get_eligibility(instance).eligible_employees
+    uncovered: list[tuple[int, int]] = []
+    for shift_idx in shifts.sorted_indices:
+        missing = shifts.required[shift_idx] - assigned_count[shift_idx]
+        if missing < 0:
+            conflicts.append({"shift": shifts.meta(shift_idx), "over_required": -missing})
+            continue
+        if missing == 0 and not shifts.skill_requirements[shift_idx]:
+            continue
+        candidates = sorted(
+            iter_bits(eligible_employees[shift_idx]),
+            key=lambda employee_idx: (
+                -state.score(employee_idx, shift_idx),
+                state.worked_minutes[employee_idx],
+                employee_idx,
+            ),
+        )
+        for skill, count in shifts.skill_requirements[shift_idx].items():
+            qualified = qualified_employees(instance, shift_idx, skill)
+            skill_missing = count - sum(
+                1 for employee_idx in iter_bits(qualified) if (employee_idx, shift_idx) in state.assigned
+            )
+            for employee_idx in candidates:
+                if skill_missing <= 0 or missing == 0:
+                    break
+                if qualified >> employee_idx & 1 and state.can_assign(employee_idx, shift_idx):
+                    state.assign(employee_idx, shift_idx)
+                    missing -= 1
+                    skill_missing -= 1
+            if skill_missing > 0:
+                conflicts.append({"shift": shifts.meta(shift_idx), "skill": skill, "missing": skill_missing})
+        for employee_idx in candidates:
+            if missing == 0:
+                break
+            if state.can_assign(employee_idx, shift_idx):
+                state.assign(employee_idx, shift_idx)
+                missing -= 1
+        if missing:
+            uncovered.append((shift_idx, missing))
+
+    values = {
+        (employee_idx, shift_idx): int((employee_idx, shift_idx) in state.assigned)
+        for employee_idx in range(instance.num_employees)
+        for shift_idx in range(instance.num_shifts)
+    }
+    return GreedySchedule(
+        values=values,
+        uncovered=uncovered,
+        conflicts=conflicts,
+        elapsed_us=int((time.perf_counter() - started_at) * 1_000_000),
+    )
+
+
+def evaluate_objective_terms(
+    instance: SolveInstance,
+    values: dict[tuple[int, int], int],
+) -> tuple[list[ObjectiveTerm], BalanceContext]:
+    """Termenii obiectivului pentru o solutie data, in acelasi format ca modelul CP-SAT (cu valori)."""
+    feature_toggles = instance.feature_toggles
+    shifts = instance.shifts
+    objective_term_refs: list[ObjectiveTerm] = []
+
+    for soft_cell in get_normalized_rules(instance).soft_cells:
+        objective_term_refs.append(
+            user_soft_term(instance, soft_cell, values[(soft_cell.employee_idx, soft_cell.shift_idx)])
+        )
+
+    if feature_toggles.min_rest_after_shift_soft_enabled:
+        max_chain_minutes = feature_toggles.max_worktime_in_row_hours * 60
+        min_soft_rest_minutes = feature_toggles.min_rest_after_shift_soft_hours * 60
+        minimal_chain_by_left = get_minimal_qualifying_chain_by_left(shifts, max_chain_minutes)
+        soft_pairs = [
+            pair
+            for pair in get_short_rest_pairs(shifts, short_rest_threshold_minutes(feature_toggles))
+            if pair[2] < min_soft_rest_minutes and pair[0] in minimal_chain_by_left
+        ]
+        for employee_idx in range(instance.num_employees):
+            reached_by_left: dict[int, bool] = {}
+            for left_shift_idx, right_shift_idx, rest_minutes in soft_pairs:
+                reached = reached_by_left.get(left_shift_idx)
+                if reached is None:
+                    reached = all(
+                        values[(employee_idx, shift_idx)] for shift_idx in minimal_chain_by_left[left_shift_idx]
+                    )
+                    reached_by_left[left_shift_idx] = reached
+                value = int(reached and values[(employee_idx, right_shift_idx)] == 1)
+                objective_term_refs.append(
+                    min_rest_term(instance, employee_idx, left_shift_idx, right_shift_idx, rest_minutes, value)
+                )
+
+    if feature_toggles.min_days_off_per_week_enabled:
+        shift_days = get_workload_calendar(shifts).shift_days
+        eligible_shifts = get_eligibility(instance).eligible_shifts
+        for employee_idx in range(instance.num_employees):
+            worked_days = {
+                shift_days[shift_idx]
+                for shift_idx in iter_bits(eligible_shifts[employee_idx])
+                if values[(employee_idx, shift_idx)]
+            }
+            for week, required, workable_days in days_off_targets(instance, eligible_shifts[employee_idx]):
+                days_off = days_in_week(instance.horizon_days, week) - len(worked_days.intersection(workable_days))
+                objective_term_refs.append(
+                    days_off_term(instance, employee_idx, week, required, workable_days, max(0, required - days_off))
+                )
+
+    context = BalanceContext()
+    if feature_toggles.balance_worked_hours:
+        _, _, context.average_shift_duration_minutes, context.allowed_span_hours = compute_balance_limits(instance)
+        worked_minutes = [0] * instance.num_employees
+        for (employee_idx, shift_idx), value in values.items():
+            if value:
+                worked_minutes[employee_idx] += shifts.durations[shift_idx]
+        worked_hours = [minutes // 60 for minutes in worked_minutes]
+        context.min_hours_var = min(worked_hours, default=0)
+        context.max_hours_var = max(worked_hours, default=0)
+        context.hours_span_var = context.max_hours_var - context.min_hours_var
+        excess_hours = max(0, context.hours_span_var - context.allowed_span_hours)
+        objective_term_refs.append(balance_term(instance, context, excess_hours))
+
+    return objective_term_refs, context
+
+
+def greedy_fallback_reason(
+    instance: SolveInstance,
+    greedy: GreedySchedule | None,
+    status: int,
+    objective: float | None,
+) -> str | None:
+    """
+    Motivul pentru care raspunsul ar trebui sa fie solutia greedy in locul celei CP-SAT
+    (None daca CP-SAT ramane raspunsul). Pe modele mari, cu putin timp, CP-SAT poate
+    intoarce o solutie mai slaba decat hint-ul greedy, inainte sa ajunga sa-l foloseasca.
+    """
+    if greedy is None or not greedy.complete:
+        return None
+    if status == cp_model.UNKNOWN:
+        return "cp_sat_timeout"
+    if status == cp_model.FEASIBLE and objective is not None:
+        objective_term_refs, _ = evaluate_objective_terms(instance, greedy.values)
+        if sum(ref["coefficient"] * ref["var"] for ref in objective_term_refs) > objective:
+            return "greedy_better_than_cp_sat"
+    return None
+
+
+class _KnownValues:
+    """Interfata minimala de `CpSolver` (value / objective_value) peste valori deja cunoscute."""
+
+    def __init__(self, objective_value: int) -> None:
+        self.objective_value = objective_value
+
+    def value(self, expression: int) -> int:
+        return int(expression)
+
+
+def build_heuristic_response(
+    instance: SolveInstance,
+    greedy: GreedySchedule,
+    reason: str,
+    logger,
+    request_id: str,
+    started_at: float,
+) -> dict:
+    objective_term_refs, balance_context = evaluate_objective_terms(instance, greedy.values)
+    objective = sum(ref["coefficient"] * ref["var"] for ref in objective_term_refs)
+    enabled_feature_toggles = collect_enabled_feature_toggles(instance.feature_toggles)
+    warnings = list(instance.warnings)
+    response, total_assigned_slots = build_feasible_response(
+        instance=instance,
+        solver=_KnownValues(objective),
+        assign=greedy.values,
+        status=cp_model.FEASIBLE,
+        warnings=warnings,
+        enabled_feature_toggles=enabled_feature_toggles,
+        objective_term_refs=objective_term_refs,
+        balance_context=balance_context,
+    )
+    response["status"] = "heuristic"
+    response["heuristic"] = {
+        "reason": reason,
+        "complete": greedy.complete,
+        "uncovered": [
+            {**instance.shifts.meta(shift_idx), "required": instance.shifts.required[shift_idx], "missing": missing}
+            for shift_idx, missing in greedy.uncovered
+        ],
+        "conflicts": greedy.conflicts,
+        "elapsed_us": greedy.elapsed_us,
+    }
+
+    elapsed_ms = (time.perf_counter() - started_at) * 1000.0
+    log_event(
+        logger,
+        "INFO",
+        "solve.request.done",
+        request_id=request_id,
+        status="heuristic",
+        reason=reason,
+        complete=greedy.complete,
+        elapsed_us=int(elapsed_ms * 1000),
+        objective=response["objective"],
+        assigned_slots=total_assigned_slots,
+        warnings=len(warnings),
+        feature_toggles=enabled_feature_toggles,
+    )
+    return response
+
+
+def solve_instance_quick(instance: SolveInstance, logger, request_id: str, started_at: float) -> dict:
+    # Mod "quick": doar constructia greedy, fara model CP-SAT. Conflictele hard evidente
+    # (celula ceruta si interzisa, eligibilitate insuficienta) raman infezabile, ca la CP-SAT.
+    precheck_response = precheck_hard_conflicts(instance, logger, request_id, started_at)
+    if precheck_response is not None:
+        return precheck_response
+    greedy = build_greedy_schedule(instance)
+    return build_heuristic_response(instance, greedy, "quick_mode", logger, request_id, started_at)
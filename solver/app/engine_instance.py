@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+from fastapi import HTTPException
+
+from .engine_availability import resolve_availability
+from .engine_types import ResolvedRule, ShiftTable, SolveInstance
+from .engine_utils import MINUTES_PER_DAY, WEEKDAY_LABELS, find_matching_shift_ids, parse_minutes
+from .logging_utils import log_event
+from .models import ColumnarSolverRequest, SolverRequest, TemplateSlot
+
+
+def duration_from_minutes(start_minute: int, end_minute: int) -> int:
+    if end_minute > start_minute:
+        return end_minute - start_minute
+    if end_minute < start_minute:
+        return end_minute + MINUTES_PER_DAY - start_minute
+    return MINUTES_PER_DAY
+
+
+def build_shift_table_from_request(payload: SolverRequest) -> ShiftTable:
+    # Motivatie:
+    # Parsam o singura data fiecare `date` / `HH:MM`; restul engine-ului
+    # lucreaza doar cu minute absolute si nu mai re-parseaza string-uri.
+    horizon_start_ord = date.fromisoformat(payload.horizon.start).toordinal()
+    day_offset_by_date: dict[str, int] = {}
+    minutes_by_text: dict[str, int] = {}
+
+    def minutes_of(value: str) -> int:
+        cached = minutes_by_text.get(value)
+        if cached is None:
+            cached = parse_minutes(value)
+            minutes_by_text[value] = cached
+        return cached
+
+    start_minutes: list[int] = []
+    end_minutes: list[int] = []
+    start_abs: list[int] = []
+    durations: list[int] = []
+    for shift in payload.shifts:
+        day_offset = day_offset_by_date.get(shift.date)
+        if day_offset is None:
+            day_offset = date.fromisoformat(shift.date).toordinal() - horizon_start_ord
+            day_offset_by_date[shift.date] = day_offset
+        start_minute = minutes_of(shift.start)
+        end_minute = minutes_of(shift.end)
+        start_minutes.append(start_minute)
+        end_minutes.append(end_minute)
+        start_abs.append(day_offset * MINUTES_PER_DAY + start_minute)
+        durations.append(duration_from_minutes(start_minute, end_minute))
+
+    return ShiftTable(
+        days=[shift.day for shift in payload.shifts],
+        dates=[shift.date for shift in payload.shifts],
+        types=[shift.type for shift in payload.shifts],
+        start_minutes=start_minutes,
+        end_minutes=end_minutes,
+        required=[shift.required for shift in payload.shifts],
+        start_abs=start_abs,
+        end_abs=[start + duration for start, duration in zip(start_abs, durations)],
+        durations=durations,
+        slots=[shift.slot for shift in payload.shifts],
+        skills=[tuple(sorted(set(shift.skills))) for shift in payload.shifts],
+        skill_requirements=[dict(shift.skill_requirements) for shift in payload.shifts],
+    )
+
+
+def build_shift_table_from_template(payload: SolverRequest) -> ShiftTable:
+    # Motivatie:
+    # Pentru orizonturi lunare, majoritatea turelor sunt repetitii ale template-ului
+    # saptamanal. Pre-calculam o singura data per zi-template (minute, durata,
+    # ordine cronologica), apoi doar "copiem" pe fiecare zi din orizont.
+    template = payload.shift_template
+    horizon_start = date.fromisoformat(payload.horizon.start)
+
+    def prepare_day(slots: list[TemplateSlot]) -> list[tuple[TemplateSlot, int, int, int, tuple[str, ...]]]:
+        prepared = []
+        for slot in slots:
+            start_minute = parse_minutes(slot.start)
+            end_minute = parse_minutes(slot.end)
+            prepared.append(
+                (
+                    slot,
+                    start_minute,
+                    end_minute,
+                    duration_from_minutes(start_minute, end_minute),
+                    tuple(sorted(set(slot.skills))),
+                )
+            )
+        # Ordinea cronologica in zi => tabelul rezultat este deja sortat dupa (start_abs, type).
+        prepared.sort(key=lambda item: (item[1], item[0].type))
+        return prepared
+
+    prepared_weekly = {day_label: prepare_day(slots) for day_label, slots in template.weekly.items()}
+    prepared_overrides = {iso: prepare_day(slots) for iso, slots in template.overrides.items()}
+
+    table = ShiftTable(
+        days=[],
+        dates=[],
+        types=[],
+        start_minutes=[],
+        end_minutes=[],
+        required=[],
+        start_abs=[],
+        end_abs=[],
+        durations=[],
+    )
+    for day_offset in range(payload.horizon.days):
+        current = horizon_start + timedelta(days=day_offset)
+        iso = current.isoformat()
+        day_label = WEEKDAY_LABELS[current.weekday()]
+        if iso in prepared_overrides:
+            prepared_day = prepared_overrides[iso]
+        else:
+            prepared_day = prepared_weekly.get(day_label, [])
+        day_start_abs = day_offset * MINUTES_PER_DAY
+        for slot, start_minute, end_minute, duration, skills in prepared_day:
+            table.sorted_indices.append(len(table.start_abs))
+            table.days.append(day_label)
+            table.dates.append(iso)
+            table.types.append(slot.type)
+            table.start_minutes.append(start_minute)
+            table.end_minutes.append(end_minute)
+            table.required.append(slot.required)
+            table.start_abs.append(day_start_abs + start_minute)
+            table.end_abs.append(day_start_abs + start_minute + duration)
+            table.durations.append(duration)
+            table.slots.append(slot.slot)
+            table.skills.append(skills)
+            table.skill_requirements.append(slot.skill_requirements)
+    return table
+
+
+def build_shift_table_from_columnar(payload: ColumnarSolverRequest) -> ShiftTable:
+    columns = payload.shifts
+    horizon_start = date.fromisoformat(payload.horizon.start)
+    labels_by_offset: dict[int, tuple[str, str]] = {}
+    for day_offset in set(columns.day_offsets):
+        current = horizon_start + timedelta(days=day_offset)
+        labels_by_offset[day_offset] = (WEEKDAY_LABELS[current.weekday()], current.isoformat())
+
+    durations = [
+        duration_from_minutes(start_minute, end_minute)
+        for start_minute, end_minute in zip(columns.start_minutes, columns.end_minutes)
+    ]
+    start_abs = [
+        day_offset * MINUTES_PER_DAY + start_minute
+        for day_offset, start_minute in zip(columns.day_offsets, columns.start_minutes)
+    ]
+    return ShiftTable(
+        days=[labels_by_offset[day_offset][0] for day_offset in columns.day_offsets],
+        dates=[labels_by_offset[day_offset][1] for day_offset in columns.day_offsets],
+        types=list(columns.types),
+        start_minutes=list(columns.start_minutes),
+        end_minutes=list(columns.end_minutes),
+        required=list(columns.required),
+        start_abs=start_abs,
+        end_abs=[start + duration for start, duration in zip(start_abs, durations)],
+        durations=durations,
+        skills=[tuple(sorted(set(skills))) for skills in columns.skills],
+        skill_requirements=[dict(requirements) for requirements in columns.skill_requirements],
+    )
+
+
+def resolve_request_rules(
+    shifts: ShiftTable,
+    rules: list,
+    kind: str,
+    employee_idx_by_id: dict[str, int],
+    warnings: list[dict],
+    logger,
+    request_id: str,
+) -> list[ResolvedRule]:
+    resolved: list[ResolvedRule] = []
+    for rule_idx, rule in enumerate(rules):
+        employee_idx = employee_idx_by_id.get(rule.employee_id)
+        if employee_idx is None:
+            log_event(
+                logger,
+                "WARN",
+                "solve.request.rejected",
+                request_id=request_id,
+                reason=f"{kind}_constraint_unknown_employee",
+                employee_id=rule.employee_id,
+            )
+            raise HTTPException(
+                status_code=422,
+                detail=f"{kind.capitalize()} constraint references unknown employee_id '{rule.employee_id}'.",
+            )
+
+        matching_shift_ids = find_matching_shift_ids(shifts, rule)
+        if not matching_shift_ids:
+            warnings.append(
+                {
+                    "code": f"no_matching_shift_for_{kind}_constraint",
+                    "constraint_type": rule.type,
+                    "employee_id": rule.employee_id,
+                }
+            )
+            continue
+
+        resolved.append(
+            ResolvedRule(
+                type=rule.type,
+                employee_idx=employee_idx,
+                shift_ids=matching_shift_ids,
+                weight=getattr(rule, "weight", 0),
+                source_idx=rule_idx,
+            )
+        )
+    return resolved
+
+
+def build_instance_from_request(payload: SolverRequest, logger, request_id: str) -> SolveInstance:
+    """Convertorul formatului JSON clasic (un obiect per shift/regula) catre SolveInstance."""
+    employee_idx_by_id = {employee.id: idx for idx, employee in enumerate(payload.employees)}
+    if payload.shift_template is not None:
+        shifts = build_shift_table_from_template(payload)
+    else:
+        shifts = build_shift_table_from_request(payload)
+    warnings: list[dict] = []
+    if payload.shift_template is not None:
+        horizon_start = date.fromisoformat(payload.horizon.start)
+        horizon_end = horizon_start + timedelta(days=payload.horizon.days)
+        for override_date in sorted(payload.shift_template.overrides):
+            if not horizon_start <= date.fromisoformat(override_date) < horizon_end:
+                warnings.append({"code": "template_override_outside_horizon", "date": override_date})
+    hard_rules = resolve_request_rules(
+        shifts, payload.constraints.hard, "hard", employee_idx_by_id, warnings, logger, request_id
+    )
+    soft_rules = resolve_request_rules(
+        shifts, payload.constraints.soft, "soft", employee_idx_by_id, warnings, logger, request_id
+    )
+    unavailable_shifts = resolve_availability(payload, shifts, employee_idx_by_id, warnings, logger, request_id)
+    return SolveInstance(
+        horizon_start=payload.horizon.start,
+        horizon_days=payload.horizon.days,
+        employee_ids=[employee.id for employee in payload.employees],
+        employee_names=[employee.name for employee in payload.employees],
+        shifts=shifts,
+        hard_rules=hard_rules,
+        soft_rules=soft_rules,
+        feature_toggles=payload.feature_toggles,
+        warnings=warnings,
+        formulation=payload.formulation,
+        solve_profile=payload.solve_profile,
+        employee_skills=[employee.skills for employee in payload.employees],
+        unavailable_shifts=unavailable_shifts,
+    )
+
+
+def build_instance_from_columnar(payload: ColumnarSolverRequest) -> SolveInstance:
+    # Regulile columnare refera direct indici deja validati in bloc,
+    # deci nu mai trecem prin matching day/date/shift_type.
+    return SolveInstance(
+        horizon_start=payload.horizon.start,
+        horizon_days=payload.horizon.days,
+        employee_ids=list(payload.employees.ids),
+        employee_names=list(payload.employees.names),
+        shifts=build_shift_table_from_columnar(payload),
+        hard_rules=[
+            ResolvedRule(type=rule_type, employee_idx=employee_idx, shift_ids=[shift_idx])
+            for rule_type, employee_idx, shift_idx in payload.constraints.hard
+        ],
+        soft_rules=[
+            ResolvedRule(
+                type=rule_type,
+                employee_idx=employee_idx,
+                shift_ids=[shift_idx],
+                weight=weight,
+                source_idx=rule_idx,
+            )
+            for rule_idx, (rule_type, employee_idx, shift_idx, weight) in enumerate(payload.constraints.soft)
+        ],
+        feature_toggles=payload.feature_toggles,
+        formulation=payload.formulation,
+        solve_profile=payload.solve_profile,
+        employee_skills=list(payload.employees.skills),
+    )
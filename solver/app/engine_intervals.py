@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from ortools.sat.python import cp_model
+
+from .engine_constraints import (
+    chain_reached_literal,
+    min_rest_term,
+    short_rest_literal,
+    short_rest_threshold_minutes,
+)
+from .engine_proto import ProtoConstraintWriter, negated
+from .engine_skills import filter_eligible, get_eligibility, group_masks, iter_bits
+from .engine_types import AssignIndex, AssignVars, ObjectiveTerm, SolveInstance
+from .engine_utils import (
+    get_max_worktime_violating_windows,
+    get_minimal_qualifying_chain_by_left,
+    get_overlap_cliques,
+    get_short_rest_pairs,
+)
+
+
+def interval_formulation_applicable(instance: SolveInstance) -> bool:
+    """
+    True cand `NoOverlap`-ul per angajat nu schimba problema fata de "pairwise": regula
+    `no_double_booking` este activa sau nicio pereche de ture nu se suprapune.
+
+    Altfel "interval" ar interzice dubla programare (si turele care incep inainte de
+    sfarsitul unui lant si intra in pauza lui), deci revine la "pairwise", ca automatul
+    prea mare. Formularea alege doar codificarea, nu ce orare sunt valide.
+    """
+    return instance.feature_toggles.no_double_booking_enabled or not get_overlap_cliques(instance.shifts)
+
+
+def apply_interval_sequence_constraints(
+    instance: SolveInstance,
+    model: cp_model.CpModel,
+    writer: ProtoConstraintWriter,
+    assign: AssignVars,
+    assign_index: AssignIndex,
+    num_employees: int,
+    objective_term_refs: list[ObjectiveTerm],
+) -> list[list[int]]:
+    """
+    Formularea "interval": inlocuieste `apply_max_worktime_constraints` si
+    `apply_min_rest_constraints` cu intervale optionale per angajat.
+
+    - fiecare (angajat, tura) are un interval [start, end) prezent daca `assign` = 1;
+    - un `NoOverlap` per angajat: dubla programare este interzisa (`no_double_booking`)
+      sau imposibila (nicio tura suprapusa, vezi `interval_formulation_applicable`);
+    - restul hard devine un interval [end_left, end_left + rest) prezent cand lantul
+      care se termina in `left` a atins pragul; orice tura care ar incepe in pauza
+      se suprapune cu el, deci nu mai avem cate o restrictie per pereche (left, right);
+    - ferestrele max-worktime si lanturile sunt clauze pe aceleasi literale;
+    - celulele neeligibile (skill-uri) nu au interval, iar ferestrele / lanturile
+      care le ating sunt omise pentru angajatul respectiv.
+    """
+    shifts = instance.shifts
+    feature_toggles = instance.feature_toggles
+    max_chain_minutes = feature_toggles.max_worktime_in_row_hours * 60
+    hard_enabled = feature_toggles.min_rest_after_shift_hard_enabled
+    soft_enabled = feature_toggles.min_rest_after_shift_soft_enabled
+    min_hard_rest_minutes = feature_toggles.min_rest_after_shift_hard_hours * 60
+    min_soft_rest_minutes = feature_toggles.min_rest_after_shift_soft_hours * 60
+
+    violating_windows: list[list[int]] = []
+    if feature_toggles.max_worktime_in_row_enabled:
+        violating_windows = get_max_worktime_violating_windows(shifts, max_chain_minutes)
+
+    minimal_chain_by_left: dict[int, list[int]] = {}
+    hard_rest_lefts: list[int] = []
+    soft_short_rest_pairs: list[tuple[int, int, int]] = []
+    if hard_enabled or soft_enabled:
+        minimal_chain_by_left = get_minimal_qualifying_chain_by_left(shifts, max_chain_minutes)
+        hard_rest_left_set: set[int] = set()
+        for left_shift_idx, right_shift_idx, rest_minutes in get_short_rest_pairs(
+            shifts, short_rest_threshold_minutes(feature_toggles)
+        ):
+            if left_shift_idx not in minimal_chain_by_left:
+                continue
+            if hard_enabled and rest_minutes < min_hard_rest_minutes:
+                hard_rest_left_set.add(left_shift_idx)
+            if soft_enabled and rest_minutes < min_soft_rest_minutes:
+                soft_short_rest_pairs.append((left_shift_idx, right_shift_idx, rest_minutes))
+        hard_rest_lefts = sorted(hard_rest_left_set)
+    used_lefts = sorted(set(hard_rest_lefts) | {pair[0] for pair in soft_short_rest_pairs})
+
+    eligibility = get_eligibility(instance)
+    window_masks = chain_masks = None
+    if eligibility.restricted:
+        window_masks = group_masks(violating_windows)
+        chain_masks = group_masks([minimal_chain_by_left[left_shift_idx] for left_shift_idx in used_lefts])
+
+    for employee_idx in range(num_employees):
+        employee_literals = assign_index[employee_idx]
+        eligible_shifts = eligibility.eligible_shifts[employee_idx]
+        intervals = [
+            model.new_optional_fixed_size_interval_var(
+                shifts.start_abs[shift_idx],
+                shifts.durations[shift_idx],
+                assign[(employee_idx, shift_idx)],
+                f"shift_e{employee_idx}_s{shift_idx}",
+            )
+            for shift_idx in iter_bits(eligible_shifts)
+        ]
+
+        for window in filter_eligible(violating_windows, window_masks, eligible_shifts):
+            writer.add_bool_or([negated(employee_literals[shift_idx]) for shift_idx in window])
+
+        reached_max_chain_by_left = {
+            left_shift_idx: chain_reached_literal(
+                model, writer, employee_literals, employee_idx, left_shift_idx, minimal_chain_by_left[left_shift_idx]
+            )
+            for left_shift_idx in filter_eligible(used_lefts, chain_masks, eligible_shifts)
+        }
+
+        for left_shift_idx in hard_rest_lefts:
+            if left_shift_idx not in reached_max_chain_by_left:
+                continue
+            intervals.append(
+                model.new_optional_fixed_size_interval_var(
+                    shifts.end_abs[left_shift_idx],
+                    min_hard_rest_minutes,
+                    model.get_bool_var_from_proto_index(reached_max_chain_by_left[left_shift_idx]),
+                    f"rest_e{employee_idx}_left{left_shift_idx}",
+                )
+            )
+        model.add_no_overlap(intervals)
+
+        for left_shift_idx, right_shift_idx, rest_minutes in soft_short_rest_pairs:
+            if left_shift_idx not in reached_max_chain_by_left or not eligible_shifts >> right_shift_idx & 1:
+                continue
+            short_rest_after_max_chain = short_rest_literal(
+                model,
+                writer,
+                reached_max_chain_by_left[left_shift_idx],
+                employee_literals[right_shift_idx],
+                f"short_rest_after_max_e{employee_idx}_s{left_shift_idx}_s{right_shift_idx}",
+            )
+            objective_term_refs.append(
+                min_rest_term(
+                    instance, employee_idx, left_shift_idx, right_shift_idx, rest_minutes, short_rest_after_max_chain
+                )
+            )
+
+    return violating_windows
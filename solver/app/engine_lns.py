@@ -0,0 +1,447 @@
+from __future__ import annotations
+
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ortools.sat.python import cp_model
+
+from .capture_utils import record_capture_model
+from .engine_admission import apply_admission, reserved_memory
+from .engine_budget import SOLVE_PROFILES, build_search_summary, configure_search, relative_gap, search_time_limit
+from .engine_cancel import cancellable_search, is_cancelled
+from .engine_greedy import GREEDY_HINT_ENABLED, build_greedy_schedule, build_heuristic_response
+from .engine_model import build_model, build_solve_response, log_solve_start, precheck_hard_conflicts
+from .engine_skills import get_eligibility
+from .engine_types import BuiltModel, SolveInstance, SolveProfile
+from .engine_utils import MINUTES_PER_DAY
+from .logging_utils import log_event
+
+# Cate vecinatati re-optimizam in paralel la fiecare runda; CP-SAT elibereaza
+# GIL-ul in timpul cautarii, deci thread-urile sunt suficiente.
+LNS_PARALLEL_NEIGHBORHOODS = int(
+    os.getenv("LNS_PARALLEL_NEIGHBORHOODS", str(max(1, min(4, os.cpu_count() or 1))))
+)
+# Partea din buget pentru prima solutie, cautata pe tot modelul.
+LNS_INITIAL_SOLVE_FRACTION = 0.3
+# Limita per vecinatate; o vecinatate mica este de obicei inchisa (optimal) mult mai repede.
+LNS_SUBSOLVE_MAX_SECONDS = 2.0
+# Fractiunea din zile / angajati eliberata intr-o vecinatate, adaptata din mers.
+LNS_INITIAL_NEIGHBORHOOD_FRACTION = 0.15
+LNS_MIN_NEIGHBORHOOD_FRACTION = 0.02
+LNS_MAX_NEIGHBORHOOD_FRACTION = 0.6
+
+NEIGHBORHOOD_KINDS = ("day_window", "employee_group", "penalized_terms")
+
+# (angajati eliberati, zile eliberate); None = toti / toate.
+Neighborhood = tuple[set[int] | None, set[int] | None]
+
+
+def _free_assign_cells(instance: SolveInstance, built: BuiltModel) -> list[tuple[tuple[int, int], int]]:
+    # (celula, index in proto) pentru celulele cu variabila proprie; cele neeligibile
+    # impart constanta 0 a modelului si nu trebuie rescrise de vecinatati.
+    eligibility = get_eligibility(instance)
+    return [(cell, var.index) for cell, var in built.assign.items() if eligibility.is_eligible(*cell)]
+
+
+def _read_assignment(solver: cp_model.CpSolver, built: BuiltModel) -> dict[tuple[int, int], int]:
+    solution = solver.response_proto.solution
+    return {cell: solution[var.index] for cell, var in built.assign.items()}
+
+
+def _hot_spots(
+    instance: SolveInstance,
+    built: BuiltModel,
+    solver: cp_model.CpSolver,
+    incumbent: dict[tuple[int, int], int],
+) -> tuple[dict[int, int], list[int]]:
+    """
+    Zilele unde solutia curenta pierde puncte (cu penalizarea pierduta pe zi)
+    si angajatii extremi cand balance_worked_hours este penalizat.
+    """
+    day_by_shift = [start // MINUTES_PER_DAY for start in instance.shifts.start_abs]
+    lost_points_by_day: dict[int, int] = {}
+    extreme_employees: list[int] = []
+    for ref in built.objective_term_refs:
+        value = solver.value(ref["var"])
+        coefficient = ref["coefficient"]
+        # Preferinta neindeplinita sau penalizare activa.
+        lost_points = coefficient if value == 0 else 0 if coefficient > 0 else -coefficient * value
+        if lost_points <= 0:
+            continue
+        if ref["constraint_type"] == "balance_worked_hours":
+            worked_minutes = [0] * instance.num_employees
+            for (employee_idx, shift_idx), assigned in incumbent.items():
+                if assigned:
+                    worked_minutes[employee_idx] += instance.shifts.durations[shift_idx]
+            extreme_employees = [
+                min(range(instance.num_employees), key=worked_minutes.__getitem__),
+                max(range(instance.num_employees), key=worked_minutes.__getitem__),
+            ]
+            continue
+        for _, shift_idx in ref.get("cells", []):
+            day = day_by_shift[shift_idx]
+            lost_points_by_day[day] = lost_points_by_day.get(day, 0) + lost_points
+    return lost_points_by_day, extreme_employees
+
+
+def _skill_group(rng: random.Random, group_size: int, eligible_shifts: list[int]) -> set[int]:
+    """
+    Un angajat ales aleator plus cei care pot lucra cele mai multe dintre turele lui.
+
+    Motivatie:
+    Cu skill-uri, un grup aleator amesteca roluri care nu se pot inlocui (casier si
+    brutar): vecinatatea e libera doar pe hartie si se inchide fara castig. Ordonam
+    dupa turele comune (AND pe bitset-uri), cu departajare aleatoare.
+    """
+    seed_employee = rng.randrange(len(eligible_shifts))
+    seed_shifts = eligible_shifts[seed_employee]
+    ranked = sorted(
+        (idx for idx in range(len(eligible_shifts)) if idx != seed_employee),
+        key=lambda idx: (-(eligible_shifts[idx] & seed_shifts).bit_count(), rng.random()),
+    )
+    return {seed_employee, *ranked[: group_size - 1]}
+
+
+def _pick_neighborhood(
+    kind: str,
+    fraction: float,
+    rng: random.Random,
+    num_employees: int,
+    all_days: list[int],
+    lost_points_by_day: dict[int, int],
+    extreme_employees: list[int],
+    eligible_shifts: list[int] | None = None,
+) -> tuple[str, Neighborhood]:
+    num_days = max(1, round(fraction * len(all_days)))
+    group_size = min(num_employees, max(2, round(fraction * num_employees)))
+
+    if kind == "penalized_terms":
+        # Zilele cu puncte pierdute (ponderat dupa penalizare); toti angajatii pot face schimburi.
+        if extreme_employees and (not lost_points_by_day or rng.random() < 0.5):
+            others = [idx for idx in range(num_employees) if idx not in extreme_employees]
+            group = set(extreme_employees) | set(rng.sample(others, min(len(others), group_size - 2)))
+            return kind, (group, None)
+        if lost_points_by_day:
+            candidates = dict(lost_points_by_day)
+            days: set[int] = set()
+            while candidates and len(days) < num_days:
+                day = rng.choices(list(candidates), weights=list(candidates.values()))[0]
+                del candidates[day]
+                days.add(day)
+            return kind, (None, days)
+        kind = "day_window"
+
+    if kind == "employee_group":
+        if eligible_shifts is not None:
+            return kind, (_skill_group(rng, group_size, eligible_shifts), None)
+        return kind, (set(rng.sample(range(num_employees), group_size)), None)
+
+    window_start = rng.randrange(0, max(1, len(all_days) - num_days + 1))
+    return "day_window", (None, set(all_days[window_start : window_start + num_days]))
+
+
+def _solve_neighborhood(
+    built: BuiltModel,
+    free_assign_cells: list[tuple[tuple[int, int], int]],
+    model_pool: queue.SimpleQueue,
+    incumbent: dict[tuple[int, int], int],
+    neighborhood: Neighborhood,
+    day_by_shift: list[int],
+    profile: SolveProfile,
+    max_time_seconds: float,
+    num_workers: int,
+    seed: int,
+    request_id: str,
+) -> tuple[int, cp_model.CpSolver, int]:
+    # Motivatie:
+    # Nu reconstruim modelul in Python: fiecare thread refoloseste o copie a
+    # proto-ului deja construit si doar rescrie domeniile variabilelor `assign`
+    # (celulele din afara vecinatatii fixate la solutia curenta) si hint-ul.
+    try:
+        model = model_pool.get_nowait()
+    except queue.Empty:
+        model = built.model.clone()
+
+    free_employees, free_days = neighborhood
+    variables = model.proto.variables
+    hint = model.proto.solution_hint
+    del hint.vars[:]
+    del hint.values[:]
+    free_cells = 0
+    for (employee_idx, shift_idx), var_index in free_assign_cells:
+        value = incumbent[(employee_idx, shift_idx)]
+        is_free = (free_employees is None or employee_idx in free_employees) and (
+            free_days is None or day_by_shift[shift_idx] in free_days
+        )
+        if is_free:
+            variables[var_index].domain[:] = [0, 1]
+            hint.vars.append(var_index)
+            hint.values.append(value)
+            free_cells += 1
+        else:
+            variables[var_index].domain[:] = [value, value]
+
+    solver = cp_model.CpSolver()
+    solver.parameters.random_seed = seed
+    # Aceiasi parametri ca solve-ul complet (inclusiv `SOLVER_CP_SAT_PARAMETERS`), cu timpul
+    # si workerii sub-solve-ului.
+    configure_search(solver, profile, max_time_seconds, num_workers)
+    try:
+        with cancellable_search(request_id, solver):
+            status = solver.solve(model)
+    finally:
+        model_pool.put(model)
+    return status, solver, free_cells
+
+
+class _InitialSolutionCallback(cp_model.CpSolverSolutionCallback):
+    """Opreste solve-ul initial la prima solutie gasita dupa `min_seconds`."""
+
+    def __init__(self, min_seconds: float) -> None:
+        super().__init__()
+        self.min_seconds = min_seconds
+        self.solutions = 0
+
+    def on_solution_callback(self) -> None:
+        self.solutions += 1
+        if self.wall_time >= self.min_seconds:
+            self.stop_search()
+
+
+def solve_instance_lns(
+    instance: SolveInstance,
+    logger,
+    request_id: str,
+    started_at: float,
+    max_time_seconds: float | None = None,
+    num_workers: int | None = None,
+    seed: int = 0,
+    deadline: float | None = None,
+) -> dict:
+    # Motivatie:
+    # Pe orare foarte mari CP-SAT intoarce des doar "feasible" in buget, cu
+    # calitate variabila. Pornim de la prima solutie si re-optimizam repetat
+    # vecinatati mici (ferestre de zile, grupuri de angajati, zonele cele mai
+    # penalizate), cu restul celulelor fixate la solutia curenta.
+    log_solve_start(instance, logger, request_id, solve_mode="lns")
+    precheck_response = precheck_hard_conflicts(instance, logger, request_id, started_at)
+    if precheck_response is not None:
+        return precheck_response
+    admission, num_workers = apply_admission(instance, num_workers)
+    with reserved_memory(admission, logger, request_id):
+        return _run_lns(instance, logger, request_id, started_at, max_time_seconds, num_workers, seed, deadline)
+
+
+def _run_lns(
+    instance: SolveInstance,
+    logger,
+    request_id: str,
+    started_at: float,
+    max_time_seconds: float | None,
+    num_workers: int | None,
+    seed: int,
+    deadline: float | None,
+) -> dict:
+    greedy = build_greedy_schedule(instance)
+    built = build_model(instance, hints=greedy.values if GREEDY_HINT_ENABLED else None)
+    # Capturat inainte ca vecinatatile sa rescrie domeniile variabilelor.
+    record_capture_model(request_id, built.model)
+    profile = SOLVE_PROFILES[instance.solve_profile]
+    max_time_seconds, time_limit_source = search_time_limit(profile, built.model, max_time_seconds, deadline)
+    num_workers = num_workers or profile.num_workers
+    solve_started_at = time.perf_counter()
+    deadline = solve_started_at + max_time_seconds
+
+    def elapsed_us() -> int:
+        return int((time.perf_counter() - solve_started_at) * 1_000_000)
+
+    # Solve-ul initial ruleaza pana la `LNS_INITIAL_SOLVE_FRACTION` din buget, sau pana
+    # la prima solutie daca aceasta apare mai tarziu; fara solutie ramane un solve normal.
+    initial_seconds = max_time_seconds * LNS_INITIAL_SOLVE_FRACTION
+    solver = cp_model.CpSolver()
+    configure_search(solver, profile, max_time_seconds, num_workers)
+    solution_callback = _InitialSolutionCallback(min_seconds=initial_seconds)
+    stop_timer = threading.Timer(
+        initial_seconds,
+        lambda: solver.stop_search() if solution_callback.solutions > 0 else None,
+    )
+    stop_timer.start()
+    try:
+        with cancellable_search(request_id, solver):
+            status = solver.solve(built.model, solution_callback)
+    finally:
+        stop_timer.cancel()
+
+    def search_summary(search_status: int, objective: int | None, objective_bound: int | None) -> dict:
+        return build_search_summary(
+            profile=profile,
+            time_limit_seconds=max_time_seconds,
+            time_limit_source=time_limit_source,
+            num_workers=num_workers,
+            status=search_status,
+            objective=objective,
+            objective_bound=objective_bound,
+            wall_time_seconds=elapsed_us() / 1_000_000,
+            cancelled=is_cancelled(request_id),
+        )
+
+    if status == cp_model.UNKNOWN and greedy.complete:
+        response = build_heuristic_response(instance, greedy, "cp_sat_timeout", logger, request_id, started_at)
+        response["search"] = search_summary(status, None, None)
+        return response
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE) or not built.objective_term_refs:
+        response = build_solve_response(instance, built, solver, status, logger, request_id, started_at)
+        response["search"] = search_summary(status, None, None)
+        return response
+
+    # Obiectivul si bound-ul se rotunjesc (coeficienti intregi, float-uri din CP-SAT), ca in `solve_instance`.
+    objective_bound = round(solver.best_objective_bound)
+    # OPTIMAL poate veni si din `relative_gap_limit`; optim dovedit doar cand obiectivul atinge bound-ul.
+    proven_optimal = status == cp_model.OPTIMAL and round(solver.objective_value) >= objective_bound
+    day_by_shift = [start // MINUTES_PER_DAY for start in instance.shifts.start_abs]
+    # Prima copie de lucru este chiar modelul initial (nu mai este folosit dupa LNS).
+    model_pool: queue.SimpleQueue = queue.SimpleQueue()
+    model_pool.put(built.model)
+    free_assign_cells = _free_assign_cells(instance, built)
+    initial_source = "initial"
+    if status == cp_model.FEASIBLE and greedy.complete:
+        # Pe modele mari prima solutie CP-SAT poate fi mai slaba decat hint-ul greedy;
+        # il evaluam cu toate celulele fixate si pornim de la cea mai buna.
+        greedy_status, greedy_solver, _ = _solve_neighborhood(
+            built,
+            free_assign_cells,
+            model_pool,
+            greedy.values,
+            (set(), set()),
+            day_by_shift,
+            profile,
+            max(0.1, deadline - time.perf_counter()),
+            num_workers,
+            seed,
+            request_id,
+        )
+        if (
+            greedy_status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+            and round(greedy_solver.objective_value) > round(solver.objective_value)
+        ):
+            solver = greedy_solver
+            initial_source = "greedy"
+
+    best_solver = solver
+    incumbent = _read_assignment(solver, built)
+    incumbent_objective = round(solver.objective_value)
+    initial_objective = incumbent_objective
+    progress = [{"elapsed_us": elapsed_us(), "objective": incumbent_objective, "source": initial_source}]
+
+    rng = random.Random(seed)
+    all_days = sorted(set(day_by_shift))
+    total_cells = len(free_assign_cells)
+    eligibility = get_eligibility(instance)
+    # Grupurile de angajati urmeaza skill-urile doar cand acestea restrang celulele.
+    group_eligibility = eligibility.eligible_shifts if eligibility.restricted else None
+    fractions = {kind: LNS_INITIAL_NEIGHBORHOOD_FRACTION for kind in NEIGHBORHOOD_KINDS}
+    neighborhood_stats = {kind: {"tried": 0, "improved": 0} for kind in NEIGHBORHOOD_KINDS}
+    parallelism = max(1, LNS_PARALLEL_NEIGHBORHOODS)
+    workers_per_neighborhood = max(1, num_workers // parallelism)
+    lost_points_by_day, extreme_employees = _hot_spots(instance, built, solver, incumbent)
+    rounds = 0
+
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="lns") as pool:
+        while not proven_optimal and relative_gap(incumbent_objective, objective_bound) > profile.relative_gap_limit:
+            remaining_seconds = deadline - time.perf_counter()
+            if remaining_seconds < 0.2 or is_cancelled(request_id):
+                break
+            rounds += 1
+            batch = []
+            for offset in range(parallelism):
+                kind = NEIGHBORHOOD_KINDS[(rounds + offset) % len(NEIGHBORHOOD_KINDS)]
+                kind, neighborhood = _pick_neighborhood(
+                    kind,
+                    fractions[kind],
+                    rng,
+                    instance.num_employees,
+                    all_days,
+                    lost_points_by_day,
+                    extreme_employees,
+                    group_eligibility,
+                )
+                future = pool.submit(
+                    _solve_neighborhood,
+                    built,
+                    free_assign_cells,
+                    model_pool,
+                    incumbent,
+                    neighborhood,
+                    day_by_shift,
+                    profile,
+                    min(LNS_SUBSOLVE_MAX_SECONDS, remaining_seconds),
+                    workers_per_neighborhood,
+                    rng.randrange(1 << 30),
+                    request_id,
+                )
+                batch.append((kind, future))
+
+            best_in_round = None
+            for kind, future in batch:
+                sub_status, sub_solver, free_cells = future.result()
+                neighborhood_stats[kind]["tried"] += 1
+                improved = (
+                    sub_status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+                    and round(sub_solver.objective_value) > incumbent_objective
+                )
+                if sub_status == cp_model.OPTIMAL and free_cells == total_cells:
+                    proven_optimal = True
+                # Vecinatate inchisa fara castig -> o largim; timeout -> o micsoram.
+                if sub_status == cp_model.OPTIMAL and not improved:
+                    fractions[kind] = min(LNS_MAX_NEIGHBORHOOD_FRACTION, fractions[kind] * 1.25)
+                elif sub_status != cp_model.OPTIMAL:
+                    fractions[kind] = max(LNS_MIN_NEIGHBORHOOD_FRACTION, fractions[kind] * 0.8)
+                if improved:
+                    neighborhood_stats[kind]["improved"] += 1
+                    if best_in_round is None or round(sub_solver.objective_value) > round(
+                        best_in_round[1].objective_value
+                    ):
+                        best_in_round = (kind, sub_solver, sub_status)
+
+            if best_in_round is None:
+                continue
+            kind, best_solver, sub_status = best_in_round
+            proven_optimal = proven_optimal or (
+                sub_status == cp_model.OPTIMAL and round(best_solver.objective_value) >= objective_bound
+            )
+            incumbent = _read_assignment(best_solver, built)
+            incumbent_objective = round(best_solver.objective_value)
+            lost_points_by_day, extreme_employees = _hot_spots(instance, built, best_solver, incumbent)
+            progress.append({"elapsed_us": elapsed_us(), "objective": incumbent_objective, "source": kind})
+
+    final_status = cp_model.OPTIMAL if proven_optimal or incumbent_objective >= objective_bound else cp_model.FEASIBLE
+    search_status = final_status
+    if relative_gap(incumbent_objective, objective_bound) <= profile.relative_gap_limit:
+        search_status = cp_model.OPTIMAL
+    response = build_solve_response(instance, built, best_solver, final_status, logger, request_id, started_at)
+    response["search"] = search_summary(search_status, incumbent_objective, objective_bound)
+    response["lns"] = {
+        "initial_objective": initial_objective,
+        "objective_bound": objective_bound,
+        "rounds": rounds,
+        "parallel_neighborhoods": parallelism,
+        "neighborhoods": neighborhood_stats,
+        "progress": progress,
+    }
+    log_event(
+        logger,
+        "INFO",
+        "solve.lns.done",
+        request_id=request_id,
+        rounds=rounds,
+        initial_objective=initial_objective,
+        objective=incumbent_objective,
+        objective_bound=objective_bound,
+        improvements=len(progress) - 1,
+        elapsed_us=elapsed_us(),
+    )
+    return response
@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import time
+
+from ortools.sat.python import cp_model
+
+from .engine_automaton import apply_automaton_sequence_constraints, get_sequence_automaton
+from .engine_constraints import (
+    add_shift_coverage_constraints,
+    apply_balance_worked_hours_constraint,
+    apply_hard_constraints,
+    apply_max_worktime_constraints,
+    apply_min_rest_constraints,
+    apply_no_double_booking_constraints,
+    apply_objective,
+    apply_user_soft_constraints,
+    build_assignment_variables,
+    collect_enabled_feature_toggles,
+)
+from .engine_diagnostics import infer_infeasibility_reasons
+from .engine_intervals import apply_interval_sequence_constraints, interval_formulation_applicable
+from .engine_normalize import get_normalized_rules
+from .engine_proto import ProtoConstraintWriter, build_assign_index
+from .engine_skills import get_eligibility, has_eligibility_conflicts
+from .engine_results import build_feasible_response, build_infeasible_response
+from .engine_types import BuiltModel, SolveInstance
+from .engine_utils import get_max_worktime_violating_windows
+from .engine_workload import WorkloadAggregates, apply_workload_constraints
+from .logging_utils import log_event
+
+
+def log_solve_start(instance: SolveInstance, logger, request_id: str, **fields) -> None:
+    feature_toggles = instance.feature_toggles
+    normalized = get_normalized_rules(instance)
+    log_event(
+        logger,
+        "INFO",
+        "solve.request.start",
+        request_id=request_id,
+        horizon_start=instance.horizon_start,
+        days=instance.horizon_days,
+        employees=instance.num_employees,
+        shifts=instance.num_shifts,
+        hard=len(instance.hard_rules),
+        soft=len(instance.soft_rules),
+        soft_cells=len(normalized.soft_cells),
+        duplicate_hard_cells=normalized.duplicate_hard_cells,
+        merged_soft_cells=normalized.merged_soft_cells,
+        hard_conflicts=len(normalized.conflicting_cells),
+        ineligible_cells=get_eligibility(instance).ineligible_cells,
+        pruned_ineligible_cells=normalized.pruned_ineligible_cells,
+        max_worktime_enabled=feature_toggles.max_worktime_in_row_enabled,
+        max_worktime_hours=feature_toggles.max_worktime_in_row_hours,
+        min_rest_hard_enabled=feature_toggles.min_rest_after_shift_hard_enabled,
+        min_rest_hard_hours=feature_toggles.min_rest_after_shift_hard_hours,
+        min_rest_soft_enabled=feature_toggles.min_rest_after_shift_soft_enabled,
+        min_rest_soft_hours=feature_toggles.min_rest_after_shift_soft_hours,
+        min_rest_soft_weight=feature_toggles.min_rest_after_shift_soft_weight,
+        balance_worked_hours=feature_toggles.balance_worked_hours,
+        balance_span_multiplier=feature_toggles.balance_worked_hours_max_span_multiplier,
+        balance_weight=feature_toggles.balance_worked_hours_weight,
+        no_double_booking=feature_toggles.no_double_booking_enabled,
+        max_shifts_per_day=feature_toggles.max_shifts_per_day if feature_toggles.max_shifts_per_day_enabled else None,
+        max_hours_per_week=feature_toggles.max_hours_per_week if feature_toggles.max_hours_per_week_enabled else None,
+        min_days_off_per_week=(
+            feature_toggles.min_days_off_per_week if feature_toggles.min_days_off_per_week_enabled else None
+        ),
+        **fields,
+    )
+
+
+def build_model(
+    instance: SolveInstance,
+    fixed_assignments: dict[tuple[int, int], int] | None = None,
+    hints: dict[tuple[int, int], int] | None = None,
+) -> BuiltModel:
+    num_employees = instance.num_employees
+    num_shifts = instance.num_shifts
+
+    # "assign[(e, s)] = 1" inseamna ca employee e este atribuit pe shift s.
+    model = cp_model.CpModel()
+    eligibility = get_eligibility(instance)
+    assign = build_assignment_variables(
+        model=model,
+        num_employees=num_employees,
+        num_shifts=num_shifts,
+        fixed_assignments=fixed_assignments,
+        eligibility=eligibility,
+    )
+    for cell, value in (hints or {}).items():
+        if (fixed_assignments is None or cell not in fixed_assignments) and eligibility.is_eligible(*cell):
+            model.add_hint(assign[cell], value)
+    # Restrictiile in volum mare (coverage, ferestre, rest) sunt scrise direct in
+    # proto, pe matricea de indici (angajat x tura).
+    writer = ProtoConstraintWriter(model)
+    assign_index = build_assign_index(assign, num_employees, num_shifts)
+
+    add_shift_coverage_constraints(
+        writer=writer,
+        assign_index=assign_index,
+        instance=instance,
+        num_employees=num_employees,
+    )
+
+    # "automaton" revine la "pairwise" daca automatul depaseste limita de tranzitii, iar
+    # "interval" cand `NoOverlap`-ul lui ar interzice orare valide pentru "pairwise".
+    automaton = None
+    if instance.formulation == "automaton":
+        automaton = get_sequence_automaton(instance.shifts, instance.feature_toggles)
+    interval_formulation = instance.formulation == "interval" and interval_formulation_applicable(instance)
+    violating_windows: list[list[int]] = []
+    if not interval_formulation and automaton is None:
+        violating_windows = apply_max_worktime_constraints(
+            instance=instance,
+            writer=writer,
+            assign_index=assign_index,
+            num_employees=num_employees,
+            fixed_assignments=fixed_assignments,
+        )
+
+    if not interval_formulation:
+        apply_no_double_booking_constraints(
+            instance=instance,
+            writer=writer,
+            assign_index=assign_index,
+            num_employees=num_employees,
+        )
+
+    enabled_feature_toggles = collect_enabled_feature_toggles(instance.feature_toggles)
+    objective_term_refs = []
+
+    apply_hard_constraints(
+        instance=instance,
+        model=model,
+        assign=assign,
+    )
+
+    apply_user_soft_constraints(
+        instance=instance,
+        assign=assign,
+        objective_term_refs=objective_term_refs,
+    )
+
+    if interval_formulation:
+        violating_windows = apply_interval_sequence_constraints(
+            instance=instance,
+            model=model,
+            writer=writer,
+            assign=assign,
+            assign_index=assign_index,
+            num_employees=num_employees,
+            objective_term_refs=objective_term_refs,
+        )
+    elif automaton is not None:
+        violating_windows = apply_automaton_sequence_constraints(
+            instance=instance,
+            automaton=automaton,
+            model=model,
+            assign=assign,
+            num_employees=num_employees,
+            objective_term_refs=objective_term_refs,
+        )
+    else:
+        apply_min_rest_constraints(
+            instance=instance,
+            model=model,
+            writer=writer,
+            assign=assign,
+            assign_index=assign_index,
+            num_employees=num_employees,
+            num_shifts=num_shifts,
+            objective_term_refs=objective_term_refs,
+            fixed_assignments=fixed_assignments,
+        )
+
+    # Agregatele per zi / saptamana / angajat, comune regulilor de volum si balance-ului.
+    aggregates = WorkloadAggregates(instance, model, assign)
+    apply_workload_constraints(
+        instance=instance,
+        writer=writer,
+        assign_index=assign_index,
+        aggregates=aggregates,
+        objective_term_refs=objective_term_refs,
+    )
+
+    balance_context = apply_balance_worked_hours_constraint(
+        instance=instance,
+        model=model,
+        aggregates=aggregates,
+        num_employees=num_employees,
+        objective_term_refs=objective_term_refs,
+    )
+
+    apply_objective(model=model, objective_term_refs=objective_term_refs)
+    return BuiltModel(
+        model=model,
+        assign=assign,
+        violating_windows=violating_windows,
+        objective_term_refs=objective_term_refs,
+        balance_context=balance_context,
+        enabled_feature_toggles=enabled_feature_toggles,
+    )
+
+
+def build_diagnosed_infeasible_response(
+    instance: SolveInstance,
+    violating_windows: list[list[int]],
+    enabled_feature_toggles: list[str],
+    logger,
+    request_id: str,
+    started_at: float,
+    **log_fields,
+) -> dict:
+    warnings: list[dict] = list(instance.warnings)
+    infeasibility_reasons = infer_infeasibility_reasons(
+        instance=instance,
+        num_employees=instance.num_employees,
+        max_worktime_violating_windows=violating_windows,
+    )
+    elapsed_ms = (time.perf_counter() - started_at) * 1000.0
+    log_event(
+        logger,
+        "INFO",
+        "solve.request.done",
+        request_id=request_id,
+        status="infeasible",
+        elapsed_us=int(elapsed_ms * 1000),
+        warnings=len(warnings),
+        inferred_reasons=len(infeasibility_reasons),
+        **log_fields,
+    )
+    return build_infeasible_response(
+        warnings=warnings,
+        enabled_feature_toggles=enabled_feature_toggles,
+        infeasibility_reasons=infeasibility_reasons,
+    )
+
+
+def precheck_hard_conflicts(instance: SolveInstance, logger, request_id: str, started_at: float) -> dict | None:
+    """
+    Raspunsul infezabil, fara CP-SAT, cand aceeasi celula e si ceruta si interzisa
+    sau cand eligibilitatea nu ajunge (tura fara destui angajati eligibili / calificati,
+    require pe un angajat fara skill-urile turei sau indisponibil).
+
+    Conflictul e gasit de normalizare si de bitset-urile de eligibilitate; modelul ar
+    fi oricum infezabil, dar construirea lui si cautarea pot costa secunde pe instante mari.
+    """
+    normalized = get_normalized_rules(instance)
+    if normalized.conflicting_cells:
+        precheck = "hard_conflict"
+    elif normalized.ineligible_required_cells or has_eligibility_conflicts(instance):
+        precheck = "eligibility_conflict"
+    else:
+        return None
+    feature_toggles = instance.feature_toggles
+    violating_windows: list[list[int]] = []
+    if feature_toggles.max_worktime_in_row_enabled:
+        violating_windows = get_max_worktime_violating_windows(
+            instance.shifts, feature_toggles.max_worktime_in_row_hours * 60
+        )
+    return build_diagnosed_infeasible_response(
+        instance=instance,
+        violating_windows=violating_windows,
+        enabled_feature_toggles=collect_enabled_feature_toggles(feature_toggles),
+        logger=logger,
+        request_id=request_id,
+        started_at=started_at,
+        precheck=precheck,
+    )
+
+
+def build_solve_response(
+    instance: SolveInstance,
+    built: BuiltModel,
+    solver: cp_model.CpSolver,
+    status: int,
+    logger,
+    request_id: str,
+    started_at: float,
+) -> dict:
+    # Raspunsul API (infezabil / fezabil + diagnostice) pentru o rezolvare terminata.
+    warnings: list[dict] = list(instance.warnings)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return build_diagnosed_infeasible_response(
+            instance=instance,
+            violating_windows=built.violating_windows,
+            enabled_feature_toggles=built.enabled_feature_toggles,
+            logger=logger,
+            request_id=request_id,
+            started_at=started_at,
+        )
+
+    response, total_assigned_slots = build_feasible_response(
+        instance=instance,
+        solver=solver,
+        assign=built.assign,
+        status=status,
+        warnings=warnings,
+        enabled_feature_toggles=built.enabled_feature_toggles,
+        objective_term_refs=built.objective_term_refs,
+        balance_context=built.balance_context,
+    )
+    breakdown = response["objective_breakdown"]
+    breakdown_total = breakdown["reward_points"] + breakdown["penalty_points"]
+    if breakdown_total != response["objective"]:
+        # Obiectivul raportat trebuie sa fie exact suma contributiilor din breakdown.
+        log_event(
+            logger,
+            "ERROR",
+            "solve.objective.breakdown_mismatch",
+            request_id=request_id,
+            objective=response["objective"],
+            breakdown_total=breakdown_total,
+            raw_objective=solver.objective_value,
+        )
+
+    elapsed_ms = (time.perf_counter() - started_at) * 1000.0
+    log_event(
+        logger,
+        "INFO",
+        "solve.request.done",
+        request_id=request_id,
+        status=response["status"],
+        elapsed_us=int(elapsed_ms * 1000),
+        objective=response["objective"],
+        assigned_slots=total_assigned_slots,
+        warnings=len(warnings),
+        feature_toggles=built.enabled_feature_toggles,
+    )
+    return response
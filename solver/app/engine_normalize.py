@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from .engine_skills import get_eligibility
+from .engine_types import Eligibility, NormalizedRules, ResolvedRule, SoftCellTerm, SolveInstance
+
+
+def soft_rule_coefficient(rule: ResolvedRule) -> int:
+    return rule.weight if rule.type == "prefer_assignment" else -rule.weight
+
+
+def normalize_rules(
+    hard_rules: list[ResolvedRule],
+    soft_rules: list[ResolvedRule],
+    eligibility: Eligibility | None = None,
+) -> NormalizedRules:
+    """
+    Rezolva regulile la celule (angajat, tura) inainte de construirea modelului.
+
+    Motivatie:
+    Regulile trimise de utilizator se suprapun des (aceeasi tura prinsa prin `day`
+    si prin `date`, reguli hard duplicate). Fara normalizare fiecare regula adauga
+    propriile restrictii si termeni in obiectiv. Aici:
+    - regulile hard devin multimi de celule cerute / interzise (duplicatele dispar);
+    - celulele cerute si interzise simultan sunt raportate inainte de CP-SAT;
+    - ponderile soft se insumeaza per celula intr-un singur coeficient, pastrand
+      regulile originale pentru breakdown;
+    - celulele neeligibile (skill-uri) nu au variabila: forbid-urile si termenii soft
+      de pe ele dispar, iar un require pe ele face instanta infezabila.
+    Ordinea celulelor urmeaza ordinea regulilor din request (rezultat determinist).
+    """
+    required: dict[tuple[int, int], None] = {}
+    forbidden: dict[tuple[int, int], None] = {}
+    hard_cell_count = 0
+    pruned_cells: set[tuple[int, int]] = set()
+    for hard in hard_rules:
+        is_require = hard.type == "require_shift"
+        target = required if is_require else forbidden
+        for shift_idx in hard.shift_ids:
+            cell = (hard.employee_idx, shift_idx)
+            hard_cell_count += 1
+            if not is_require and eligibility is not None and not eligibility.is_eligible(*cell):
+                pruned_cells.add(cell)
+                continue
+            target[cell] = None
+
+    soft_by_cell: dict[tuple[int, int], SoftCellTerm] = {}
+    soft_cell_count = 0
+    for soft in soft_rules:
+        coefficient = soft_rule_coefficient(soft)
+        for shift_idx in soft.shift_ids:
+            soft_cell_count += 1
+            cell = (soft.employee_idx, shift_idx)
+            if eligibility is not None and not eligibility.is_eligible(*cell):
+                pruned_cells.add(cell)
+                continue
+            term = soft_by_cell.get(cell)
+            if term is None:
+                soft_by_cell[cell] = SoftCellTerm(
+                    employee_idx=soft.employee_idx,
+                    shift_idx=shift_idx,
+                    coefficient=coefficient,
+                    sources=[soft],
+                )
+                continue
+            term.coefficient += coefficient
+            term.sources.append(soft)
+
+    return NormalizedRules(
+        required_cells=list(required),
+        forbidden_cells=list(forbidden),
+        conflicting_cells=[cell for cell in required if cell in forbidden],
+        soft_cells=list(soft_by_cell.values()),
+        duplicate_hard_cells=hard_cell_count - len(required) - len(forbidden),
+        merged_soft_cells=soft_cell_count - len(soft_by_cell),
+        ineligible_required_cells=[
+            cell for cell in required if eligibility is not None and not eligibility.is_eligible(*cell)
+        ],
+        pruned_ineligible_cells=len(pruned_cells),
+    )
+
+
+def get_normalized_rules(instance: SolveInstance) -> NormalizedRules:
+    if instance.normalized is None:
+        eligibility = get_eligibility(instance)
+        instance.normalized = normalize_rules(
+            instance.hard_rules,
+            instance.soft_rules,
+            eligibility if eligibility.restricted else None,
+        )
+    return instance.normalized
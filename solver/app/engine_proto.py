@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import Iterable, Sequence
+
+from ortools.sat.python import cp_model
+
+from .engine_types import AssignIndex, AssignVars
+
+
+def negated(literal: int) -> int:
+    # Conventia CP-SAT: literalul negat al variabilei `i` este `-i - 1`.
+    return -literal - 1
+
+
+def build_assign_index(assign: AssignVars, num_employees: int, num_shifts: int) -> AssignIndex:
+    """Matricea (angajat x tura) cu indicii din proto ai literalelor `assign`."""
+    return [
+        [assign[(employee_idx, shift_idx)].index for shift_idx in range(num_shifts)]
+        for employee_idx in range(num_employees)
+    ]
+
+
+class ProtoConstraintWriter:
+    """
+    Scrie restrictii direct in `CpModelProto`, pe indici de literal/variabila.
+
+    Motivatie:
+    `model.add_bool_or(...)` / `model.add(sum(...) <= k)` valideaza fiecare literal
+    si construiesc expresii intermediare in Python; pe zeci de mii de restrictii
+    identice ca forma (per angajat x pereche de ture) costul acesta domina
+    construirea modelului. Aici fiecare restrictie e un singur mesaj proto.
+    Variabilele se creeaza in continuare prin `cp_model` (lista lui interna de variabile).
+    """
+
+    def __init__(self, model: cp_model.CpModel) -> None:
+        self._constraints = model.proto.constraints
+
+    def add_bool_or(self, literals: Iterable[int]) -> None:
+        self._constraints.add().bool_or.literals.extend(literals)
+
+    def add_bool_and(self, literals: Iterable[int], enforcement_literal: int) -> None:
+        constraint = self._constraints.add()
+        constraint.enforcement_literal.append(enforcement_literal)
+        constraint.bool_and.literals.extend(literals)
+
+    def add_linear(
+        self,
+        variables: Sequence[int],
+        coefficients: Sequence[int],
+        lower_bound: int,
+        upper_bound: int,
+    ) -> None:
+        linear = self._constraints.add().linear
+        linear.vars.extend(variables)
+        linear.coeffs.extend(coefficients)
+        linear.domain.extend((lower_bound, upper_bound))
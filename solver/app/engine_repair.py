@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import math
+import time
+
+from .engine import solve_instance
+from .engine_admission import admit_request
+from .engine_cancel import is_cancelled
+from .engine_instance import build_instance_from_request
+from .engine_types import SolveInstance
+from .engine_utils import MINUTES_PER_DAY, find_matching_shift_ids, parse_minutes
+from .engine_validation import validate_solver_request
+from .logging_utils import log_event
+from .models import RepairRequest, SolverRequest
+
+# Fiecare solve de repair primeste cel mult atat; widening-ul imparte bugetul total.
+REPAIR_TOTAL_TIME_SECONDS = 10.0
+
+
+def map_previous_assignments(
+    instance: SolveInstance,
+    repair: RepairRequest,
+    warnings: list[dict],
+) -> tuple[dict[tuple[int, int], int], set[int]]:
+    """
+    Intoarce (valorile anterioare per celula, ture noi fata de solutia anterioara).
+
+    Turele sunt identificate dupa (date, type, start, end); daca exista mai multe
+    ture identice, le potrivim in ordine.
+    """
+    shifts = instance.shifts
+    shift_ids_by_key: dict[tuple[str, str, int, int], list[int]] = {}
+    for shift_idx in range(len(shifts)):
+        key = (
+            shifts.dates[shift_idx],
+            shifts.types[shift_idx],
+            shifts.start_minutes[shift_idx],
+            shifts.end_minutes[shift_idx],
+        )
+        shift_ids_by_key.setdefault(key, []).append(shift_idx)
+
+    employee_idx_by_id = {employee_id: idx for idx, employee_id in enumerate(instance.employee_ids)}
+    previous: dict[tuple[int, int], int] = {}
+    matched_shift_ids: set[int] = set()
+    unknown_employee_ids: set[str] = set()
+    for item in repair.previous_assignments:
+        key = (item.date, item.type, parse_minutes(item.start), parse_minutes(item.end))
+        candidates = shift_ids_by_key.get(key)
+        if not candidates:
+            continue
+        shift_idx = candidates.pop(0)
+        matched_shift_ids.add(shift_idx)
+        for employee_idx in range(instance.num_employees):
+            previous[(employee_idx, shift_idx)] = 0
+        for assigned in item.assigned:
+            employee_idx = employee_idx_by_id.get(assigned.employee_id)
+            if employee_idx is None:
+                unknown_employee_ids.add(assigned.employee_id)
+                continue
+            previous[(employee_idx, shift_idx)] = 1
+
+    for employee_id in sorted(unknown_employee_ids):
+        warnings.append({"code": "repair_unknown_previous_employee", "employee_id": employee_id})
+    new_shift_ids = set(range(len(shifts))) - matched_shift_ids
+    return previous, new_shift_ids
+
+
+def collect_affected(
+    instance: SolveInstance,
+    repair: RepairRequest,
+    previous: dict[tuple[int, int], int],
+    new_shift_ids: set[int],
+) -> tuple[set[int], set[int]]:
+    """Angajatii si zilele (day offset) atinse direct de modificari."""
+    shifts = instance.shifts
+    employee_idx_by_id = {employee_id: idx for idx, employee_id in enumerate(instance.employee_ids)}
+    affected_employees: set[int] = set()
+    affected_shift_ids: set[int] = set(new_shift_ids)
+
+    for rule in [*repair.changed_constraints.hard, *repair.changed_constraints.soft]:
+        employee_idx = employee_idx_by_id.get(rule.employee_id)
+        if employee_idx is not None:
+            affected_employees.add(employee_idx)
+        affected_shift_ids.update(find_matching_shift_ids(shifts, rule))
+
+    for employee_id in repair.changed_employee_ids:
+        employee_idx = employee_idx_by_id.get(employee_id)
+        if employee_idx is not None:
+            affected_employees.add(employee_idx)
+
+    changed_dates = set(repair.changed_dates)
+    for shift_idx in range(len(shifts)):
+        if shifts.dates[shift_idx] in changed_dates:
+            affected_shift_ids.add(shift_idx)
+            continue
+        # Coverage modificat fata de solutia anterioara.
+        if shift_idx not in new_shift_ids:
+            previously_assigned = sum(
+                previous.get((employee_idx, shift_idx), 0) for employee_idx in range(instance.num_employees)
+            )
+            if previously_assigned != shifts.required[shift_idx]:
+                affected_shift_ids.add(shift_idx)
+
+    affected_days = {shifts.start_abs[shift_idx] // MINUTES_PER_DAY for shift_idx in affected_shift_ids}
+    return affected_employees, affected_days
+
+
+def neighborhood_pad_days(instance: SolveInstance) -> int:
+    # Motivatie:
+    # O modificare intr-o zi poate schimba lanturile max-worktime si pauzele
+    # de rest din zilele vecine; eliberam suficiente zile cat sa le acoperim.
+    feature_toggles = instance.feature_toggles
+    pad_minutes = 0
+    if feature_toggles.max_worktime_in_row_enabled:
+        pad_minutes += feature_toggles.max_worktime_in_row_hours * 60
+    rest_hours = []
+    if feature_toggles.min_rest_after_shift_hard_enabled:
+        rest_hours.append(feature_toggles.min_rest_after_shift_hard_hours)
+    if feature_toggles.min_rest_after_shift_soft_enabled:
+        rest_hours.append(feature_toggles.min_rest_after_shift_soft_hours)
+    pad_minutes += max(rest_hours, default=0) * 60
+    # Turele overnight se intind in ziua urmatoare.
+    max_duration = max(instance.shifts.durations, default=0)
+    return max(1, math.ceil((pad_minutes + max_duration) / MINUTES_PER_DAY))
+
+
+def build_neighborhood_levels(
+    instance: SolveInstance,
+    affected_employees: set[int],
+    affected_days: set[int],
+    max_widen_steps: int,
+) -> list[tuple[str, set[int], set[int]]]:
+    """
+    Nivelurile de vecinatate (nume, angajati liberi, zile libere), de la cea mai mica la intreg orarul.
+
+    Fara zile afectate: daca s-au schimbat doar angajati, ii eliberam pe tot orizontul;
+    daca nu s-a schimbat nimic, primul nivel fixeaza toate celulele (solutia anterioara,
+    doar verificata), iar `full` ramane pentru cazul in care ea nu mai este fezabila.
+    """
+    all_employees = set(range(instance.num_employees))
+    all_days = {start // MINUTES_PER_DAY for start in instance.shifts.start_abs}
+    pad_days = neighborhood_pad_days(instance)
+
+    def widen(days: set[int], pad: int) -> set[int]:
+        return {day + delta for day in days for delta in range(-pad, pad + 1)} & all_days
+
+    levels: list[tuple[str, set[int], set[int]]] = []
+    if affected_days:
+        if affected_employees:
+            levels.append(("affected_employees", set(affected_employees), widen(affected_days, pad_days)))
+        levels.append(("affected_days", all_employees, widen(affected_days, pad_days)))
+        for step in range(1, max_widen_steps + 1):
+            levels.append((f"widened_{step}", all_employees, widen(affected_days, pad_days * (2**step))))
+    elif affected_employees:
+        levels.append(("affected_employees", set(affected_employees), all_days))
+    else:
+        levels.append(("unchanged", set(), set()))
+    levels.append(("full", all_employees, all_days))
+
+    unique_levels = []
+    for name, employees, days in levels:
+        if unique_levels and unique_levels[-1][1] == employees and unique_levels[-1][2] == days:
+            continue
+        unique_levels.append((name, employees, days))
+        if employees == all_employees and days == all_days:
+            break
+    return unique_levels
+
+
+def solve_repair_request(
+    payload: SolverRequest,
+    logger,
+    request_id: str,
+    started_at: float,
+    deadline: float | None = None,
+) -> dict:
+    # Motivatie:
+    # O editare mica (disponibilitatea unui angajat intr-o zi) nu trebuie sa
+    # re-optimizeze tot orizontul si nici sa mute ture pe care nu le-a cerut nimeni.
+    # Pastram solutia anterioara in afara vecinatatii si largim doar daca e infezabil.
+    validate_solver_request(payload=payload, logger=logger, request_id=request_id)
+    instance = build_instance_from_request(payload, logger=logger, request_id=request_id)
+    admit_request(instance, logger, request_id)
+    return solve_repair(instance, payload.repair, logger, request_id, started_at, deadline=deadline)
+
+
+def solve_repair(
+    instance: SolveInstance,
+    repair: RepairRequest,
+    logger,
+    request_id: str,
+    started_at: float,
+    deadline: float | None = None,
+) -> dict:
+    warnings = list(instance.warnings)
+    previous, new_shift_ids = map_previous_assignments(instance, repair, warnings)
+    instance.warnings = warnings
+    affected_employees, affected_days = collect_affected(instance, repair, previous, new_shift_ids)
+    levels = build_neighborhood_levels(instance, affected_employees, affected_days, repair.max_widen_steps)
+
+    shifts = instance.shifts
+    day_by_shift = [start // MINUTES_PER_DAY for start in shifts.start_abs]
+    total_cells = instance.num_employees * instance.num_shifts
+    attempts = []
+    response: dict = {}
+    for level_idx, (level_name, free_employees, free_days) in enumerate(levels):
+        fixed_assignments = {
+            cell: value
+            for cell, value in previous.items()
+            if not (cell[0] in free_employees and day_by_shift[cell[1]] in free_days)
+        }
+        remaining_seconds = REPAIR_TOTAL_TIME_SECONDS - (time.perf_counter() - started_at)
+        remaining_levels = len(levels) - level_idx
+        attempt_started_at = time.perf_counter()
+        response = solve_instance(
+            instance,
+            logger,
+            request_id,
+            started_at,
+            max_time_seconds=max(0.5, remaining_seconds / remaining_levels),
+            fixed_assignments=fixed_assignments,
+            hints=previous,
+            deadline=deadline,
+        )
+        attempts.append(
+            {
+                "level": level_name,
+                "free_employees": len(free_employees),
+                "free_days": len(free_days),
+                "free_cells": total_cells - len(fixed_assignments),
+                "status": response["status"],
+                "elapsed_us": int((time.perf_counter() - attempt_started_at) * 1_000_000),
+            }
+        )
+        log_event(
+            logger,
+            "INFO",
+            "solve.repair.attempt",
+            request_id=request_id,
+            neighborhood=level_name,
+            free_cells=total_cells - len(fixed_assignments),
+            total_cells=total_cells,
+            status=response["status"],
+        )
+        if response["status"] in ("optimal", "feasible") or is_cancelled(request_id):
+            break
+
+    changed_cells = 0
+    employee_idx_by_id = {employee_id: idx for idx, employee_id in enumerate(instance.employee_ids)}
+    for shift_idx, assignment in enumerate(response.get("assignments", [])):
+        assigned_now = {employee_idx_by_id[item["employee_id"]] for item in assignment["assigned"]}
+        for employee_idx in range(instance.num_employees):
+            was_assigned = previous.get((employee_idx, shift_idx), 0) == 1
+            if was_assigned != (employee_idx in assigned_now):
+                changed_cells += 1
+
+    response["repair"] = {
+        "level": attempts[-1]["level"],
+        "affected_employees": [instance.employee_ids[idx] for idx in sorted(affected_employees)],
+        "affected_dates": sorted(
+            {shifts.dates[shift_idx] for shift_idx in range(len(shifts)) if day_by_shift[shift_idx] in affected_days}
+        ),
+        "changed_assignments": changed_cells,
+        "new_shifts": len(new_shift_ids),
+        "attempts": attempts,
+    }
+    return response
@@ -4,8 +4,9 @@ from collections import defaultdict
 
 from ortools.sat.python import cp_model
 
-from .engine_types import AssignVars, BalanceContext, ObjectiveTerm
-from .models import SolverRequest
+from .engine_normalize import soft_rule_coefficient
+from .engine_types import AssignVars, BalanceContext, ObjectiveTerm, SolveInstance
+from .engine_workload import summarize_workload
 
 
 def build_infeasible_response(
@@ -34,7 +35,7 @@ def build_infeasible_response(
 
 
 def build_feasible_response(
-    payload: SolverRequest,
+    instance: SolveInstance,
     solver: cp_model.CpSolver,
     assign: AssignVars,
     status: int,
@@ -43,7 +44,7 @@ def build_feasible_response(
     objective_term_refs: list[ObjectiveTerm],
     balance_context: BalanceContext,
 ) -> tuple[dict, int]:
-    assignments, employee_load, total_assigned_slots = _build_assignments(payload, solver, assign)
+    assignments, employee_load, total_assigned_slots = _build_assignments(instance, solver, assign)
     objective_breakdown, unsatisfied_soft_constraints = _build_objective_breakdown(
         solver=solver,
         objective_term_refs=objective_term_refs,
@@ -53,7 +54,7 @@ def build_feasible_response(
     status_text = "optimal" if status == cp_model.OPTIMAL else "feasible"
     response = {
         "status": status_text,
-        "objective": int(solver.objective_value) if objective_term_refs else 0,
+        "objective": round(solver.objective_value) if objective_term_refs else 0,
         "warnings": warnings,
         "assignments": assignments,
         "employee_load": employee_load,
@@ -65,39 +66,42 @@ def build_feasible_response(
 
 
 def _build_assignments(
-    payload: SolverRequest,
+    instance: SolveInstance,
     solver: cp_model.CpSolver,
     assign: AssignVars,
 ) -> tuple[list[dict], list[dict], int]:
     assignments = []
     employee_load_counter = defaultdict(int)
+    assigned_cells: list[tuple[int, int]] = []
+    shifts = instance.shifts
 
-    for shift_idx, shift in enumerate(payload.shifts):
+    for shift_idx in range(len(shifts)):
         assigned = []
-        for employee_idx, employee in enumerate(payload.employees):
+        for employee_idx, employee_id in enumerate(instance.employee_ids):
             if solver.value(assign[(employee_idx, shift_idx)]) == 1:
-                assigned.append({"employee_id": employee.id, "employee_name": employee.name})
-                employee_load_counter[employee.id] += 1
+                assigned.append({"employee_id": employee_id, "employee_name": instance.employee_names[employee_idx]})
+                employee_load_counter[employee_id] += 1
+                assigned_cells.append((employee_idx, shift_idx))
 
         assignments.append(
             {
-                "day": shift.day,
-                "date": shift.date,
-                "type": shift.type,
-                "start": shift.start,
-                "end": shift.end,
-                "required": shift.required,
+                **shifts.meta(shift_idx),
+                "required": shifts.required[shift_idx],
                 "assigned": assigned,
             }
         )
 
+    # Minutele / zilele lucrate pe acelasi calendar (zi, saptamana) ca regulile de volum.
     employee_load = [
         {
-            "employee_id": employee.id,
-            "employee_name": employee.name,
-            "assigned_count": employee_load_counter[employee.id],
+            "employee_id": employee_id,
+            "employee_name": employee_name,
+            "assigned_count": employee_load_counter[employee_id],
+            **workload,
         }
-        for employee in payload.employees
+        for employee_id, employee_name, workload in zip(
+            instance.employee_ids, instance.employee_names, summarize_workload(instance, assigned_cells)
+        )
     ]
     total_assigned_slots = sum(len(assignment["assigned"]) for assignment in assignments)
     return assignments, employee_load, total_assigned_slots
@@ -117,58 +121,15 @@ def _build_objective_breakdown(
     # Returnam breakdown-ul obiectivului pentru a explica "de ce"
     # solutia are scorul curent. UI poate arata explicit ce reguli
     # soft au ramas nesatisfacute si ce impact au avut in punctaj.
-    for ref in objective_term_refs:
-        var_value = int(solver.value(ref["var"]))
-        active = var_value > 0
-        contribution = int(ref["coefficient"]) * var_value
-        reward_points += max(0, contribution)
-        penalty_points += min(0, contribution)
-
-        constraint_type = ref["constraint_type"]
-        if constraint_type == "prefer_assignment":
-            status_label = "satisfied" if active else "unmet"
-        elif constraint_type == "balance_worked_hours":
-            status_label = "within_allowed_span" if not active else "over_allowed_span"
-        else:
-            status_label = "violated" if active else "satisfied"
-
-        item = {
-            "source": ref["source"],
-            "constraint_type": constraint_type,
-            "employee_id": ref["employee_id"],
-            "employee_name": ref["employee_name"],
-            "weight": ref["weight"],
-            "status": status_label,
-            "contribution": contribution,
-            "active": active,
-            "value": var_value,
-        }
-        if "shift" in ref:
-            item["shift"] = ref["shift"]
-        if "left_shift" in ref:
-            item["left_shift"] = ref["left_shift"]
-        if "right_shift" in ref:
-            item["right_shift"] = ref["right_shift"]
-        if "rest_minutes" in ref:
-            item["rest_minutes"] = ref["rest_minutes"]
-        if "required_rest_minutes" in ref:
-            item["required_rest_minutes"] = ref["required_rest_minutes"]
-        if constraint_type == "balance_worked_hours":
-            item["excess_hours"] = var_value
-            if balance_context.min_hours_var is not None:
-                item["min_employee_hours"] = int(solver.value(balance_context.min_hours_var))
-            if balance_context.max_hours_var is not None:
-                item["max_employee_hours"] = int(solver.value(balance_context.max_hours_var))
-            if balance_context.hours_span_var is not None:
-                item["hours_span"] = int(solver.value(balance_context.hours_span_var))
-            if balance_context.allowed_span_hours is not None:
-                item["allowed_span_hours"] = balance_context.allowed_span_hours
-            if balance_context.average_shift_duration_minutes is not None:
-                item["average_shift_duration_minutes"] = balance_context.average_shift_duration_minutes
-
-        objective_items.append(item)
-        if status_label in ("unmet", "violated", "over_allowed_span"):
-            unsatisfied_soft_constraints.append(item)
+    for term in objective_term_refs:
+        var_value = int(solver.value(term["var"]))
+        for ref in _breakdown_refs(term):
+            item = _build_breakdown_item(ref, var_value, balance_context, solver)
+            reward_points += max(0, item["contribution"])
+            penalty_points += min(0, item["contribution"])
+            objective_items.append(item)
+            if item["status"] in ("unmet", "violated", "over_allowed_span"):
+                unsatisfied_soft_constraints.append(item)
 
     objective_breakdown = {
         "reward_points": reward_points,
@@ -178,3 +139,83 @@ def _build_objective_breakdown(
     }
     return objective_breakdown, unsatisfied_soft_constraints
 
+
+def _breakdown_refs(term: ObjectiveTerm) -> list[ObjectiveTerm]:
+    # Termenul unei celule soft (ponderi insumate in model) se imparte inapoi
+    # pe regulile originale, ca breakdown-ul sa arate cate un item per regula.
+    soft_cell = term.get("soft_cell")
+    if soft_cell is None:
+        return [term]
+    refs = []
+    for rule in soft_cell.sources:
+        ref = {
+            **term,
+            "constraint_type": rule.type,
+            "coefficient": soft_rule_coefficient(rule),
+            "weight": rule.weight,
+        }
+        if rule.source_idx is not None:
+            ref["rule_index"] = rule.source_idx
+        refs.append(ref)
+    return refs
+
+
+def _build_breakdown_item(
+    ref: ObjectiveTerm,
+    var_value: int,
+    balance_context: BalanceContext,
+    solver: cp_model.CpSolver,
+) -> dict:
+    active = var_value > 0
+    contribution = int(ref["coefficient"]) * var_value
+
+    constraint_type = ref["constraint_type"]
+    if constraint_type == "prefer_assignment":
+        status_label = "satisfied" if active else "unmet"
+    elif constraint_type == "balance_worked_hours":
+        status_label = "within_allowed_span" if not active else "over_allowed_span"
+    else:
+        status_label = "violated" if active else "satisfied"
+
+    item = {
+        "source": ref["source"],
+        "constraint_type": constraint_type,
+        "employee_id": ref["employee_id"],
+        "employee_name": ref["employee_name"],
+        "weight": ref["weight"],
+        "status": status_label,
+        "contribution": contribution,
+        "active": active,
+        "value": var_value,
+    }
+    if "shift" in ref:
+        item["shift"] = ref["shift"]
+    if "left_shift" in ref:
+        item["left_shift"] = ref["left_shift"]
+    if "right_shift" in ref:
+        item["right_shift"] = ref["right_shift"]
+    if "rule_index" in ref:
+        item["rule_index"] = ref["rule_index"]
+    if "rest_minutes" in ref:
+        item["rest_minutes"] = ref["rest_minutes"]
+    if "required_rest_minutes" in ref:
+        item["required_rest_minutes"] = ref["required_rest_minutes"]
+    if constraint_type == "min_days_off_per_week":
+        item["week_start"] = ref["week_start"]
+        item["days_in_week"] = ref["days_in_week"]
+        item["required_days_off"] = ref["required_days_off"]
+        item["missing_days_off"] = var_value
+    if constraint_type == "balance_worked_hours":
+        item["excess_hours"] = var_value
+        if balance_context.min_hours_var is not None:
+            item["min_employee_hours"] = int(solver.value(balance_context.min_hours_var))
+        if balance_context.max_hours_var is not None:
+            item["max_employee_hours"] = int(solver.value(balance_context.max_hours_var))
+        if balance_context.hours_span_var is not None:
+            item["hours_span"] = int(solver.value(balance_context.hours_span_var))
+        if balance_context.allowed_span_hours is not None:
+            item["allowed_span_hours"] = balance_context.allowed_span_hours
+        if balance_context.average_shift_duration_minutes is not None:
+            item["average_shift_duration_minutes"] = balance_context.average_shift_duration_minutes
+    return item
+
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from .engine import solve_instance
+from .engine_budget import DEADLINE_MARGIN_SECONDS, MIN_SEARCH_SECONDS
+from .engine_cancel import is_cancelled
+from .engine_constraints import prepare_derived_structures
+from .engine_instance import resolve_request_rules, build_instance_from_request
+from .engine_types import SolveInstance
+from .engine_validation import validate_solver_request
+from .logging_utils import get_logger, log_event
+from .models import FeatureToggles, ScenarioBatchRequest, ScenarioOverride
+
+# Numarul de procese in care rulam scenariile in paralel; fiecare CP-SAT
+# primeste o parte din `SOLVER_TOTAL_WORKERS` ca sa nu suprasolicitam CPU-ul.
+SCENARIO_POOL_WORKERS = int(os.getenv("SCENARIO_POOL_WORKERS", str(max(1, min(4, os.cpu_count() or 1)))))
+SOLVER_TOTAL_WORKERS = int(os.getenv("SOLVER_TOTAL_WORKERS", "8"))
+# Marja peste buget pentru serializare/pornirea proceselor inainte sa declaram timeout.
+SCENARIO_RESULT_GRACE_SECONDS = 15.0
+# Cat de des verificam anularea request-ului cat asteptam scenariile.
+SCENARIO_CANCEL_POLL_SECONDS = 0.25
+# Timpul minim de cautare per scenariu; valurile care nu il mai primesc nu pornesc.
+MIN_SCENARIO_SECONDS = 0.5
+
+_scenario_pool: ProcessPoolExecutor | None = None
+_scenario_pool_lock = threading.Lock()
+
+
+def get_scenario_pool() -> ProcessPoolExecutor:
+    # "spawn": procesul uvicorn are deja thread-uri (logging, CP-SAT),
+    # iar fork-ul unui proces multi-thread nu este sigur.
+    global _scenario_pool
+    with _scenario_pool_lock:
+        if _scenario_pool is None:
+            _scenario_pool = ProcessPoolExecutor(
+                max_workers=SCENARIO_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _scenario_pool
+
+
+def shutdown_scenario_pool() -> None:
+    global _scenario_pool
+    with _scenario_pool_lock:
+        if _scenario_pool is not None:
+            _scenario_pool.shutdown(wait=False, cancel_futures=True)
+        _scenario_pool = None
+
+
+def _reject(logger, request_id: str, reason: str, detail: str, **fields) -> None:
+    log_event(logger, "WARN", "solve.request.rejected", request_id=request_id, reason=reason, **fields)
+    raise HTTPException(status_code=422, detail=detail)
+
+
+def build_scenario_instance(
+    base_instance: SolveInstance,
+    payload: ScenarioBatchRequest,
+    scenario: ScenarioOverride,
+    employee_idx_by_id: dict[str, int],
+    logger,
+    request_id: str,
+) -> SolveInstance:
+    # Motivatie:
+    # Tabelul de ture (si structurile derivate din el) si regulile de baza deja
+    # rezolvate la indici sunt refolosite; scenariul rezolva doar regulile proprii.
+    unknown_toggles = sorted(set(scenario.feature_toggles) - set(FeatureToggles.model_fields))
+    if unknown_toggles:
+        _reject(
+            logger,
+            request_id,
+            "scenario_unknown_feature_toggle",
+            f"Scenario '{scenario.id}' overrides unknown feature toggles: {', '.join(unknown_toggles)}.",
+            scenario_id=scenario.id,
+        )
+    try:
+        feature_toggles = FeatureToggles(
+            **{**payload.base.feature_toggles.model_dump(), **scenario.feature_toggles}
+        )
+    except ValidationError as exc:
+        _reject(
+            logger,
+            request_id,
+            "scenario_invalid_feature_toggle",
+            f"Scenario '{scenario.id}' has invalid feature toggles: {exc.errors()[0]['msg']}.",
+            scenario_id=scenario.id,
+        )
+
+    base_soft = payload.base.constraints.soft
+    for soft_idx, weight in scenario.soft_weight_overrides.items():
+        if not 0 <= soft_idx < len(base_soft) or not 1 <= weight <= 10_000:
+            _reject(
+                logger,
+                request_id,
+                "scenario_invalid_soft_weight_override",
+                f"Scenario '{scenario.id}' soft_weight_overrides[{soft_idx}] must reference a base soft "
+                "constraint and use a weight in 1..10000.",
+                scenario_id=scenario.id,
+            )
+
+    soft_rules = [
+        replace(rule, weight=scenario.soft_weight_overrides[rule.source_idx])
+        if rule.source_idx in scenario.soft_weight_overrides
+        else rule
+        for rule in base_instance.soft_rules
+    ]
+
+    warnings = list(base_instance.warnings)
+    extra_hard = resolve_request_rules(
+        base_instance.shifts, scenario.add_hard, "hard", employee_idx_by_id, warnings, logger, request_id
+    )
+    extra_soft = resolve_request_rules(
+        base_instance.shifts, scenario.add_soft, "soft", employee_idx_by_id, warnings, logger, request_id
+    )
+    return replace(
+        base_instance,
+        hard_rules=[*base_instance.hard_rules, *extra_hard],
+        soft_rules=[*soft_rules, *extra_soft],
+        feature_toggles=feature_toggles,
+        warnings=warnings,
+    )
+
+
+def _solve_scenario_in_worker(
+    instance: SolveInstance,
+    request_id: str,
+    max_time_seconds: float,
+    num_workers: int,
+    batch_end_wall: float,
+) -> tuple[dict, int]:
+    # Ruleaza in procesul din pool; HTTPException nu poate aparea aici
+    # (validarea si rezolvarea regulilor s-au facut in procesul principal).
+    # `batch_end_wall` e absolut (time.time(), comparabil intre procese): un scenariu care
+    # porneste tarziu (pool ocupat, pornirea proceselor) nu cauta dincolo de bugetul batch-ului.
+    started_at = time.perf_counter()
+    remaining_seconds = batch_end_wall - time.time()
+    if remaining_seconds < MIN_SEARCH_SECONDS:
+        return {"status": "error", "reason": "scenario_timeout"}, 0
+    response = solve_instance(
+        instance,
+        get_logger(),
+        request_id,
+        started_at,
+        max_time_seconds=min(max_time_seconds, remaining_seconds),
+        num_workers=num_workers,
+    )
+    return response, int((time.perf_counter() - started_at) * 1_000_000)
+
+
+def _hours_span(instance: SolveInstance, response: dict) -> dict:
+    if not response.get("assignments"):
+        return {"hours_span": None, "min_employee_hours": None, "max_employee_hours": None}
+    employee_idx_by_id = {employee_id: idx for idx, employee_id in enumerate(instance.employee_ids)}
+    worked_minutes = [0] * instance.num_employees
+    for shift_idx, assignment in enumerate(response["assignments"]):
+        for assigned in assignment["assigned"]:
+            worked_minutes[employee_idx_by_id[assigned["employee_id"]]] += instance.shifts.durations[shift_idx]
+    min_hours = round(min(worked_minutes) / 60, 2)
+    max_hours = round(max(worked_minutes) / 60, 2)
+    return {
+        "hours_span": round(max_hours - min_hours, 2),
+        "min_employee_hours": min_hours,
+        "max_employee_hours": max_hours,
+    }
+
+
+def solve_scenario_batch(
+    payload: ScenarioBatchRequest,
+    logger,
+    request_id: str,
+    started_at: float,
+    deadline: float | None = None,
+) -> dict:
+    # Etapa 1: validare + preprocesare comuna (tabel de ture, reguli rezolvate,
+    # ferestre max-worktime, lanturi de rest), o singura data pentru tot batch-ul.
+    scenario_ids = [scenario.id for scenario in payload.scenarios]
+    if len(set(scenario_ids)) != len(scenario_ids):
+        _reject(logger, request_id, "duplicate_scenario_ids", "Scenario IDs must be unique.")
+    validate_solver_request(payload=payload.base, logger=logger, request_id=request_id)
+    base_instance = build_instance_from_request(payload.base, logger=logger, request_id=request_id)
+    employee_idx_by_id = {employee_id: idx for idx, employee_id in enumerate(base_instance.employee_ids)}
+
+    scenario_instances = []
+    for scenario in payload.scenarios:
+        instance = build_scenario_instance(
+            base_instance, payload, scenario, employee_idx_by_id, logger, request_id
+        )
+        prepare_derived_structures(instance)
+        scenario_instances.append(instance)
+
+    # Etapa 2: impartim bugetul de timp pe "valuri" de scenarii paralele. Nu depasim nici
+    # `time_budget_seconds`, nici deadline-ul: daca nu toate valurile primesc minimul,
+    # scurtam batch-ul (ultimele scenarii nu pornesc); daca nici unul nu incape, respingem.
+    parallelism = min(SCENARIO_POOL_WORKERS, len(scenario_instances))
+    remaining_seconds = payload.time_budget_seconds - (time.perf_counter() - started_at)
+    if deadline is not None:
+        remaining_seconds = min(remaining_seconds, deadline - time.perf_counter() - DEADLINE_MARGIN_SECONDS)
+    if remaining_seconds < MIN_SCENARIO_SECONDS:
+        _reject(
+            logger,
+            request_id,
+            "scenario_budget_exhausted",
+            f"Scenario batch has {max(0.0, remaining_seconds):.2f}s left after preprocessing; "
+            f"each scenario needs at least {MIN_SCENARIO_SECONDS}s. Raise the budget or the request timeout.",
+        )
+    waves = min(
+        math.ceil(len(scenario_instances) / parallelism),
+        int(remaining_seconds // MIN_SCENARIO_SECONDS),
+    )
+    scheduled_count = min(len(scenario_instances), waves * parallelism)
+    per_scenario_seconds = remaining_seconds / waves
+    batch_end_wall = time.time() + remaining_seconds
+    workers_per_scenario = max(1, SOLVER_TOTAL_WORKERS // parallelism)
+    preprocessing_us = int((time.perf_counter() - started_at) * 1_000_000)
+    log_event(
+        logger,
+        "INFO",
+        "solve.scenarios.start",
+        request_id=request_id,
+        scenarios=len(scenario_instances),
+        skipped_scenarios=len(scenario_instances) - scheduled_count,
+        shifts=base_instance.num_shifts,
+        employees=base_instance.num_employees,
+        parallelism=parallelism,
+        per_scenario_seconds=round(per_scenario_seconds, 3),
+        workers_per_scenario=workers_per_scenario,
+        preprocessing_us=preprocessing_us,
+    )
+
+    # Etapa 3: rezolvam scenariile in pool-ul de procese.
+    pool = get_scenario_pool()
+    futures = {}
+    try:
+        for scenario, instance in zip(payload.scenarios[:scheduled_count], scenario_instances):
+            futures[scenario.id] = pool.submit(
+                _solve_scenario_in_worker,
+                instance,
+                f"{request_id}:{scenario.id}",
+                per_scenario_seconds,
+                workers_per_scenario,
+                batch_end_wall,
+            )
+        # Asteptam in pasi scurti ca anularea request-ului sa fie observata. `future.cancel()`
+        # opreste doar scenariile inca in coada; cele deja pornite in procesele din pool nu
+        # vad anularea (alt proces) si ruleaza pana la `batch_end_wall`, pe care il respecta.
+        wait_until = time.perf_counter() + remaining_seconds + SCENARIO_RESULT_GRACE_SECONDS
+        if deadline is not None:
+            wait_until = min(wait_until, deadline)
+        pending = set(futures.values())
+        while pending and not is_cancelled(request_id):
+            remaining_seconds = wait_until - time.perf_counter()
+            if remaining_seconds <= 0:
+                break
+            done, pending = wait(
+                pending,
+                timeout=min(SCENARIO_CANCEL_POLL_SECONDS, remaining_seconds),
+                return_when=FIRST_EXCEPTION,
+            )
+            if any(future.exception() is not None for future in done):
+                break
+    except BrokenProcessPool:
+        shutdown_scenario_pool()
+        raise
+
+    results = []
+    comparison_items = []
+    for scenario, instance in zip(payload.scenarios, scenario_instances):
+        future = futures.get(scenario.id)
+        if future is None:
+            response = {"status": "error", "reason": "scenario_skipped_no_budget"}
+            elapsed_us = None
+        elif not future.done():
+            future.cancel()
+            reason = "scenario_cancelled" if is_cancelled(request_id) else "scenario_timeout"
+            response = {"status": "error", "reason": reason}
+            elapsed_us = None
+        else:
+            try:
+                response, elapsed_us = future.result()
+            except BrokenProcessPool:
+                shutdown_scenario_pool()
+                response = {"status": "error", "reason": "scenario_worker_crashed"}
+                elapsed_us = None
+            except Exception as exc:
+                log_event(
+                    logger,
+                    "ERROR",
+                    "solve.scenarios.scenario_failed",
+                    request_id=request_id,
+                    scenario_id=scenario.id,
+                    error=str(exc),
+                )
+                response = {"status": "error", "reason": str(exc)}
+                elapsed_us = None
+
+        results.append({"id": scenario.id, "label": scenario.label, "result": response})
+        breakdown = response.get("objective_breakdown") or {}
+        comparison_items.append(
+            {
+                "id": scenario.id,
+                "label": scenario.label,
+                "status": response["status"],
+                "objective": response.get("objective"),
+                "unsatisfied_count": breakdown.get("unsatisfied_count"),
+                **_hours_span(instance, response),
+                "elapsed_us": elapsed_us,
+            }
+        )
+
+    feasible_items = [item for item in comparison_items if item["status"] in ("optimal", "feasible", "heuristic")]
+    best = max(
+        feasible_items,
+        key=lambda item: (item["objective"], -item["unsatisfied_count"]),
+        default=None,
+    )
+    elapsed_us = int((time.perf_counter() - started_at) * 1_000_000)
+    log_event(
+        logger,
+        "INFO",
+        "solve.scenarios.done",
+        request_id=request_id,
+        scenarios=len(results),
+        feasible=len(feasible_items),
+        best_scenario_id=best["id"] if best else None,
+        elapsed_us=elapsed_us,
+    )
+    return {
+        "scenarios": results,
+        "comparison": {
+            "items": comparison_items,
+            "best_scenario_id": best["id"] if best else None,
+        },
+        "time_budget_seconds": payload.time_budget_seconds,
+        "per_scenario_time_limit_seconds": round(per_scenario_seconds, 3),
+        "parallelism": parallelism,
+    }
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+from .engine_types import Eligibility, SolveInstance
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Indicii bitilor setati, crescator."""
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+def bits_mask(indices: Iterable[int]) -> int:
+    mask = 0
+    for idx in indices:
+        mask |= 1 << idx
+    return mask
+
+
+def group_masks(groups: list[list[int]]) -> list[int]:
+    return [bits_mask(group) for group in groups]
+
+
+def filter_eligible(items: list, masks: list[int] | None, eligible_shifts: int) -> list:
+    """
+    Elementele (ferestre, lanturi) ale caror ture sunt toate eligibile pentru angajat;
+    `masks` = None cand nu exista celule neeligibile.
+
+    Un grup cu o celula neeligibila nu poate fi atribuit complet, deci restrictiile
+    si literalele construite peste el nu sunt necesare.
+    """
+    if masks is None:
+        return items
+    ineligible_shifts = ~eligible_shifts
+    return [item for item, mask in zip(items, masks) if not mask & ineligible_shifts]
+
+
+def build_eligibility(instance: SolveInstance) -> Eligibility:
+    """
+    Calculeaza bitset-urile de eligibilitate din `employee_skills` si `shifts.skills`,
+    apoi scoate turele din `unavailable_shifts`.
+
+    Motivatie:
+    Fara skill-uri pe ture, restrictiile de rol se trimiteau ca mii de `forbid_shift`,
+    fiecare cu variabila si restrictia ei. Aici o celula neeligibila nu mai ajunge in
+    model deloc. Angajatii si turele se grupeaza dupa skill-uri (putine combinatii
+    intr-un magazin), deci bitset-urile se calculeaza o data per combinatie.
+    """
+    num_employees = instance.num_employees
+    num_shifts = instance.num_shifts
+    employee_skills = instance.employee_skills or [[] for _ in range(num_employees)]
+
+    employees_by_skill: dict[str, int] = {}
+    for employee_idx, skills in enumerate(employee_skills):
+        for skill in skills:
+            employees_by_skill[skill] = employees_by_skill.get(skill, 0) | 1 << employee_idx
+
+    all_employees = (1 << num_employees) - 1
+    eligible_employees: list[int] = []
+    employees_by_skill_set: dict[tuple[str, ...], int] = {(): all_employees}
+    for shift_skills in instance.shifts.skills:
+        mask = employees_by_skill_set.get(shift_skills)
+        if mask is None:
+            mask = all_employees
+            for skill in shift_skills:
+                mask &= employees_by_skill.get(skill, 0)
+            employees_by_skill_set[shift_skills] = mask
+        eligible_employees.append(mask)
+
+    all_shifts = (1 << num_shifts) - 1
+    eligible_shifts = [all_shifts] * num_employees
+    ineligible_cells = 0
+    for skill_set, employee_mask in employees_by_skill_set.items():
+        if not skill_set:
+            continue
+        shift_mask = bits_mask(
+            shift_idx for shift_idx, shift_skills in enumerate(instance.shifts.skills) if shift_skills == skill_set
+        )
+        if not shift_mask:
+            continue
+        for employee_idx in iter_bits(all_employees & ~employee_mask):
+            eligible_shifts[employee_idx] &= ~shift_mask
+            ineligible_cells += shift_mask.bit_count()
+
+    # Ferestrele de indisponibilitate, deja rezolvate la ture (`engine_availability`).
+    for employee_idx, unavailable in enumerate(instance.unavailable_shifts):
+        newly_ineligible = eligible_shifts[employee_idx] & unavailable
+        if not newly_ineligible:
+            continue
+        eligible_shifts[employee_idx] &= ~newly_ineligible
+        ineligible_cells += newly_ineligible.bit_count()
+        employee_bit = 1 << employee_idx
+        for shift_idx in iter_bits(newly_ineligible):
+            eligible_employees[shift_idx] &= ~employee_bit
+
+    return Eligibility(
+        eligible_shifts=eligible_shifts,
+        eligible_employees=eligible_employees,
+        employees_by_skill=employees_by_skill,
+        ineligible_cells=ineligible_cells,
+    )
+
+
+def get_eligibility(instance: SolveInstance) -> Eligibility:
+    if instance.eligibility is None:
+        instance.eligibility = build_eligibility(instance)
+    return instance.eligibility
+
+
+def qualified_employees(instance: SolveInstance, shift_idx: int, skill: str) -> int:
+    """Bitset-ul angajatilor eligibili pe tura care au si `skill` (pentru `skill_requirements`)."""
+    eligibility = get_eligibility(instance)
+    return eligibility.eligible_employees[shift_idx] & eligibility.employees_by_skill.get(skill, 0)
+
+
+def has_eligibility_conflicts(instance: SolveInstance) -> bool:
+    """
+    True cand eligibilitatea (skill-uri, disponibilitate) face instanta infezabila
+    fara CP-SAT: o tura cu mai putini
+    angajati eligibili decat `required` sau un `skill_requirements` fara destui
+    angajati calificati. (`require_shift` pe celule neeligibile: `NormalizedRules`.)
+    """
+    eligibility = get_eligibility(instance)
+    shifts = instance.shifts
+    for shift_idx, required in enumerate(shifts.required):
+        if eligibility.eligible_employees[shift_idx].bit_count() < required:
+            return True
+        for skill, count in shifts.skill_requirements[shift_idx].items():
+            if qualified_employees(instance, shift_idx, skill).bit_count() < count:
+                return True
+    return False
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from ortools.sat.python import cp_model
+
+# Logul de cautare CP-SAT (parsat in evenimente) ruleaza implicit; 0 il dezactiveaza.
+SEARCH_TELEMETRY_ENABLED = os.getenv("SOLVER_SEARCH_TELEMETRY", "1") != "0"
+# Cate evenimente de progres pastram (primele; contoarele le includ pe toate).
+TELEMETRY_MAX_EVENTS = int(os.getenv("SOLVER_TELEMETRY_MAX_EVENTS", "100"))
+
+# Ex: "#3       0.07s best:13    next:[14,72]    rnd_cst_lns (d=5.00e-01 s=6 ...)"
+#     "#Bound   0.05s best:3     next:[4,72]     default_lp"
+_PROGRESS_LINE = re.compile(r"^#(\d+|Bound)\s+([\d.]+)s\s+best:(\S+)\s+next:\[([^\]]*)\]\s+(\S+)")
+_VARIABLES_LINE = re.compile(r"^#Variables: ([\d']+)")
+_CONSTRAINT_LINE = re.compile(r"^#k\w+: ([\d']+)")
+_PRESOLVE_RULE_LINE = re.compile(r"rule '.*' was applied ([\d']+) time")
+_SEARCH_START_LINE = re.compile(r"^Starting search at ([\d.]+)s")
+
+
+def _parse_int(raw: str) -> int:
+    return int(raw.replace("'", ""))
+
+
+def _parse_number(raw: str) -> float | None:
+    try:
+        value = float(raw)
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _round_number(value: float | None) -> int | None:
+    return None if value is None else round(value)
+
+
+class SearchLogParser:
+    """
+    `log_callback` pentru CP-SAT: transforma logul text al cautarii in
+    evenimente de progres (timp, obiectiv, bound, subsolver) si contoare de presolve.
+
+    Motivatie:
+    Numarul de workeri, limitele de timp si formularea se aleg dupa cine gaseste
+    imbunatatirile si cand; raspunsul CP-SAT pastreaza doar starea finala.
+    Obiectivul este maximizat, deci bound-ul este capatul superior din `next:[lo,hi]`.
+    """
+
+    def __init__(self) -> None:
+        # Callback-ul este apelat din thread-urile CP-SAT.
+        self.lock = threading.Lock()
+        self.events: list[dict] = []
+        self.improvements = 0
+        self.improvements_by_subsolver: Counter[str] = Counter()
+        self.first_solution_seconds: float | None = None
+        self.presolve_seconds: float | None = None
+        self.variables: list[int] = []
+        self.constraints: list[int] = []
+        self.presolve_rules_applied = 0
+        self.dropped_events = 0
+        self._section: str | None = None
+
+    def __call__(self, line: str) -> None:
+        with self.lock:
+            for raw_line in line.splitlines():
+                self._parse_line(raw_line.strip())
+
+    def _parse_line(self, line: str) -> None:
+        match = _PROGRESS_LINE.match(line)
+        if match is not None:
+            self._parse_progress(*match.groups())
+            return
+        if line.startswith("Initial optimization model") or line.startswith("Presolved optimization model"):
+            self._section = "model"
+            self.constraints.append(0)
+            return
+        if self._section == "model":
+            variables_match = _VARIABLES_LINE.match(line)
+            constraint_match = _CONSTRAINT_LINE.match(line)
+            if variables_match is not None:
+                self.variables.append(_parse_int(variables_match.group(1)))
+            elif constraint_match is not None:
+                self.constraints[-1] += _parse_int(constraint_match.group(1))
+            elif not line.startswith("-") and not line.startswith("#"):
+                self._section = None
+            return
+        rule_match = _PRESOLVE_RULE_LINE.search(line)
+        if rule_match is not None:
+            self.presolve_rules_applied += _parse_int(rule_match.group(1))
+            return
+        start_match = _SEARCH_START_LINE.match(line)
+        if start_match is not None:
+            self.presolve_seconds = float(start_match.group(1))
+
+    def _parse_progress(self, kind: str, seconds: str, best: str, next_range: str, subsolver: str) -> None:
+        time_seconds = float(seconds)
+        subsolver = subsolver.split("(", 1)[0]
+        bound = None
+        if next_range:
+            bound = _parse_number(next_range.rsplit(",", 1)[-1])
+        if kind == "Bound":
+            event = {"time_seconds": time_seconds, "kind": "bound", "bound": bound, "subsolver": subsolver}
+        else:
+            objective = _parse_number(best)
+            self.improvements += 1
+            self.improvements_by_subsolver[subsolver] += 1
+            if self.first_solution_seconds is None:
+                self.first_solution_seconds = time_seconds
+            event = {
+                "time_seconds": time_seconds,
+                "kind": "solution",
+                "objective": objective,
+                "bound": bound,
+                "subsolver": subsolver,
+            }
+        if len(self.events) < TELEMETRY_MAX_EVENTS:
+            self.events.append(event)
+        else:
+            self.dropped_events += 1
+
+
+def attach_search_log(solver: cp_model.CpSolver) -> SearchLogParser | None:
+    if not SEARCH_TELEMETRY_ENABLED:
+        return None
+    parser = SearchLogParser()
+    solver.parameters.log_search_progress = True
+    solver.parameters.log_to_stdout = False
+    solver.log_callback = parser
+    return parser
+
+
+def build_search_telemetry(solver: cp_model.CpSolver, parser: SearchLogParser) -> dict:
+    response = solver.response_proto
+    with parser.lock:
+        presolve = {
+            "variables_before": parser.variables[0] if parser.variables else None,
+            "variables_after": parser.variables[1] if len(parser.variables) > 1 else None,
+            "constraints_before": parser.constraints[0] if parser.constraints else None,
+            "constraints_after": parser.constraints[1] if len(parser.constraints) > 1 else None,
+            "rules_applied": parser.presolve_rules_applied,
+            "seconds": parser.presolve_seconds,
+        }
+        return {
+            "num_conflicts": response.num_conflicts,
+            "num_branches": response.num_branches,
+            "wall_time": round(response.wall_time, 3),
+            "deterministic_time": round(response.deterministic_time, 3),
+            # Rotunjit ca `search.objective_bound` (obiectiv cu coeficienti intregi).
+            "best_objective_bound": _round_number(_parse_number(str(response.best_objective_bound))),
+            "presolve": presolve,
+            "first_solution_seconds": parser.first_solution_seconds,
+            "improvements": parser.improvements,
+            "improvements_by_subsolver": dict(parser.improvements_by_subsolver.most_common()),
+            "progress": list(parser.events),
+            "progress_truncated": parser.dropped_events > 0,
+        }
@@ -1,14 +1,210 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any
 
 from ortools.sat.python import cp_model
 
+from .models import FeatureToggles
+
 AssignVars = dict[tuple[int, int], cp_model.IntVar]
+# assign_index[e][s] = indexul din proto al literalului `assign[(e, s)]`.
+AssignIndex = list[list[int]]
 ObjectiveTerm = dict[str, Any]
 
 
+def format_minutes(value: int) -> str:
+    return f"{value // 60:02d}:{value % 60:02d}"
+
+
+@dataclass
+class ShiftTable:
+    """
+    Reprezentare "columnara" a turelor: liste paralele indexate dupa shift_idx.
+
+    Engine-ul lucreaza doar cu aceste liste (minute absolute, durate, coverage),
+    iar etichetele text (`day`, `date`, `type`, `HH:MM`) sunt folosite doar
+    la construirea raspunsului si a diagnosticelor.
+    """
+
+    days: list[str]
+    dates: list[str]
+    types: list[str]
+    start_minutes: list[int]
+    end_minutes: list[int]
+    required: list[int]
+    start_abs: list[int]
+    end_abs: list[int]
+    durations: list[int]
+    sorted_indices: list[int] = field(default_factory=list)
+    slots: list[str | None] = field(default_factory=list)
+    # Skill-urile cerute fiecarui angajat atribuit pe tura si, per skill, cati dintre
+    # cei atribuiti trebuie sa-l aiba.
+    skills: list[tuple[str, ...]] = field(default_factory=list)
+    skill_requirements: list[dict[str, int]] = field(default_factory=list)
+    # Structuri derivate (ferestre max-worktime, lanturi, perechi de rest),
+    # calculate o singura data per tabel si refolosite intre scenarii.
+    derived: dict = field(default_factory=dict, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if not self.slots:
+            self.slots = [None] * len(self.start_abs)
+        if not self.skills:
+            self.skills = [()] * len(self.start_abs)
+        if not self.skill_requirements:
+            self.skill_requirements = [{} for _ in range(len(self.start_abs))]
+        if not self.sorted_indices:
+            self.sorted_indices = sorted(
+                range(len(self.start_abs)),
+                key=lambda idx: (self.start_abs[idx], self.types[idx]),
+            )
+
+    def __len__(self) -> int:
+        return len(self.start_abs)
+
+    def start_text(self, shift_idx: int) -> str:
+        return format_minutes(self.start_minutes[shift_idx])
+
+    def end_text(self, shift_idx: int) -> str:
+        return format_minutes(self.end_minutes[shift_idx])
+
+    def meta(self, shift_idx: int) -> dict:
+        # Un dict per tura, partajat de toti termenii din breakdown (zeci de mii pe
+        # orare mari); apelantii il copiaza daca vor sa-l extinda.
+        metas = self.derived.get("meta")
+        if metas is None:
+            metas = [
+                {
+                    "day": self.days[idx],
+                    "date": self.dates[idx],
+                    "type": self.types[idx],
+                    "start": self.start_text(idx),
+                    "end": self.end_text(idx),
+                }
+                for idx in range(len(self))
+            ]
+            self.derived["meta"] = metas
+        return metas[shift_idx]
+
+    def label(self, shift_idx: int) -> str:
+        return (
+            f"{self.days[shift_idx]} {self.dates[shift_idx]} {self.types[shift_idx]} "
+            f"({self.start_text(shift_idx)}-{self.end_text(shift_idx)})"
+        )
+
+
+@dataclass
+class ResolvedRule:
+    """Regula hard/soft rezolvata deja la indici (employee_idx, shift_ids)."""
+
+    type: str
+    employee_idx: int
+    shift_ids: list[int]
+    weight: int = 0
+    # Pozitia regulii in lista din request (hard/soft), pentru referinte inapoi.
+    source_idx: int | None = None
+
+
+@dataclass
+class SoftCellTerm:
+    """Termenul de obiectiv al unei celule (angajat, tura): suma ponderilor soft care o ating."""
+
+    employee_idx: int
+    shift_idx: int
+    coefficient: int
+    # Regulile soft originale (cu `source_idx`), pentru atribuirea punctelor in breakdown.
+    sources: list[ResolvedRule]
+
+
+@dataclass
+class Eligibility:
+    """
+    Celulele (angajat, tura) permise de skill-uri, ca bitset-uri (int Python).
+
+    Bitul `s` din `eligible_shifts[e]` = angajatul `e` are toate skill-urile turei `s`
+    si este disponibil pe ea; bitul `e` din `eligible_employees[s]` este acelasi lucru,
+    pe coloana.
+    """
+
+    eligible_shifts: list[int]
+    eligible_employees: list[int]
+    # skill -> bitset-ul angajatilor care il au.
+    employees_by_skill: dict[str, int]
+    ineligible_cells: int = 0
+
+    @property
+    def restricted(self) -> bool:
+        return self.ineligible_cells > 0
+
+    def is_eligible(self, employee_idx: int, shift_idx: int) -> bool:
+        return bool(self.eligible_shifts[employee_idx] >> shift_idx & 1)
+
+
+@dataclass
+class NormalizedRules:
+    """Regulile rezolvate la celule (angajat, tura), fara duplicate."""
+
+    required_cells: list[tuple[int, int]]
+    forbidden_cells: list[tuple[int, int]]
+    # Celule cerute si interzise in acelasi timp: instanta e infezabila.
+    conflicting_cells: list[tuple[int, int]]
+    soft_cells: list[SoftCellTerm]
+    duplicate_hard_cells: int = 0
+    merged_soft_cells: int = 0
+    # Celule cerute pe care angajatul nu are skill-urile turei (instanta e infezabila).
+    ineligible_required_cells: list[tuple[int, int]] = field(default_factory=list)
+    # Reguli forbid / soft pe celule neeligibile, deja fara efect (nu intra in model).
+    pruned_ineligible_cells: int = 0
+
+
+@dataclass
+class SolveInstance:
+    horizon_start: str
+    horizon_days: int
+    employee_ids: list[str]
+    employee_names: list[str]
+    shifts: ShiftTable
+    hard_rules: list[ResolvedRule]
+    soft_rules: list[ResolvedRule]
+    feature_toggles: FeatureToggles
+    warnings: list[dict] = field(default_factory=list)
+    formulation: str = "pairwise"
+    solve_profile: str = "balanced"
+    # Skill-urile fiecarui angajat (gol = niciun angajat nu are skill-uri).
+    employee_skills: list[list[str]] = field(default_factory=list)
+    # Bitset-ul turelor indisponibile per angajat (`engine_availability`; gol = fara ferestre).
+    unavailable_shifts: list[int] = field(default_factory=list)
+    # Calculat o data, la cerere (`engine_normalize.get_normalized_rules`).
+    normalized: NormalizedRules | None = field(default=None, init=False, repr=False, compare=False)
+    # Calculat o data, la cerere (`engine_skills.get_eligibility`).
+    eligibility: Eligibility | None = field(default=None, init=False, repr=False, compare=False)
+    # Decizia de admitere a request-ului (`engine_admission.admit_request`), refolosita de
+    # fiecare solve al lui (ex. nivelurile de repair).
+    admission: Admission | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def num_employees(self) -> int:
+        return len(self.employee_ids)
+
+    @property
+    def num_shifts(self) -> int:
+        return len(self.shifts)
+
+
+@dataclass(frozen=True)
+class WorkloadCalendar:
+    """
+    Turele grupate pe zile (ziua de start, fata de `horizon.start`) si pe saptamani de
+    7 zile incepand cu `horizon.start`, ca bitset-uri peste shift_idx.
+    """
+
+    shift_days: list[int]
+    day_masks: dict[int, int]
+    week_masks: dict[int, int]
+    # Zilele cu cel putin o tura, per saptamana.
+    days_by_week: dict[int, list[int]]
+
+
 @dataclass
 class BalanceContext:
     min_hours_var: cp_model.IntVar | None = None
@@ -17,3 +213,90 @@ class BalanceContext:
     allowed_span_hours: int | None = None
     average_shift_duration_minutes: float | None = None
 
+
+@dataclass
+class BuiltModel:
+    """Modelul CP-SAT construit pentru o instanta, plus referintele necesare raspunsului."""
+
+    model: cp_model.CpModel
+    assign: AssignVars
+    violating_windows: list[list[int]]
+    objective_term_refs: list[ObjectiveTerm]
+    balance_context: BalanceContext
+    enabled_feature_toggles: list[str]
+
+
+@dataclass(frozen=True)
+class ModelEstimate:
+    """Dimensiunea estimata a modelului CP-SAT, inainte de constructie."""
+
+    formulation: str
+    num_workers: int
+    variables: int
+    constraints: int
+    # Literali / termeni din toate restrictiile (tabelele de tranzitii ale automatului incluse).
+    terms: int
+    objective_terms: int
+    build_memory_mb: float
+    # Varful estimat pe durata cautarii (modelul Python + copiile CP-SAT ale workerilor).
+    peak_memory_mb: float
+
+
+@dataclass
+class Admission:
+    estimate: ModelEstimate
+    requested_formulation: str
+    requested_workers: int
+    # Ex. ["formulation:automaton", "num_workers:4"]; gol daca request-ul a intrat nemodificat.
+    downgrades: list[str] = field(default_factory=list)
+    fits: bool = True
+    # De ce nu a intrat (`max_variables` / `max_memory`), cand `fits` este False.
+    reason: str | None = None
+
+
+@dataclass(frozen=True)
+class SolveProfile:
+    """Bugetul de cautare CP-SAT pentru un `solve_profile` din request."""
+
+    name: str
+    # Timpul adaptiv: `base_seconds + seconds_per_10k_variables * (variabile / 10_000)`,
+    # limitat la [min_seconds, max_seconds].
+    base_seconds: float
+    seconds_per_10k_variables: float
+    min_seconds: float
+    max_seconds: float
+    num_workers: int
+    # Oprire cand |obiectiv - bound| / max(1, |obiectiv|) <= limita (0 = doar optim dovedit).
+    relative_gap_limit: float
+
+
+@dataclass
+class GreedySchedule:
+    """Solutia construita greedy: valori per celula plus ce nu a putut fi respectat."""
+
+    values: dict[tuple[int, int], int]
+    # (shift_idx, locuri neacoperite)
+    uncovered: list[tuple[int, int]] = field(default_factory=list)
+    # Reguli hard (require) care nu au putut fi respectate impreuna cu celelalte.
+    conflicts: list[dict] = field(default_factory=list)
+    elapsed_us: int = 0
+
+    @property
+    def complete(self) -> bool:
+        return not self.uncovered and not self.conflicts
+
+
+@dataclass
+class SequenceAutomaton:
+    """
+    Automatul (DFA stratificat) pentru regulile de secventa, comun tuturor angajatilor.
+
+    `items` este secventa etichetata, in ordinea turelor dupa start:
+    `("shift", s)` pentru `assign[(e, s)]`, urmat de `("short_rest", left, s, rest_minutes)`
+    pentru literalele de rest soft care se termina in `s`.
+    """
+
+    items: list[tuple]
+    transitions: list[tuple[int, int, int]]
+    final_states: list[int]
+    num_states: int
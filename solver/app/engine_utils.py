@@ -1,22 +1,30 @@
 from __future__ import annotations
 
-from datetime import date
+from typing import Callable, TypeVar
 
-from .models import HardConstraint, Shift, SoftConstraint, SolverRequest
+from .engine_types import ShiftTable
+from .models import HardConstraint, SoftConstraint
 
+MINUTES_PER_DAY = 24 * 60
+WEEKDAY_LABELS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
-def shift_matches_rule(shift: Shift, rule: HardConstraint | SoftConstraint) -> bool:
-    if rule.date is not None and shift.date != rule.date:
+T = TypeVar("T")
+
+
+def shift_matches_rule(shifts: ShiftTable, shift_idx: int, rule: HardConstraint | SoftConstraint) -> bool:
+    if rule.date is not None and shifts.dates[shift_idx] != rule.date:
         return False
-    if rule.day is not None and shift.day != rule.day:
+    if rule.day is not None and shifts.days[shift_idx] != rule.day:
         return False
-    if rule.shift_type is not None and shift.type != rule.shift_type:
+    if rule.shift_type is not None and shifts.types[shift_idx] != rule.shift_type:
+        return False
+    if rule.slot is not None and shifts.slots[shift_idx] != rule.slot:
         return False
     return True
 
 
-def find_matching_shift_ids(shifts: list[Shift], rule: HardConstraint | SoftConstraint) -> list[int]:
-    return [idx for idx, shift in enumerate(shifts) if shift_matches_rule(shift, rule)]
+def find_matching_shift_ids(shifts: ShiftTable, rule: HardConstraint | SoftConstraint) -> list[int]:
+    return [idx for idx in range(len(shifts)) if shift_matches_rule(shifts, idx, rule)]
 
 
 def parse_minutes(value: str) -> int:
@@ -24,43 +32,6 @@ def parse_minutes(value: str) -> int:
     return int(hours) * 60 + int(minutes)
 
 
-def shift_duration_minutes(shift: Shift) -> int:
-    start = parse_minutes(shift.start)
-    end = parse_minutes(shift.end)
-    if end > start:
-        return end - start
-    if end < start:
-        return end + (24 * 60) - start
-    return 24 * 60
-
-
-def shift_start_abs_minutes(shift: Shift, horizon_start_ord: int) -> int:
-    day_offset = date.fromisoformat(shift.date).toordinal() - horizon_start_ord
-    return day_offset * 24 * 60 + parse_minutes(shift.start)
-
-
-def shift_end_abs_minutes(shift: Shift, horizon_start_ord: int) -> int:
-    return shift_start_abs_minutes(shift, horizon_start_ord) + shift_duration_minutes(shift)
-
-
-def shift_order_key(shift: Shift) -> tuple[int, int, str]:
-    return (date.fromisoformat(shift.date).toordinal(), parse_minutes(shift.start), shift.type)
-
-
-def shift_label(shift: Shift) -> str:
-    return f"{shift.day} {shift.date} {shift.type} ({shift.start}-{shift.end})"
-
-
-def shift_to_meta(shift: Shift) -> dict:
-    return {
-        "day": shift.day,
-        "date": shift.date,
-        "type": shift.type,
-        "start": shift.start,
-        "end": shift.end,
-    }
-
-
 def build_minimal_qualifying_chain_by_left(
     sorted_shift_indices: list[int],
     shift_start_abs: list[int],
@@ -101,14 +72,13 @@ def build_minimal_qualifying_chain_by_left(
 
 
 def compute_max_worktime_violating_windows(
-    payload: SolverRequest,
-    shift_start_abs: list[int],
-    shift_end_abs: list[int],
-    shift_durations: list[int],
+    shifts: ShiftTable,
+    max_worktime_minutes: int,
 ) -> list[list[int]]:
-    max_worktime_minutes = payload.feature_toggles.max_worktime_in_row_hours * 60
-    num_shifts = len(payload.shifts)
-    sorted_shift_indices = sorted(range(num_shifts), key=lambda idx: shift_order_key(payload.shifts[idx]))
+    sorted_shift_indices = shifts.sorted_indices
+    shift_start_abs = shifts.start_abs
+    shift_end_abs = shifts.end_abs
+    shift_durations = shifts.durations
     violating_windows: list[list[int]] = []
 
     for start_pos, start_shift_idx in enumerate(sorted_shift_indices):
@@ -141,3 +111,98 @@ def compute_max_worktime_violating_windows(
         unique_windows.append(window)
     return unique_windows
 
+
+
+def compute_short_rest_pairs(shifts: ShiftTable, max_rest_minutes: int) -> list[tuple[int, int, int]]:
+    """Perechile (left, right, rest_minutes) cu 0 <= rest < `max_rest_minutes`, in ordinea (left, right)."""
+    shift_start_abs = shifts.start_abs
+    shift_end_abs = shifts.end_abs
+    num_shifts = len(shifts)
+    pairs: list[tuple[int, int, int]] = []
+    for left_shift_idx in range(num_shifts):
+        left_end = shift_end_abs[left_shift_idx]
+        for right_shift_idx in range(num_shifts):
+            if left_shift_idx == right_shift_idx:
+                continue
+            rest_minutes = shift_start_abs[right_shift_idx] - left_end
+            if 0 <= rest_minutes < max_rest_minutes:
+                pairs.append((left_shift_idx, right_shift_idx, rest_minutes))
+    return pairs
+
+
+def compute_overlap_cliques(shifts: ShiftTable) -> list[list[int]]:
+    """
+    Grupurile de ture care ruleaza toate in acelasi moment (la startul unei ture), cu
+    cel putin doua ture, fara duplicate.
+
+    Doua intervale se suprapun exact cand unul contine startul celuilalt, deci "cel mult
+    una per grup" interzice toate perechile suprapuse cu o restrictie per tura, nu per pereche.
+    """
+    sorted_shift_indices = shifts.sorted_indices
+    shift_start_abs = shifts.start_abs
+    shift_end_abs = shifts.end_abs
+    cliques: list[list[int]] = []
+    seen = set()
+    active: list[int] = []
+    for shift_idx in sorted_shift_indices:
+        start = shift_start_abs[shift_idx]
+        active = [other_idx for other_idx in active if shift_end_abs[other_idx] > start]
+        active.append(shift_idx)
+        if len(active) < 2:
+            continue
+        key = tuple(sorted(active))
+        if key not in seen:
+            seen.add(key)
+            cliques.append(list(active))
+    # Un grup inclus in urmatorul (ture cu acelasi start) este redundant.
+    return [
+        clique
+        for pos, clique in enumerate(cliques)
+        if pos + 1 == len(cliques) or not set(clique) <= set(cliques[pos + 1])
+    ]
+
+
+def cached_derived(shifts: ShiftTable, key: tuple, compute: Callable[[], T]) -> T:
+    # Motivatie:
+    # Structurile derivate depind doar de tabelul de ture si de un prag (ore).
+    # Scenariile "what-if" pe acelasi orar refolosesc acelasi tabel, deci le
+    # calculam o data; apelantii nu trebuie sa modifice rezultatul.
+    cached = shifts.derived.get(key)
+    if cached is None:
+        cached = compute()
+        shifts.derived[key] = cached
+    return cached
+
+
+def get_max_worktime_violating_windows(shifts: ShiftTable, max_worktime_minutes: int) -> list[list[int]]:
+    return cached_derived(
+        shifts,
+        ("max_worktime_windows", max_worktime_minutes),
+        lambda: compute_max_worktime_violating_windows(shifts, max_worktime_minutes),
+    )
+
+
+def get_minimal_qualifying_chain_by_left(shifts: ShiftTable, max_chain_minutes: int) -> dict[int, list[int]]:
+    return cached_derived(
+        shifts,
+        ("minimal_chain_by_left", max_chain_minutes),
+        lambda: build_minimal_qualifying_chain_by_left(
+            sorted_shift_indices=shifts.sorted_indices,
+            shift_start_abs=shifts.start_abs,
+            shift_end_abs=shifts.end_abs,
+            shift_durations=shifts.durations,
+            max_chain_minutes=max_chain_minutes,
+        ),
+    )
+
+
+def get_short_rest_pairs(shifts: ShiftTable, max_rest_minutes: int) -> list[tuple[int, int, int]]:
+    return cached_derived(
+        shifts,
+        ("short_rest_pairs", max_rest_minutes),
+        lambda: compute_short_rest_pairs(shifts, max_rest_minutes),
+    )
+
+
+def get_overlap_cliques(shifts: ShiftTable) -> list[list[int]]:
+    return cached_derived(shifts, ("overlap_cliques",), lambda: compute_overlap_cliques(shifts))
@@ -1,9 +1,45 @@
 from __future__ import annotations
 
+from datetime import date, timedelta
+
 from fastapi import HTTPException
 
+from .engine_utils import WEEKDAY_LABELS
 from .logging_utils import log_event
-from .models import SolverRequest
+from .models import ColumnarSolverRequest, SolverRequest, TemplateSlot
+
+
+def _template_slots(payload: SolverRequest) -> list[TemplateSlot]:
+    template = payload.shift_template
+    if template is None:
+        return []
+    return [
+        slot
+        for slots in [*template.weekly.values(), *template.overrides.values()]
+        for slot in slots
+    ]
+
+
+def _is_iso_date(value: str) -> bool:
+    try:
+        return date.fromisoformat(value).isoformat() == value
+    except ValueError:
+        return False
+
+
+def _template_expands_to_shifts(payload: SolverRequest) -> bool:
+    template = payload.shift_template
+    if template is None:
+        return False
+    horizon_start = date.fromisoformat(payload.horizon.start)
+    for day_offset in range(payload.horizon.days):
+        current = horizon_start + timedelta(days=day_offset)
+        slots = template.overrides.get(current.isoformat())
+        if slots is None:
+            slots = template.weekly.get(WEEKDAY_LABELS[current.weekday()], [])
+        if slots:
+            return True
+    return False
 
 
 def validate_solver_request(payload: SolverRequest, logger, request_id: str) -> None:
@@ -11,7 +47,28 @@ def validate_solver_request(payload: SolverRequest, logger, request_id: str) ->
         log_event(logger, "WARN", "solve.request.rejected", request_id=request_id, reason="no_employees")
         raise HTTPException(status_code=422, detail="At least one employee is required.")
 
-    if not payload.shifts:
+    if payload.shift_template is not None and payload.shifts:
+        log_event(logger, "WARN", "solve.request.rejected", request_id=request_id, reason="shifts_and_template")
+        raise HTTPException(status_code=422, detail="Send either `shifts` or `shift_template`, not both.")
+
+    if payload.shift_template is not None:
+        # O cheie ne-ISO nu s-ar potrivi niciodata cu o zi din orizont si ar fi ignorata in tacere.
+        for override_key in payload.shift_template.overrides:
+            if not _is_iso_date(override_key):
+                log_event(
+                    logger,
+                    "WARN",
+                    "solve.request.rejected",
+                    request_id=request_id,
+                    reason="invalid_template_override_date",
+                    override_key=override_key,
+                )
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Shift template override key '{override_key}' is not an ISO date (YYYY-MM-DD).",
+                )
+
+    if not payload.shifts and not _template_expands_to_shifts(payload):
         log_event(logger, "WARN", "solve.request.rejected", request_id=request_id, reason="no_shifts")
         raise HTTPException(status_code=422, detail="At least one shift is required.")
 
@@ -26,7 +83,7 @@ def validate_solver_request(payload: SolverRequest, logger, request_id: str) ->
         )
         raise HTTPException(status_code=422, detail="Employee IDs must be unique.")
 
-    for shift in payload.shifts:
+    for shift in [*payload.shifts, *_template_slots(payload)]:
         if shift.required > len(payload.employees):
             log_event(
                 logger,
@@ -34,14 +91,127 @@ def validate_solver_request(payload: SolverRequest, logger, request_id: str) ->
                 "solve.request.rejected",
                 request_id=request_id,
                 reason="required_exceeds_available_employees",
-                shift_date=shift.date,
+                shift_date=getattr(shift, "date", None),
                 shift_type=shift.type,
                 required=shift.required,
                 employees=len(payload.employees),
             )
             raise HTTPException(
                 status_code=422,
-                detail=f"Shift '{shift.date} {shift.type}' requires {shift.required} employees, "
+                detail=f"Shift '{getattr(shift, 'date', 'template')} {shift.type}' requires {shift.required} employees, "
                 f"but only {len(payload.employees)} are available.",
             )
+        for skill, count in shift.skill_requirements.items():
+            if not 1 <= count <= shift.required:
+                log_event(
+                    logger,
+                    "WARN",
+                    "solve.request.rejected",
+                    request_id=request_id,
+                    reason="skill_requirement_out_of_range",
+                    shift_date=getattr(shift, "date", None),
+                    shift_type=shift.type,
+                    skill=skill,
+                    count=count,
+                    required=shift.required,
+                )
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Shift '{getattr(shift, 'date', 'template')} {shift.type}' skill requirement "
+                    f"'{skill}' must be within 1..{shift.required} (shift required).",
+                )
+
 
+def validate_columnar_request(payload: ColumnarSolverRequest, logger, request_id: str) -> None:
+    # Motivatie:
+    # Validam coloanele in bloc (lungimi, intervale, indici) in loc sa
+    # instantiem un model Pydantic per shift / per regula.
+    def reject(reason: str, detail: str, **fields) -> None:
+        log_event(logger, "WARN", "solve.request.rejected", request_id=request_id, reason=reason, **fields)
+        raise HTTPException(status_code=422, detail=detail)
+
+    employees = payload.employees
+    shifts = payload.shifts
+    num_employees = len(employees.ids)
+    num_shifts = len(shifts.day_offsets)
+
+    if not num_employees:
+        reject("no_employees", "At least one employee is required.")
+    if len(employees.names) != num_employees:
+        reject("columnar_length_mismatch", "employees.ids and employees.names must have the same length.")
+    if len(set(employees.ids)) != num_employees:
+        reject("duplicate_employee_ids", "Employee IDs must be unique.")
+    if employees.skills and len(employees.skills) != num_employees:
+        reject("columnar_length_mismatch", "employees.skills must be empty or have the same length as employees.ids.")
+
+    if not num_shifts:
+        reject("no_shifts", "At least one shift is required.")
+    column_lengths = {
+        "start_minutes": len(shifts.start_minutes),
+        "end_minutes": len(shifts.end_minutes),
+        "required": len(shifts.required),
+        "types": len(shifts.types),
+    }
+    # Coloanele de skill-uri sunt optionale (goale = fara skill-uri).
+    if shifts.skills:
+        column_lengths["skills"] = len(shifts.skills)
+    if shifts.skill_requirements:
+        column_lengths["skill_requirements"] = len(shifts.skill_requirements)
+    mismatched = [name for name, length in column_lengths.items() if length != num_shifts]
+    if mismatched:
+        reject(
+            "columnar_length_mismatch",
+            f"Shift columns {', '.join(mismatched)} must have the same length as day_offsets ({num_shifts}).",
+            columns=mismatched,
+        )
+
+    if min(shifts.day_offsets) < 0 or max(shifts.day_offsets) >= payload.horizon.days:
+        reject("day_offset_out_of_horizon", f"Shift day_offsets must be within 0..{payload.horizon.days - 1}.")
+    for column_name in ("start_minutes", "end_minutes"):
+        column = getattr(shifts, column_name)
+        if min(column) < 0 or max(column) > 24 * 60 - 1:
+            reject("minutes_out_of_range", f"Shift {column_name} must be within 0..1439.")
+    if min(shifts.required) < 0:
+        reject("negative_required", "Shift required counts must be >= 0.")
+    max_required = max(shifts.required)
+    if max_required > num_employees:
+        shift_idx = shifts.required.index(max_required)
+        reject(
+            "required_exceeds_available_employees",
+            f"Shift #{shift_idx} requires {max_required} employees, but only {num_employees} are available.",
+            shift_idx=shift_idx,
+            required=max_required,
+            employees=num_employees,
+        )
+
+    for shift_idx, requirements in enumerate(shifts.skill_requirements):
+        for skill, count in requirements.items():
+            if not 1 <= count <= shifts.required[shift_idx]:
+                reject(
+                    "skill_requirement_out_of_range",
+                    f"Shift #{shift_idx} skill requirement '{skill}' must be within 1..{shifts.required[shift_idx]} "
+                    "(shift required).",
+                    shift_idx=shift_idx,
+                    skill=skill,
+                    count=count,
+                )
+
+    for kind, rules in (("hard", payload.constraints.hard), ("soft", payload.constraints.soft)):
+        if not rules:
+            continue
+        employee_column = [rule[1] for rule in rules]
+        shift_column = [rule[2] for rule in rules]
+        if min(employee_column) < 0 or max(employee_column) >= num_employees:
+            reject(
+                f"{kind}_constraint_unknown_employee",
+                f"{kind.capitalize()} constraint references employee index outside 0..{num_employees - 1}.",
+            )
+        if min(shift_column) < 0 or max(shift_column) >= num_shifts:
+            reject(
+                f"{kind}_constraint_unknown_shift",
+                f"{kind.capitalize()} constraint references shift index outside 0..{num_shifts - 1}.",
+            )
+    if payload.constraints.soft:
+        weights = [rule[3] for rule in payload.constraints.soft]
+        if min(weights) < 1 or max(weights) > 10_000:
+            reject("soft_weight_out_of_range", "Soft constraint weights must be within 1..10000.")
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+from ortools.sat.python import cp_model
+
+from .engine_proto import ProtoConstraintWriter
+from .engine_skills import get_eligibility, iter_bits
+from .engine_types import AssignIndex, AssignVars, ObjectiveTerm, ShiftTable, SolveInstance, WorkloadCalendar
+from .engine_utils import MINUTES_PER_DAY, cached_derived
+
+DAYS_PER_WEEK = 7
+
+
+def build_workload_calendar(shifts: ShiftTable) -> WorkloadCalendar:
+    shift_days = [start // MINUTES_PER_DAY for start in shifts.start_abs]
+    day_masks: dict[int, int] = {}
+    for shift_idx, day in enumerate(shift_days):
+        day_masks[day] = day_masks.get(day, 0) | 1 << shift_idx
+    week_masks: dict[int, int] = {}
+    days_by_week: dict[int, list[int]] = {}
+    for day in sorted(day_masks):
+        week = day // DAYS_PER_WEEK
+        week_masks[week] = week_masks.get(week, 0) | day_masks[day]
+        days_by_week.setdefault(week, []).append(day)
+    return WorkloadCalendar(
+        shift_days=shift_days,
+        day_masks=dict(sorted(day_masks.items())),
+        week_masks=week_masks,
+        days_by_week=days_by_week,
+    )
+
+
+def get_workload_calendar(shifts: ShiftTable) -> WorkloadCalendar:
+    return cached_derived(shifts, ("workload_calendar",), lambda: build_workload_calendar(shifts))
+
+
+def horizon_weeks(horizon_days: int) -> int:
+    return -(-horizon_days // DAYS_PER_WEEK)
+
+
+def days_in_week(horizon_days: int, week: int) -> int:
+    # Ultima saptamana a orizontului poate fi partiala.
+    return max(0, min(DAYS_PER_WEEK, horizon_days - week * DAYS_PER_WEEK))
+
+
+def week_start_date(horizon_start: str, week: int) -> str:
+    return (date.fromisoformat(horizon_start) + timedelta(days=week * DAYS_PER_WEEK)).isoformat()
+
+
+def mask_minutes(shifts: ShiftTable, mask: int) -> int:
+    return sum(shifts.durations[shift_idx] for shift_idx in iter_bits(mask))
+
+
+def days_off_targets(instance: SolveInstance, eligible_shifts: int) -> list[tuple[int, int, list[int]]]:
+    """
+    (saptamana, zile libere cerute, zilele cu ture eligibile) pentru saptamanile in care
+    angajatul poate ramane sub `min_days_off_per_week`.
+
+    Intr-o saptamana partiala de k zile se cer `min - (7 - k)` zile libere (restul pot fi
+    in afara orizontului). Zilele fara ture eligibile sunt oricum libere, deci saptamanile
+    in care ajung nu primesc termen.
+    """
+    feature_toggles = instance.feature_toggles
+    calendar = get_workload_calendar(instance.shifts)
+    targets = []
+    for week, days in calendar.days_by_week.items():
+        week_days = days_in_week(instance.horizon_days, week)
+        required = feature_toggles.min_days_off_per_week - (DAYS_PER_WEEK - week_days)
+        if required <= 0:
+            continue
+        workable_days = [day for day in days if eligible_shifts & calendar.day_masks[day]]
+        if week_days - len(workable_days) < required:
+            targets.append((week, required, workable_days))
+    return targets
+
+
+class WorkloadAggregates:
+    """
+    Agregatele de volum per angajat (zile lucrate, minute pe saptamana, minute totale),
+    create la cerere peste `assign` si partajate intre reguli.
+
+    Motivatie:
+    Max ture pe zi, max ore pe saptamana, zilele libere si balance-ul au nevoie de
+    aceleasi sume. Construite o data, cu o variabila per (angajat, zi / saptamana),
+    modelul creste liniar cu orizontul; fiecare regula care si-ar face propriile sume
+    (sau perechi de ture) ar dubla restrictiile peste aceleasi celule.
+    Limita `max_hours_per_week` este chiar domeniul variabilei saptamanale.
+    """
+
+    def __init__(self, instance: SolveInstance, model: cp_model.CpModel, assign: AssignVars) -> None:
+        feature_toggles = instance.feature_toggles
+        self.instance = instance
+        self.model = model
+        self.assign = assign
+        self.calendar = get_workload_calendar(instance.shifts)
+        self.eligible_shifts = get_eligibility(instance).eligible_shifts
+        self.max_week_minutes: int | None = None
+        if feature_toggles.max_hours_per_week_enabled:
+            self.max_week_minutes = feature_toggles.max_hours_per_week * 60
+        self._worked_day: dict[tuple[int, int], cp_model.IntVar | None] = {}
+        self._week_minutes: dict[tuple[int, int], cp_model.IntVar | None] = {}
+        self._week_upper: dict[tuple[int, int], int] = {}
+        self._work_minutes: dict[int, cp_model.IntVar] = {}
+
+    def employee_shifts(self, employee_idx: int, mask: int) -> list[int]:
+        return list(iter_bits(self.eligible_shifts[employee_idx] & mask))
+
+    def worked_day(self, employee_idx: int, day: int) -> cp_model.IntVar | None:
+        """1 daca angajatul lucreaza cel putin o tura care incepe in `day` (None: nicio tura eligibila)."""
+        key = (employee_idx, day)
+        if key not in self._worked_day:
+            shift_ids = self.employee_shifts(employee_idx, self.calendar.day_masks.get(day, 0))
+            worked = None
+            if len(shift_ids) == 1:
+                worked = self.assign[(employee_idx, shift_ids[0])]
+            elif shift_ids:
+                worked = self.model.new_bool_var(f"worked_e{employee_idx}_d{day}")
+                self.model.add_max_equality(
+                    worked, [self.assign[(employee_idx, shift_idx)] for shift_idx in shift_ids]
+                )
+            self._worked_day[key] = worked
+        return self._worked_day[key]
+
+    def week_minutes(self, employee_idx: int, week: int) -> cp_model.IntVar | None:
+        """Minutele lucrate in saptamana `week` (None: nicio tura eligibila)."""
+        key = (employee_idx, week)
+        if key not in self._week_minutes:
+            shift_ids = self.employee_shifts(employee_idx, self.calendar.week_masks.get(week, 0))
+            minutes = None
+            if shift_ids:
+                durations = [self.instance.shifts.durations[shift_idx] for shift_idx in shift_ids]
+                upper = sum(durations)
+                if self.max_week_minutes is not None:
+                    upper = min(upper, self.max_week_minutes)
+                minutes = self.model.new_int_var(0, upper, f"week_minutes_e{employee_idx}_w{week}")
+                self._week_upper[key] = upper
+                self.model.add(
+                    minutes
+                    == cp_model.LinearExpr.weighted_sum(
+                        [self.assign[(employee_idx, shift_idx)] for shift_idx in shift_ids], durations
+                    )
+                )
+            self._week_minutes[key] = minutes
+        return self._week_minutes[key]
+
+    def work_minutes(self, employee_idx: int) -> cp_model.IntVar:
+        """Minutele lucrate pe tot orizontul, ca suma variabilelor saptamanale."""
+        if employee_idx not in self._work_minutes:
+            weeks = [
+                minutes
+                for week in self.calendar.week_masks
+                if (minutes := self.week_minutes(employee_idx, week)) is not None
+            ]
+            upper = sum(self._week_upper.get((employee_idx, week), 0) for week in self.calendar.week_masks)
+            total = self.model.new_int_var(0, upper, f"work_minutes_e{employee_idx}")
+            self.model.add(total == sum(weeks))
+            self._work_minutes[employee_idx] = total
+        return self._work_minutes[employee_idx]
+
+
+def apply_workload_constraints(
+    instance: SolveInstance,
+    writer: ProtoConstraintWriter,
+    assign_index: AssignIndex,
+    aggregates: WorkloadAggregates,
+    objective_term_refs: list[ObjectiveTerm],
+) -> None:
+    feature_toggles = instance.feature_toggles
+    shifts = instance.shifts
+    calendar = aggregates.calendar
+
+    for employee_idx in range(instance.num_employees):
+        eligible_shifts = aggregates.eligible_shifts[employee_idx]
+        if feature_toggles.max_shifts_per_day_enabled:
+            limit = feature_toggles.max_shifts_per_day
+            for day_mask in calendar.day_masks.values():
+                shift_ids = list(iter_bits(eligible_shifts & day_mask))
+                if len(shift_ids) > limit:
+                    writer.add_linear(
+                        [assign_index[employee_idx][shift_idx] for shift_idx in shift_ids],
+                        [1] * len(shift_ids),
+                        0,
+                        limit,
+                    )
+
+        if aggregates.max_week_minutes is not None:
+            # Doar saptamanile in care limita poate fi depasita; domeniul variabilei o impune.
+            for week, week_mask in calendar.week_masks.items():
+                if mask_minutes(shifts, eligible_shifts & week_mask) > aggregates.max_week_minutes:
+                    aggregates.week_minutes(employee_idx, week)
+
+        if feature_toggles.min_days_off_per_week_enabled:
+            for week, required, workable_days in days_off_targets(instance, eligible_shifts):
+                week_days = days_in_week(instance.horizon_days, week)
+                # zile lucrate - lipsa <= zile - zile libere cerute
+                missing = aggregates.model.new_int_var(
+                    0, required - (week_days - len(workable_days)), f"days_off_missing_e{employee_idx}_w{week}"
+                )
+                worked_days = [aggregates.worked_day(employee_idx, day) for day in workable_days]
+                writer.add_linear(
+                    [worked.index for worked in worked_days] + [missing.index],
+                    [1] * len(worked_days) + [-1],
+                    0,
+                    week_days - required,
+                )
+                objective_term_refs.append(
+                    days_off_term(instance, employee_idx, week, required, workable_days, missing)
+                )
+
+
+def days_off_term(
+    instance: SolveInstance,
+    employee_idx: int,
+    week: int,
+    required_days_off: int,
+    workable_days: list[int],
+    var: cp_model.IntVar | int,
+) -> ObjectiveTerm:
+    feature_toggles = instance.feature_toggles
+    calendar = get_workload_calendar(instance.shifts)
+    eligible_shifts = get_eligibility(instance).eligible_shifts[employee_idx]
+    return {
+        "var": var,
+        "coefficient": -feature_toggles.min_days_off_per_week_weight,
+        "source": "feature_toggle",
+        "constraint_type": "min_days_off_per_week",
+        "employee_id": instance.employee_ids[employee_idx],
+        "employee_name": instance.employee_names[employee_idx],
+        "weight": feature_toggles.min_days_off_per_week_weight,
+        "week_start": week_start_date(instance.horizon_start, week),
+        "days_in_week": days_in_week(instance.horizon_days, week),
+        "required_days_off": required_days_off,
+        # O celula per zi, ca LNS sa poata elibera zilele saptamanii.
+        "cells": [
+            (employee_idx, next(iter_bits(eligible_shifts & calendar.day_masks[day]))) for day in workable_days
+        ],
+    }
+
+
+def summarize_workload(instance: SolveInstance, assigned_cells: list[tuple[int, int]]) -> list[dict]:
+    """Minutele si zilele lucrate per angajat, total si pe saptamani (pentru `employee_load`)."""
+    shifts = instance.shifts
+    calendar = get_workload_calendar(shifts)
+    num_weeks = horizon_weeks(instance.horizon_days)
+    minutes_by_week = [[0] * num_weeks for _ in range(instance.num_employees)]
+    days_by_employee: list[set[int]] = [set() for _ in range(instance.num_employees)]
+    for employee_idx, shift_idx in assigned_cells:
+        day = calendar.shift_days[shift_idx]
+        week = min(day // DAYS_PER_WEEK, num_weeks - 1)
+        minutes_by_week[employee_idx][week] += shifts.durations[shift_idx]
+        days_by_employee[employee_idx].add(day)
+
+    summaries = []
+    for employee_idx in range(instance.num_employees):
+        worked_days = days_by_employee[employee_idx]
+        summaries.append(
+            {
+                "worked_minutes": sum(minutes_by_week[employee_idx]),
+                "worked_days": len(worked_days),
+                "weeks": [
+                    {
+                        "week_start": week_start_date(instance.horizon_start, week),
+                        "worked_minutes": minutes_by_week[employee_idx][week],
+                        "worked_days": sum(1 for day in worked_days if day // DAYS_PER_WEEK == week),
+                    }
+                    for week in range(num_weeks)
+                ],
+            }
+        )
+    return summaries
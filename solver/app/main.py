@@ -1,16 +1,75 @@
+import asyncio
+import os
 import time
 from uuid import uuid4
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.background import BackgroundTask
 
-from .engine import solve_schedule_request
+from .capture_utils import capture_session, capture_trigger, write_capture_case
+from .engine import estimate_schedule_request, solve_columnar_request, solve_schedule_request
+from .engine_budget import parse_deadline
+from .engine_cancel import cancel_request, registered_request
+from .engine_repair import solve_repair_request
+from .engine_scenarios import shutdown_scenario_pool, solve_scenario_batch
 from .logging_utils import get_logger, log_event
-from .models import SolverRequest
+from .models import ColumnarSolverRequest, ScenarioBatchRequest, SolverRequest
+from .profiling_utils import ProfilingMiddleware, list_profiles, profile_path, profiling_enabled
 
 
 app = FastAPI(title="CreaTura Solver Service")
 logger = get_logger()
 
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
+# Cat de des verificam, in timpul unui solve, daca clientul a inchis conexiunea.
+DISCONNECT_POLL_SECONDS = float(os.getenv("SOLVER_DISCONNECT_POLL_SECONDS", "0.25"))
+
+
+async def _run_cancellable(
+    request: Request, request_id: str, started_at: float, solve, *args, **kwargs
+) -> JSONResponse:
+    # Motivatie:
+    # Un client care inchide tab-ul sau reporneste solve-ul nu mai citeste raspunsul,
+    # dar CP-SAT ar rula tot bugetul pe toate thread-urile. Solve-ul ruleaza in
+    # threadpool, iar aici urmarim deconectarea si oprim cautarea (`stop_search`).
+    with registered_request(request_id) as token, capture_session(request_id) as capture:
+        task = asyncio.ensure_future(run_in_threadpool(solve, *args, **kwargs))
+        while not task.done():
+            await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if not task.done() and not token.cancelled and await request.is_disconnected():
+                log_event(logger, "INFO", "solve.request.client_disconnected", request_id=request_id)
+                token.cancel()
+        response = task.result()
+
+        # Cazurile lente (sau cerute explicit) sunt scrise pe disc dupa trimiterea
+        # raspunsului, pentru `scripts.replay_captures`.
+        background = None
+        elapsed_ms = (time.perf_counter() - started_at) * 1000.0
+        trigger = capture_trigger(request.headers, elapsed_ms) if capture is not None else None
+        if trigger is not None:
+            background = BackgroundTask(
+                write_capture_case,
+                capture,
+                endpoint=request.url.path,
+                headers=request.headers,
+                body=await request.body(),
+                response=response,
+                trigger=trigger,
+                elapsed_us=int(elapsed_ms * 1000),
+            )
+        # Raspunsurile sunt deja JSON simplu (dict/list/str/int/float); `JSONResponse` evita
+        # `jsonable_encoder`, care pe orare mari costa secunde dupa ce deadline-ul a fost respectat.
+        return JSONResponse(response, background=background)
+
+
+@app.on_event("shutdown")
+def stop_scenario_pool():
+    shutdown_scenario_pool()
+
 
 @app.get("/health")
 def health():
@@ -19,9 +78,10 @@ def health():
 
 
 @app.post("/solve")
-def solve(payload: SolverRequest, request: Request):
+async def solve(payload: SolverRequest, request: Request):
     request_id = request.headers.get("X-Request-Id") or uuid4().hex[:8]
     started_at = time.perf_counter()
+    deadline = parse_deadline(request.headers, started_at, logger, request_id)
     log_event(
         logger,
         "INFO",
@@ -29,7 +89,98 @@ def solve(payload: SolverRequest, request: Request):
         request_id=request_id,
         employees=len(payload.employees),
         shifts=len(payload.shifts),
+        template=payload.shift_template is not None,
         hard=len(payload.constraints.hard),
         soft=len(payload.constraints.soft),
+        repair=payload.repair is not None,
     )
-    return solve_schedule_request(payload, logger, request_id, started_at)
+    solve_request = solve_repair_request if payload.repair is not None else solve_schedule_request
+    return await _run_cancellable(
+        request, request_id, started_at, solve_request, payload, logger, request_id, started_at, deadline=deadline
+    )
+
+
+@app.post("/solve/columnar")
+async def solve_columnar(payload: ColumnarSolverRequest, request: Request):
+    request_id = request.headers.get("X-Request-Id") or uuid4().hex[:8]
+    started_at = time.perf_counter()
+    deadline = parse_deadline(request.headers, started_at, logger, request_id)
+    log_event(
+        logger,
+        "INFO",
+        "solve.request.received",
+        request_id=request_id,
+        format="columnar",
+        employees=len(payload.employees.ids),
+        shifts=len(payload.shifts.day_offsets),
+        hard=len(payload.constraints.hard),
+        soft=len(payload.constraints.soft),
+    )
+    return await _run_cancellable(
+        request, request_id, started_at, solve_columnar_request, payload, logger, request_id, started_at, deadline=deadline
+    )
+
+
+@app.post("/solve/scenarios")
+async def solve_scenarios(payload: ScenarioBatchRequest, request: Request):
+    request_id = request.headers.get("X-Request-Id") or uuid4().hex[:8]
+    started_at = time.perf_counter()
+    deadline = parse_deadline(request.headers, started_at, logger, request_id)
+    log_event(
+        logger,
+        "INFO",
+        "solve.request.received",
+        request_id=request_id,
+        format="scenarios",
+        employees=len(payload.base.employees),
+        shifts=len(payload.base.shifts),
+        template=payload.base.shift_template is not None,
+        scenarios=len(payload.scenarios),
+        time_budget_seconds=payload.time_budget_seconds,
+    )
+    return await _run_cancellable(
+        request, request_id, started_at, solve_scenario_batch, payload, logger, request_id, started_at, deadline=deadline
+    )
+
+
+@app.post("/solve/estimate")
+def estimate_solve(payload: SolverRequest, request: Request):
+    # Dry-run: dimensiunea modelului, memoria estimata si decizia de admitere pentru
+    # acelasi payload ca `POST /solve`, fara constructia modelului.
+    request_id = request.headers.get("X-Request-Id") or uuid4().hex[:8]
+    started_at = time.perf_counter()
+    log_event(
+        logger,
+        "INFO",
+        "solve.estimate.received",
+        request_id=request_id,
+        employees=len(payload.employees),
+        shifts=len(payload.shifts),
+        template=payload.shift_template is not None,
+    )
+    return JSONResponse(estimate_schedule_request(payload, logger, request_id, started_at))
+
+
+@app.post("/solve/cancel/{request_id}")
+def cancel_solve(request_id: str):
+    # Anulare explicita (ex. utilizatorul a pornit alt solve): cautarea CP-SAT se opreste,
+    # iar request-ul original raspunde cu cea mai buna solutie gasita pana atunci.
+    cancelled = cancel_request(request_id)
+    log_event(logger, "INFO", "solve.request.cancel", request_id=request_id, found=cancelled)
+    if not cancelled:
+        raise HTTPException(status_code=404, detail=f"No running solve with request id '{request_id}'.")
+    return {"request_id": request_id, "cancelled": True}
+
+
+@app.get("/admin/profiles")
+def list_request_profiles(limit: int = Query(50, ge=1, le=500)):
+    # Cele mai recente profiluri (`PROFILE_DIR`), cu request-ul, durata si numarul de esantioane.
+    return {"enabled": profiling_enabled(), "profiles": list_profiles(limit)}
+
+
+@app.get("/admin/profiles/{name}")
+def get_request_profile(name: str):
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{name}' not found.")
+    return FileResponse(path, media_type="text/plain")
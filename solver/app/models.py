@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
@@ -22,6 +22,32 @@ class Shift(BaseModel):
     end: str
     required: int = Field(1, ge=0, le=100)
     source: str | None = None
+    slot: str | None = None
+    # Skill-uri cerute fiecarui angajat atribuit; ceilalti nu primesc variabile pe tura.
+    skills: list[str] = Field(default_factory=list)
+    # skill -> cati dintre cei atribuiti trebuie sa-l aiba (1..required), ex. {"keyholder": 1}.
+    skill_requirements: dict[str, int] = Field(default_factory=dict)
+
+
+class TemplateSlot(BaseModel):
+    # `slot` este un id stabil (ex. "morning"); poate aparea in mai multe zile,
+    # iar regulile cu `slot` se aplica pe toate turele generate din el.
+    slot: str | None = None
+    type: str
+    start: str
+    end: str
+    required: int = Field(1, ge=0, le=100)
+    skills: list[str] = Field(default_factory=list)
+    skill_requirements: dict[str, int] = Field(default_factory=dict)
+
+
+class ShiftTemplate(BaseModel):
+    # Chei `Mon`..`Sun`; zilele lipsa nu au ture.
+    weekly: dict[Literal["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], list[TemplateSlot]] = Field(
+        default_factory=dict
+    )
+    # Chei: data ISO. Un override inlocuieste complet ziua (lista goala = zi libera).
+    overrides: dict[str, list[TemplateSlot]] = Field(default_factory=dict)
 
 
 class HardConstraint(BaseModel):
@@ -30,6 +56,7 @@ class HardConstraint(BaseModel):
     day: str | None = None
     date: str | None = None
     shift_type: str | None = None
+    slot: str | None = None
 
 
 class SoftConstraint(BaseModel):
@@ -38,9 +65,24 @@ class SoftConstraint(BaseModel):
     day: str | None = None
     date: str | None = None
     shift_type: str | None = None
+    slot: str | None = None
     weight: int = Field(1, ge=1, le=10_000)
 
 
+class AvailabilityWindow(BaseModel):
+    type: Literal["available", "unavailable"]
+    employee_id: str
+    # Absolut: data ("2026-02-12"; `end` inclusiv, toata ziua) sau data si ora
+    # ("2026-02-12T10:00"; `end` exclusiv).
+    start: str | None = None
+    end: str | None = None
+    # Saptamanal: zilele + intervalul orar (`end_time` <= `start_time` = peste noapte,
+    # egale = toata ziua). Impreuna cu `start` / `end`, doar aparitiile din acel interval.
+    weekdays: list[Literal["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]] = Field(default_factory=list)
+    start_time: str = "00:00"
+    end_time: str = "00:00"
+
+
 class Constraints(BaseModel):
     hard: list[HardConstraint] = Field(default_factory=list)
     soft: list[SoftConstraint] = Field(default_factory=list)
@@ -57,11 +99,117 @@ class FeatureToggles(BaseModel):
     balance_worked_hours: bool = False
     balance_worked_hours_weight: int = Field(2, ge=1, le=100)
     balance_worked_hours_max_span_multiplier: float = Field(1.5, ge=0.1, le=10.0)
+    # Un angajat nu poate avea doua ture suprapuse (aceeasi regula in toate formularile).
+    no_double_booking_enabled: bool = False
+    max_shifts_per_day_enabled: bool = False
+    max_shifts_per_day: int = Field(1, ge=1, le=10)
+    max_hours_per_week_enabled: bool = False
+    max_hours_per_week: int = Field(40, ge=1, le=168)
+    min_days_off_per_week_enabled: bool = False
+    min_days_off_per_week: int = Field(1, ge=1, le=7)
+    min_days_off_per_week_weight: int = Field(5, ge=1, le=100)
+
+
+class RepairAssignedEmployee(BaseModel):
+    employee_id: str
+
+
+class RepairShiftAssignment(BaseModel):
+    # Acelasi format ca `assignments[]` din raspunsul `/solve` (campurile extra sunt ignorate).
+    date: str
+    type: str
+    start: str
+    end: str
+    assigned: list[RepairAssignedEmployee] = Field(default_factory=list)
+
+
+class RepairRequest(BaseModel):
+    previous_assignments: list[RepairShiftAssignment]
+    # Regulile adaugate/modificate/sterse fata de solve-ul anterior; definesc vecinatatea.
+    changed_constraints: Constraints = Field(default_factory=Constraints)
+    changed_employee_ids: list[str] = Field(default_factory=list)
+    changed_dates: list[str] = Field(default_factory=list)
+    max_widen_steps: int = Field(3, ge=0, le=10)
 
 
 class SolverRequest(BaseModel):
     horizon: Horizon
     employees: list[Employee]
-    shifts: list[Shift]
+    # Fie `shifts` materializat, fie `shift_template` expandat pe `horizon` in solver.
+    shifts: list[Shift] = Field(default_factory=list)
+    shift_template: ShiftTemplate | None = None
     constraints: Constraints = Field(default_factory=Constraints)
+    # Ferestre de (in)disponibilitate; turele din afara lor devin neeligibile (ca skill-urile).
+    availability: list[AvailabilityWindow] = Field(default_factory=list)
+    feature_toggles: FeatureToggles = Field(default_factory=FeatureToggles)
+    # Mod repair: pastram solutia anterioara in afara vecinatatii modificarilor.
+    repair: RepairRequest | None = None
+    # "quick": doar constructia greedy (sub 100 ms, status "heuristic").
+    # "lns": solutie initiala CP-SAT, apoi re-optimizam vecinatati mici (orare foarte mari).
+    solve_mode: Literal["cp_sat", "quick", "lns"] = "cp_sat"
+    # Codificarea regulilor de secventa (max-worktime, rest): "pairwise" (liniar, per pereche)
+    # sau "interval" (intervale optionale per angajat + NoOverlap) sau "automaton" (un
+    # AddAutomaton per angajat peste turele sortate). Toate accepta aceleasi orare; dubla
+    # programare se interzice separat (`no_double_booking_enabled`), iar "interval" revine
+    # la "pairwise" pe ture suprapuse cand regula nu este activa.
+    formulation: Literal["pairwise", "interval", "automaton"] = "pairwise"
+    # Bugetul CP-SAT: timp (adaptiv dupa dimensiunea modelului), workeri si oprire la gap relativ.
+    solve_profile: Literal["quick", "balanced", "thorough"] = "balanced"
+
+
+class ColumnarShifts(BaseModel):
+    # Liste paralele, indexate dupa shift_idx. Minutele sunt fata de miezul
+    # noptii (0..1439); `end_minutes < start_minutes` inseamna tura overnight.
+    day_offsets: list[int]
+    start_minutes: list[int]
+    end_minutes: list[int]
+    required: list[int]
+    types: list[str]
+    # Optionale (gol = fara skill-uri): aceeasi semantica ca `Shift.skills` / `skill_requirements`.
+    skills: list[list[str]] = Field(default_factory=list)
+    skill_requirements: list[dict[str, int]] = Field(default_factory=list)
+
+
+class ColumnarEmployees(BaseModel):
+    ids: list[str]
+    names: list[str]
+    # Optional, paralel cu `ids` (gol = niciun angajat nu are skill-uri).
+    skills: list[list[str]] = Field(default_factory=list)
+
+
+class ColumnarConstraints(BaseModel):
+    # Tuple: (type, employee_idx, shift_idx) / (type, employee_idx, shift_idx, weight).
+    hard: list[tuple[Literal["forbid_shift", "require_shift"], int, int]] = Field(default_factory=list)
+    soft: list[tuple[Literal["avoid_assignment", "prefer_assignment"], int, int, int]] = Field(
+        default_factory=list
+    )
+
+
+class ColumnarSolverRequest(BaseModel):
+    horizon: Horizon
+    employees: ColumnarEmployees
+    shifts: ColumnarShifts
+    constraints: ColumnarConstraints = Field(default_factory=ColumnarConstraints)
     feature_toggles: FeatureToggles = Field(default_factory=FeatureToggles)
+    solve_mode: Literal["cp_sat", "quick", "lns"] = "cp_sat"
+    formulation: Literal["pairwise", "interval", "automaton"] = "pairwise"
+    solve_profile: Literal["quick", "balanced", "thorough"] = "balanced"
+
+
+class ScenarioOverride(BaseModel):
+    id: str = Field(..., min_length=1, max_length=64)
+    label: str | None = None
+    # Campuri partiale peste `base.feature_toggles` (ex. {"balance_worked_hours": true}).
+    feature_toggles: dict[str, Any] = Field(default_factory=dict)
+    # Reguli adaugate peste cele din `base.constraints` (ex. concediu = forbid fara filtre).
+    add_hard: list[HardConstraint] = Field(default_factory=list)
+    add_soft: list[SoftConstraint] = Field(default_factory=list)
+    # Index in `base.constraints.soft` -> weight nou.
+    soft_weight_overrides: dict[int, int] = Field(default_factory=dict)
+
+
+class ScenarioBatchRequest(BaseModel):
+    base: SolverRequest
+    scenarios: list[ScenarioOverride] = Field(..., min_length=1, max_length=16)
+    # Buget total (wall clock) pentru toate scenariile.
+    time_budget_seconds: float = Field(20.0, gt=0, le=120)
@@ -0,0 +1,89 @@
+"""
+Benchmark: formularea "pairwise" (implicita) fata de "interval" (intervale
+optionale per angajat + NoOverlap) si "automaton" (AddAutomaton per angajat),
+pe instante sintetice cu ture overnight si, optional, ture suprapuse (`--overlapping`).
+
+Pentru fiecare seed si formulare raportam timpul de construire a modelului,
+dimensiunea lui (variabile / restrictii), statusul, obiectivul si timpul total.
+Toate formularile rezolva aceeasi problema. Pe ture suprapuse "interval" are nevoie de
+`--no-double-booking` (regula `no_double_booking_enabled`); fara ea revine la "pairwise".
+
+Rulare (din `solver/`):
+
+    python -m scripts.bench_formulations --employees 60 --days 28 --overlapping --no-double-booking
+    python -m scripts.bench_formulations --days 31 --formulations pairwise,automaton
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=60)
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--preferences", type=float, default=0.5, help="soft rules per employee-day")
+    parser.add_argument("--overlapping", action="store_true", help="add shift types overlapping the base ones")
+    parser.add_argument("--no-double-booking", action="store_true", help="enable no_double_booking_enabled")
+    parser.add_argument("--time-limit", type=float, default=10.0, help="search seconds per solve")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--formulations", default="pairwise,interval,automaton", help="comma-separated")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    from ortools.sat.python import cp_model
+
+    from app.engine_instance import build_instance_from_request
+    from app.engine_model import build_model
+    from app.logging_utils import get_logger
+    from app.models import SolverRequest
+    from scripts.synthetic_instances import generate_instance
+
+    logger = get_logger()
+    print(
+        f"employees={args.employees} days={args.days} overlapping={args.overlapping} "
+        f"time_limit={args.time_limit}s workers={args.workers}"
+    )
+    print(
+        f"{'seed':>4} {'formulation':<11} {'build_ms':>9} {'vars':>8} {'constraints':>11} "
+        f"{'status':<10} {'objective':>10} {'total_s':>8}"
+    )
+    for seed in range(1, args.seeds + 1):
+        payload = generate_instance(
+            employees=args.employees,
+            days=args.days,
+            seed=seed,
+            preferences_per_employee_day=args.preferences,
+            overlapping=args.overlapping,
+        )
+        payload["feature_toggles"]["no_double_booking_enabled"] = args.no_double_booking
+        for formulation in args.formulations.split(","):
+            request = SolverRequest(**payload, formulation=formulation)
+            instance = build_instance_from_request(request, logger=logger, request_id=f"bench-{seed}")
+            started_at = time.perf_counter()
+            built = build_model(instance)
+            build_ms = (time.perf_counter() - started_at) * 1000.0
+            proto = built.model.proto
+
+            solver = cp_model.CpSolver()
+            solver.parameters.max_time_in_seconds = args.time_limit
+            solver.parameters.num_search_workers = args.workers
+            status = solver.solve(built.model)
+            elapsed = time.perf_counter() - started_at
+            objective = (
+                int(round(solver.objective_value)) if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None
+            )
+            print(
+                f"{seed:>4} {formulation:<11} {build_ms:>9.1f} {len(proto.variables):>8} {len(proto.constraints):>11} "
+                f"{solver.status_name(status).lower():<10} {str(objective):>10} {elapsed:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: LNS (`solve_mode="lns"`) fata de CP-SAT simplu, pe instante sintetice.
+
+Ambele moduri primesc acelasi buget de cautare (dupa construirea modelului);
+comparam statusul, obiectivul si timpul total pe mai multe seed-uri.
+
+Rulare (din `solver/`):
+
+    python -m scripts.bench_lns --employees 300 --days 31 --seeds 3 --time-limit 10
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=300)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--preferences", type=float, default=0.5, help="soft rules per employee-day")
+    parser.add_argument("--time-limit", type=float, default=10.0, help="search seconds per solve")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    from app.engine import solve_instance
+    from app.engine_instance import build_instance_from_request
+    from app.engine_lns import solve_instance_lns
+    from app.logging_utils import get_logger
+    from app.models import SolverRequest
+    from scripts.synthetic_instances import generate_instance
+
+    logger = get_logger()
+    print(
+        f"employees={args.employees} days={args.days} preferences={args.preferences} "
+        f"time_limit={args.time_limit}s workers={args.workers}"
+    )
+    print(f"{'seed':>4} {'mode':<7} {'status':<10} {'objective':>10} {'total_s':>8}  progress")
+    for seed in range(1, args.seeds + 1):
+        payload = SolverRequest(
+            **generate_instance(
+                employees=args.employees,
+                days=args.days,
+                seed=seed,
+                preferences_per_employee_day=args.preferences,
+            )
+        )
+        for mode, solve in (("cp_sat", solve_instance), ("lns", solve_instance_lns)):
+            instance = build_instance_from_request(payload, logger=logger, request_id=f"bench-{seed}")
+            started_at = time.perf_counter()
+            response = solve(
+                instance,
+                logger,
+                f"bench-{seed}-{mode}",
+                started_at,
+                max_time_seconds=args.time_limit,
+                num_workers=args.workers,
+            )
+            elapsed = time.perf_counter() - started_at
+            progress = " -> ".join(
+                f"{item['objective']}@{item['elapsed_us'] / 1e6:.1f}s" for item in response.get("lns", {}).get("progress", [])
+            )
+            print(
+                f"{seed:>4} {mode:<7} {response['status']:<10} {str(response['objective']):>10} "
+                f"{elapsed:>8.2f}  {progress}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: timpul de construire a modelului CP-SAT (fara rezolvare).
+
+Pentru fiecare dimensiune (angajati x zile) construieste modelul de `--repeat`
+ori pe aceeasi instanta si raporteaza mediana, plus numarul de variabile si
+restrictii. Prima constructie (structurile derivate reci) e raportata separat.
+
+Rulare (din `solver/`):
+
+    python -m scripts.bench_model_build --sizes 40x28,120x31,300x31 --repeat 3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="40x28,120x31,300x31", help="comma-separated EMPLOYEESxDAYS")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--overlapping", action="store_true", help="add shift types overlapping the base ones")
+    parser.add_argument("--formulation", default="pairwise", choices=["pairwise", "interval", "automaton"])
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    from app.engine_instance import build_instance_from_request
+    from app.engine_model import build_model
+    from app.logging_utils import get_logger
+    from app.models import SolverRequest
+    from scripts.synthetic_instances import generate_instance
+
+    logger = get_logger()
+    print(f"formulation={args.formulation} overlapping={args.overlapping} repeat={args.repeat}")
+    print(f"{'size':>8} {'vars':>8} {'constraints':>11} {'first_ms':>9} {'median_ms':>10}")
+    for size in args.sizes.split(","):
+        employees, days = (int(part) for part in size.split("x"))
+        payload = generate_instance(employees=employees, days=days, seed=args.seed, overlapping=args.overlapping)
+        request = SolverRequest(**payload, formulation=args.formulation)
+        instance = build_instance_from_request(request, logger=logger, request_id="bench-build")
+
+        timings_ms = []
+        for _ in range(args.repeat + 1):
+            started_at = time.perf_counter()
+            built = build_model(instance)
+            timings_ms.append((time.perf_counter() - started_at) * 1000.0)
+        proto = built.model.proto
+        print(
+            f"{size:>8} {len(proto.variables):>8} {len(proto.constraints):>11} "
+            f"{timings_ms[0]:>9.1f} {statistics.median(timings_ms[1:]):>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Replay pentru cazurile capturate de solver (`SOLVER_CAPTURE_DIR`).
+
+Fiecare caz este rulat din nou si comparat cu rezultatul capturat (timp,
+status, obiectiv):
+
+- `--mode engine`: payload-ul din `request.json` trece prin engine-ul curent
+  (acelasi endpoint, acelasi profil si deadline), deci prinde si regresiile
+  din construirea modelului;
+- `--mode model`: `model.pb` (`CpModelProto`) este rezolvat direct cu CP-SAT,
+  cu limita de timp, workerii si gap-ul din `search`-ul capturat; izoleaza
+  cautarea de restul engine-ului.
+
+`--param` adauga parametri CP-SAT (format text `SatParameters`) peste cei
+ai profilului, in ambele moduri.
+
+Rulare (din `solver/`):
+
+    python -m scripts.replay_captures --dir /var/lib/creatura/captures
+    python -m scripts.replay_captures --dir captures --mode model --param num_workers:16 --param linearization_level:2
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", required=True, help="capture directory (SOLVER_CAPTURE_DIR)")
+    parser.add_argument("--cases", default="", help="comma-separated substrings of case names to replay")
+    parser.add_argument("--mode", default="engine", choices=["engine", "model"])
+    parser.add_argument("--param", action="append", default=[], help="CP-SAT parameter override, e.g. num_workers:16")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    # Replay-ul nu trebuie sa produca la randul lui capturi.
+    os.environ.pop("SOLVER_CAPTURE_DIR", None)
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    from fastapi import HTTPException
+    from google.protobuf import text_format
+    from ortools.sat.python import cp_model
+
+    from app import engine_budget
+    from app.engine import solve_columnar_request, solve_schedule_request
+    from app.engine_repair import solve_repair_request
+    from app.engine_scenarios import solve_scenario_batch
+    from app.logging_utils import get_logger
+    from app.models import ColumnarSolverRequest, ScenarioBatchRequest, SolverRequest
+
+    overrides = " ".join(args.param)
+    engine_budget.CP_SAT_PARAMETERS = overrides
+    logger = get_logger()
+
+    def replay_engine(case_dir: Path) -> tuple[str, int | None]:
+        record = json.loads((case_dir / "request.json").read_text(encoding="utf-8"))
+        endpoint, payload = record["endpoint"], record["payload"]
+        started_at = time.perf_counter()
+        deadline = engine_budget.parse_deadline(record["headers"], started_at, logger, case_dir.name)
+        if endpoint == "/solve/columnar":
+            response = solve_columnar_request(
+                ColumnarSolverRequest(**payload), logger, case_dir.name, started_at, deadline=deadline
+            )
+        elif endpoint == "/solve/scenarios":
+            response = solve_scenario_batch(
+                ScenarioBatchRequest(**payload), logger, case_dir.name, started_at, deadline=deadline
+            )
+        else:
+            request = SolverRequest(**payload)
+            solve_request = solve_repair_request if request.repair is not None else solve_schedule_request
+            response = solve_request(request, logger, case_dir.name, started_at, deadline=deadline)
+        return response.get("status", "batch"), response.get("objective")
+
+    def replay_model(case_dir: Path, search: dict) -> tuple[str, int | None]:
+        model = cp_model.CpModel()
+        model.proto.ParseFromString((case_dir / "model.pb").read_bytes())
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = search["time_limit_seconds"]
+        solver.parameters.num_workers = search["num_workers"]
+        solver.parameters.relative_gap_limit = search["relative_gap_limit"]
+        if overrides:
+            text_format.Merge(overrides, solver.parameters)
+        status = solver.solve(model)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return solver.status_name(status).lower(), None
+        objective = int(solver.objective_value) if model.proto.HasField("objective") else 0
+        return solver.status_name(status).lower(), objective
+
+    filters = [name for name in args.cases.split(",") if name]
+    case_dirs = sorted(
+        path
+        for path in Path(args.dir).iterdir()
+        if path.is_dir() and (not filters or any(name in path.name for name in filters))
+    )
+    print(f"mode={args.mode} cases={len(case_dirs)} params={overrides or '-'}")
+    print(
+        f"{'case':<40} {'endpoint':<17} {'captured_ms':>11} {'replay_ms':>10} "
+        f"{'captured_obj':>12} {'replay_obj':>10} {'status':>10}"
+    )
+    for case_dir in case_dirs:
+        meta = json.loads((case_dir / "meta.json").read_text(encoding="utf-8"))
+        started_at = time.perf_counter()
+        try:
+            if args.mode == "model":
+                if not (case_dir / "model.pb").exists() or not meta.get("search"):
+                    print(f"{case_dir.name:<40} {meta['endpoint']:<17} skipped: no CP-SAT model captured")
+                    continue
+                status, objective = replay_model(case_dir, meta["search"])
+            else:
+                status, objective = replay_engine(case_dir)
+        except HTTPException as exc:
+            print(f"{case_dir.name:<40} {meta['endpoint']:<17} rejected: {exc.detail}")
+            continue
+        replay_ms = (time.perf_counter() - started_at) * 1000.0
+        print(
+            f"{case_dir.name:<40} {meta['endpoint']:<17} {meta['elapsed_us'] / 1000:>11.1f} {replay_ms:>10.1f} "
+            f"{str(meta['objective']):>12} {str(objective):>10} {status:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Generator de instante sintetice pentru benchmark-urile solverului.
+
+Produce payload-uri `SolverRequest` (dict JSON) deterministe pentru un seed:
+ture de zi/seara/noapte (overnight), optional ture suprapuse (`overlapping`),
+coverage 1..`max_required`, preferinte soft dense si cateva zile de concediu (forbid). Folosit de scripturile
+`scripts.bench_*`; poate fi rulat si direct pentru a scrie un payload:
+
+    python -m scripts.synthetic_instances --employees 300 --days 31 > payload.json
+"""
+
+import argparse
+import json
+import random
+from datetime import date, timedelta
+
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+SHIFT_TYPES = [
+    ("Morning", "07:00", "15:00"),
+    ("Evening", "15:00", "23:00"),
+    ("Night", "23:00", "07:00"),
+]
+# Ture suplimentare care se suprapun cu cele de baza (mid-day, 12h de zi/noapte).
+OVERLAPPING_SHIFT_TYPES = [
+    ("Mid", "11:00", "19:00"),
+    ("LongDay", "07:00", "19:00"),
+    ("LongNight", "19:00", "07:00"),
+]
+
+
+def generate_instance(
+    employees: int = 40,
+    days: int = 28,
+    seed: int = 1,
+    preferences_per_employee_day: float = 0.5,
+    leave_days_per_employee: float = 0.2,
+    max_required: int | None = None,
+    overnight: bool = True,
+    overlapping: bool = False,
+    balance_worked_hours: bool = True,
+    horizon_start: date = date(2026, 2, 2),
+) -> dict:
+    rng = random.Random(seed)
+    shift_types = SHIFT_TYPES if overnight else SHIFT_TYPES[:2]
+    if overlapping:
+        shift_types = shift_types + (OVERLAPPING_SHIFT_TYPES if overnight else OVERLAPPING_SHIFT_TYPES[:2])
+    # Coverage-ul cerut pastreaza ~60% din capacitate (o tura pe zi per angajat).
+    if max_required is None:
+        max_required = max(1, round(employees * 0.6 / len(shift_types)))
+
+    employee_list = [{"id": f"e{idx}", "name": f"Employee {idx}"} for idx in range(employees)]
+    shifts = []
+    for day_offset in range(days):
+        current = horizon_start + timedelta(days=day_offset)
+        for shift_type, start, end in shift_types:
+            shifts.append(
+                {
+                    "day": DAY_NAMES[current.weekday()],
+                    "date": current.isoformat(),
+                    "type": shift_type,
+                    "start": start,
+                    "end": end,
+                    "required": rng.randint(max(1, max_required // 2), max_required),
+                }
+            )
+
+    soft = []
+    for _ in range(round(employees * days * preferences_per_employee_day)):
+        shift = rng.choice(shifts)
+        soft.append(
+            {
+                "type": rng.choice(["prefer_assignment", "avoid_assignment"]),
+                "employee_id": rng.choice(employee_list)["id"],
+                "date": shift["date"],
+                "shift_type": shift["type"],
+                "weight": rng.randint(1, 10),
+            }
+        )
+    hard = []
+    for _ in range(round(employees * leave_days_per_employee)):
+        hard.append(
+            {
+                "type": "forbid_shift",
+                "employee_id": rng.choice(employee_list)["id"],
+                "date": rng.choice(shifts)["date"],
+            }
+        )
+
+    return {
+        "horizon": {"start": horizon_start.isoformat(), "days": days},
+        "employees": employee_list,
+        "shifts": shifts,
+        "constraints": {"hard": hard, "soft": soft},
+        "feature_toggles": {"balance_worked_hours": balance_worked_hours},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=40)
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--preferences", type=float, default=0.5, help="soft rules per employee-day")
+    parser.add_argument("--no-overnight", action="store_true")
+    parser.add_argument("--overlapping", action="store_true", help="add shift types overlapping the base ones")
+    args = parser.parse_args()
+    payload = generate_instance(
+        employees=args.employees,
+        days=args.days,
+        seed=args.seed,
+        preferences_per_employee_day=args.preferences,
+        overnight=not args.no_overnight,
+        overlapping=args.overlapping,
+    )
+    print(json.dumps(payload))
+
+
+if __name__ == "__main__":
+    main()